@@ -1,6 +1,17 @@
-import gradio as gr
+import hmac
+import logging
 import os
-from rag_system import RAGSystem
+import threading
+from startup import StartupTracker
+from llm_client import LLMClient, LLMDeadlineExceeded, LLMOverloadedError
+from telemetry import Metrics, configure_logging, start_metrics_server
+
+# Created first so the timings cover the heavy imports below
+startup = StartupTracker()
+
+# gradio is needed to serve the UI; the RAG stack (google.genai, chromadb,
+# sentence_transformers) is imported by the background initializer
+import gradio as gr
 
 # ====================================================================================
 # PASTE YOUR API KEY HERE (between the quotes)
@@ -10,17 +21,142 @@ GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")  # <-- PASTE YOUR API KEY
 
 # ====================================================================================
 # UPLOAD YOUR TXT FILE PATH HERE (the TXT file that will be pre-loaded)
+# A single file, a directory of .txt files or a glob such as "docs/*.txt"
+# ====================================================================================
+FILE_PATH = os.environ.get("FILE_PATH", "Mental_Health_Guide.txt")  # <-- PUT YOUR TXT FILE NAME HERE (must be in same folder)
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "64"))  # Chunks embedded + inserted per batch
+# ====================================================================================
+
+# ====================================================================================
+# HOT RELOAD (rebuild the index in the background when the TXT files change)
+# HOT_RELOAD_INTERVAL_S: how often the files are checked (0 disables watching)
+# ADMIN_TOKEN: enables the "reload" API endpoint, which reloads on demand
+# ====================================================================================
+HOT_RELOAD_INTERVAL_S = float(os.environ.get("HOT_RELOAD_INTERVAL_S", "30"))
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+# ====================================================================================
+
+# ====================================================================================
+# CONCURRENCY SETTINGS
+# ====================================================================================
+CONCURRENCY_LIMIT = int(os.environ.get("CONCURRENCY_LIMIT", "16"))  # Requests handled at once
+QUEUE_MAX_SIZE = int(os.environ.get("QUEUE_MAX_SIZE", "100"))  # Requests allowed to wait
+EMBED_WORKERS = int(os.environ.get("EMBED_WORKERS", "4"))  # Threads for vector search
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "32"))  # Max questions per encode call
+EMBED_BATCH_WAIT_MS = float(os.environ.get("EMBED_BATCH_WAIT_MS", "5"))  # Max wait to fill a batch
+# ====================================================================================
+
+# ====================================================================================
+# RETRIEVAL SERVICE (scale-out mode)
+# Set to the URL of a running retrieval_service.py (http://host:port or
+# unix:///path/to.sock) to run this app as a thin web worker: the embedding model,
+# the index, ingest and hot reload all live in the service, so several workers
+# can share one copy of them. Leave empty to load everything in this process.
+# ====================================================================================
+RETRIEVAL_SERVICE_URL = os.environ.get("RETRIEVAL_SERVICE_URL", "")
+RETRIEVAL_POOL_SIZE = int(os.environ.get("RETRIEVAL_POOL_SIZE", "8"))  # Keep-alive connections to the service
+# ====================================================================================
+
+# ====================================================================================
+# ANSWER CACHE SETTINGS
+# ====================================================================================
+CACHE_MAX_DISTANCE = float(os.environ.get("CACHE_MAX_DISTANCE", "0.08"))  # Cosine distance for a hit
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "1000"))  # 0 disables the cache
+CACHE_TTL_SECONDS = float(os.environ.get("CACHE_TTL_SECONDS", "3600"))
+CACHE_MAX_MB = float(os.environ.get("CACHE_MAX_MB", "32"))
+# ====================================================================================
+
+# ====================================================================================
+# VECTOR STORE BACKEND ("chroma" or "numpy")
+# With the numpy backend VECTOR_STORAGE ("float32", "float16", "int8" or "auto") keeps
+# a compact copy of the vectors in memory for search and re-scores the best candidates
+# at full precision; "auto" picks the most precise one that fits VECTOR_MEMORY_MB
+# ====================================================================================
+VECTOR_BACKEND = os.environ.get("VECTOR_BACKEND", "chroma")
+VECTOR_STORAGE = os.environ.get("VECTOR_STORAGE", "float32")
+VECTOR_MEMORY_MB = float(os.environ.get("VECTOR_MEMORY_MB", "0"))
+# ====================================================================================
+
+# ====================================================================================
+# EMBEDDING BACKEND ("torch", "torch-int8", "onnx" or "onnx-int8")
+# Changing it re-embeds the index: vectors from different backends are never mixed
+# ====================================================================================
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+# int8 graph for "onnx-int8": onnx/model_quint8_avx2.onnx, onnx/model_qint8_avx512.onnx,
+# onnx/model_qint8_avx512_vnni.onnx or onnx/model_qint8_arm64.onnx
+# The onnx backends need: pip install "sentence-transformers[onnx]"
+EMBEDDING_ONNX_FILE = os.environ.get("EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+# ====================================================================================
+
+# ====================================================================================
+# PROMPT CONTEXT (estimated tokens of retrieved text sent to Gemini per question)
+# ====================================================================================
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "1200"))
+# ====================================================================================
+
+# ====================================================================================
+# RETRIEVAL
+# HYBRID_SEARCH fuses BM25 keyword search with vector search (reciprocal-rank fusion)
+# RERANK_MODEL optionally re-ranks the fused candidates with a cross-encoder, e.g.
+# "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"; skipped when it would exceed RERANK_BUDGET_MS
+# ====================================================================================
+HYBRID_SEARCH = os.environ.get("HYBRID_SEARCH", "1") == "1"
+CANDIDATE_POOL = int(os.environ.get("CANDIDATE_POOL", "20"))  # Candidates per retriever before fusion
+RERANK_MODEL = os.environ.get("RERANK_MODEL", "")
+RERANK_BUDGET_MS = float(os.environ.get("RERANK_BUDGET_MS", "150"))
 # ====================================================================================
-FILE_PATH = "Mental_Health_Guide.txt"  # <-- PUT YOUR TXT FILE NAME HERE (must be in same folder)
+
+# ====================================================================================
+# FAST-PATH ROUTER (greetings and crisis messages answered without Gemini)
+# With CRISIS_FOLLOW_UP the Crisis Protocol text is followed by a generated reply
+# ====================================================================================
+ROUTER_ENABLED = os.environ.get("ROUTER_ENABLED", "1") == "1"
+CRISIS_FOLLOW_UP = os.environ.get("CRISIS_FOLLOW_UP", "1") == "1"
+# ====================================================================================
+
+# ====================================================================================
+# GEMINI CALLS
+# Each attempt times out after LLM_TIMEOUT_S; throttling, timeouts and 5xx errors are
+# retried with backoff while within LLM_DEADLINE_S. LLM_HEDGE_PERCENTILE (e.g. 95) sends
+# a second request when the first is slower than that percentile (0 disables).
+# LLM_RATE_PER_S (0 = unlimited) and LLM_MAX_CONCURRENCY cap calls to Gemini; requests
+# over the cap get a "busy" reply at once instead of queueing.
+# GEMINI_BASE_URL points at another endpoint, e.g. fake_gemini_server.py for testing
+# ====================================================================================
+GEMINI_BASE_URL = os.environ.get("GEMINI_BASE_URL", "")
+LLM_TIMEOUT_S = float(os.environ.get("LLM_TIMEOUT_S", "30"))
+LLM_DEADLINE_S = float(os.environ.get("LLM_DEADLINE_S", "60"))
+LLM_MAX_ATTEMPTS = int(os.environ.get("LLM_MAX_ATTEMPTS", "3"))
+LLM_HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", "0"))
+LLM_RATE_PER_S = float(os.environ.get("LLM_RATE_PER_S", "0"))
+LLM_BURST = int(os.environ.get("LLM_BURST", "10"))
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", str(CONCURRENCY_LIMIT)))
 # ====================================================================================
 
+# ====================================================================================
+# OBSERVABILITY
+# LOG_LEVEL: DEBUG logs every request (spans, prompt size, routing); OFF silences logging
+# METRICS_PORT: Prometheus metrics at http://<host>:<port>/metrics (0 disables)
+# METRICS_HOST: interface the metrics endpoint binds to; set 0.0.0.0 to expose it
+# ====================================================================================
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9100"))
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+# ====================================================================================
+
+configure_logging(LOG_LEVEL)
+logger = logging.getLogger("APP")
+metrics = Metrics()
+
 # Global variable to hold RAG system
 rag = None
-startup_message = ""
+reloader = None
+_init_lock = threading.Lock()
+_init_thread = None
 
 def initialize_system():
-    """Initialize the RAG system once"""
-    global rag, startup_message
+    """Initialize the RAG system once, recording per-phase timings"""
+    global rag, reloader
     
     print("=== INITIALIZATION STARTED ===")
     
@@ -29,63 +165,178 @@ def initialize_system():
         return  # Already initialized
     
     try:
-        print("Step 1: Creating RAG system...")
-        rag = RAGSystem(api_key=GEMINI_API_KEY)
-        print("Step 2: RAG system object created!")
+        with startup.phase("importing", "Loading libraries..."):
+            from rag_system import RAGSystem
+            from semantic_cache import SemanticCache
+            from hot_reload import HotReloader
+        
+        retrieval_client = None
+        if RETRIEVAL_SERVICE_URL:
+            from retrieval_service import RetrievalClient
+            retrieval_client = RetrievalClient(RETRIEVAL_SERVICE_URL, pool_size=RETRIEVAL_POOL_SIZE)
+            with startup.phase("connecting", "Waiting for the retrieval service..."):
+                retrieval_client.wait_until_ready()
+        
+        with startup.phase("loading_model", "Loading the language model and index..."):
+            system = RAGSystem(
+                api_key=GEMINI_API_KEY,
+                embed_workers=EMBED_WORKERS,
+                embed_batch_size=EMBED_BATCH_SIZE,
+                embed_batch_wait_ms=EMBED_BATCH_WAIT_MS,
+                answer_cache=SemanticCache(
+                    max_distance=CACHE_MAX_DISTANCE,
+                    max_entries=CACHE_MAX_ENTRIES,
+                    ttl_seconds=CACHE_TTL_SECONDS,
+                    max_bytes=int(CACHE_MAX_MB * 1024 * 1024)
+                ),
+                vector_backend=VECTOR_BACKEND,
+                vector_storage=VECTOR_STORAGE,
+                vector_memory_mb=VECTOR_MEMORY_MB,
+                embedding_backend=EMBEDDING_BACKEND,
+                embedding_onnx_file=EMBEDDING_ONNX_FILE,
+                context_token_budget=CONTEXT_TOKEN_BUDGET,
+                router_enabled=ROUTER_ENABLED,
+                crisis_follow_up=CRISIS_FOLLOW_UP,
+                metrics=metrics,
+                hybrid_search=HYBRID_SEARCH,
+                candidate_pool=CANDIDATE_POOL,
+                rerank_model=RERANK_MODEL or None,
+                rerank_budget_ms=RERANK_BUDGET_MS,
+                llm=LLMClient(
+                    GEMINI_API_KEY,
+                    base_url=GEMINI_BASE_URL or None,
+                    timeout_s=LLM_TIMEOUT_S,
+                    deadline_s=LLM_DEADLINE_S,
+                    max_attempts=LLM_MAX_ATTEMPTS,
+                    hedge_percentile=LLM_HEDGE_PERCENTILE or None,
+                    rate_per_s=LLM_RATE_PER_S,
+                    burst=LLM_BURST,
+                    max_concurrency=LLM_MAX_CONCURRENCY,
+                    metrics=metrics
+                ),
+                retrieval_client=retrieval_client
+            )
         
-        # Process the file at startup
-        print(f"Step 3: Checking for TXT file: {FILE_PATH}")
-        if os.path.exists(FILE_PATH):
-            print(f"Step 4: TXT file found! Processing...")
-            num_chunks = rag.process_file(FILE_PATH)
-            startup_message = f"✅ Mental health resources loaded successfully! Created {num_chunks} knowledge chunks. Ready to help!"
-            print(f"Step 5: SUCCESS - {startup_message}")
+        with startup.phase("warming_up", "Warming up..."):
+            system.warm_up()
+        rag = system
+        
+        # A persisted index can answer while the source files are re-checked
+        if rag.is_ready():
+            startup.mark_ready(f"✅ Loaded {rag.vector_store.count()} knowledge chunks. Ready to help!")
+        # The retrieval service ingests and reloads the files itself
+        if retrieval_client is not None:
+            return
+        
+        files = rag.txt_processor.find_files(FILE_PATH)
+        if not files:
+            if not rag.is_ready():
+                startup.mark_failed(f"⚠️ Resource file '{FILE_PATH}' not found in directory.")
+                print(f"Current directory contents: {os.listdir('.')}")
+            return
+        
+        # Created before indexing so edits made while it runs are picked up afterwards
+        watcher = HotReloader(rag, FILE_PATH, interval_s=HOT_RELOAD_INTERVAL_S, batch_size=INGEST_BATCH_SIZE)
+        try:
+            with startup.phase("indexing", f"Indexing {len(files)} resource file(s)..."):
+                num_chunks = rag.process_path(FILE_PATH, batch_size=INGEST_BATCH_SIZE)
+        except Exception as e:
+            if not rag.is_ready():
+                raise
+            # The persisted index keeps answering; the watcher picks up fixed files
+            startup.record_error(f"⚠️ Refreshing the knowledge base failed: {str(e)}")
+            import traceback
+            traceback.print_exc()
         else:
-            startup_message = f"⚠️ Resource file '{FILE_PATH}' not found in directory."
-            print(f"Step 5: FAILED - {startup_message}")
-            print(f"Current directory contents: {os.listdir('.')}")
+            startup.mark_ready(f"✅ Mental health resources loaded successfully! Created {num_chunks} knowledge chunks. Ready to help!")
+        watcher.start()
+        reloader = watcher
     except Exception as e:
-        startup_message = f"❌ Error during initialization: {str(e)}"
-        print(f"ERROR: {startup_message}")
+        startup.mark_failed(f"❌ Error during initialization: {str(e)}")
         import traceback
         traceback.print_exc()
-    
-    print("=== INITIALIZATION COMPLETE ===")
+    finally:
+        print(f"=== INITIALIZATION COMPLETE === {startup.health()}")
 
-def answer_question(question):
-    """Answer question using RAG - Simple input/output"""
-    print(f"\n=== QUESTION RECEIVED: {question} ===")
-    
-    # Initialize if not already done
-    if rag is None:
-        print("RAG is None, calling initialize_system()...")
-        initialize_system()
+def start_background_initialization():
+    """Start initialize_system in a background thread (only once)"""
+    global _init_thread
+    with _init_lock:
+        if _init_thread is None:
+            _init_thread = threading.Thread(target=initialize_system, name="rag-init", daemon=True)
+            _init_thread.start()
+
+def get_health():
+    """Readiness state and startup timings"""
+    return startup.health()
+
+def render_metrics() -> str:
+    """Prometheus text for the metrics endpoint"""
+    health = startup.health()
+    gauges = {
+        "app_ready": 1.0 if health["ready"] else 0.0,
+        "app_uptime_seconds": health["uptime_seconds"],
+    }
+    if health["ready_after_seconds"] is not None:
+        gauges["app_ready_after_seconds"] = health["ready_after_seconds"]
+    if rag is not None:
+        gauges.update(rag.metrics_snapshot())
+    if reloader is not None:
+        reload_stats = reloader.get_stats()
+        gauges["hot_reload_total"] = reload_stats["reloads"]
+        gauges["hot_reload_failures_total"] = reload_stats["failures"]
+        gauges["hot_reload_last_seconds"] = reload_stats["last_seconds"]
+    return metrics.render(gauges)
+
+def trigger_reload(token):
+    """Admin endpoint: rebuild the index from FILE_PATH in the background"""
+    if not ADMIN_TOKEN or not hmac.compare_digest(str(token or ""), ADMIN_TOKEN):
+        return {"error": "Reloading is disabled or the token is wrong"}
+    if reloader is None:
+        return {"error": f"System not ready yet. Status: {startup.message}"}
+    logger.info("Hot reload requested through the admin endpoint")
+    reloader.trigger()
+    return reloader.get_stats()
+
+def status_text():
+    """One-line status for the UI"""
+    return f"**Status:** {startup.message}"
+
+async def answer_question(question):
+    """Answer question using RAG, streaming the answer as it is generated"""
+    logger.debug(f"Question received: {question}")
     
     if not question or question.strip() == "":
-        return "Please enter a question."
+        yield "Please enter a question."
+        return
     
-    print(f"Checking if RAG is ready... rag={rag}, is_ready={rag.is_ready() if rag else 'N/A'}")
-    
-    if rag is None or not rag.is_ready():
-        return f"⚠️ System not ready. Status: {startup_message}"
+    # Never initialize inline: the background initializer owns startup
+    if rag is None or not startup.is_ready() or not rag.is_ready():
+        # Greetings and crisis messages still get their local reply while indexing
+        route = rag.router.match_keywords(question) if rag is not None and rag.router is not None else None
+        if route is not None:
+            rag.router.record(route)
+            yield route.reply
+            return
+        metrics.inc("app_not_ready_total")
+        yield f"⏳ System not ready yet. Status: {startup.message}"
+        return
     
     try:
-        print("Querying RAG system...")
-        answer = rag.query(question)
-        print("Answer generated successfully!")
-        return answer
+        answer = ""
+        async for text in rag.aquery_stream(question):
+            answer += text
+            yield answer
+    except (LLMOverloadedError, LLMDeadlineExceeded) as e:
+        logger.warning(f"Gemini unavailable: {e}")
+        yield "⏳ The assistant is very busy right now. Please try again in a moment."
     except Exception as e:
         error_msg = f"❌ Error: {str(e)}"
-        print(error_msg)
-        import traceback
-        traceback.print_exc()
-        return error_msg
+        logger.exception(error_msg)
+        yield error_msg
 
 # Create simple Gradio interface
 with gr.Blocks(title="Mental Health Support Assistant") as demo:
-    # Initialize on first load
-    demo.load(initialize_system)
-    
     gr.Markdown("""
     # 🧠 Mental Health Support Assistant
     
@@ -94,6 +345,19 @@ with gr.Blocks(title="Mental Health Support Assistant") as demo:
     Ask questions about mental health topics, coping strategies, and wellness!
     """)
     
+    status_output = gr.Markdown(status_text())
+    health_output = gr.JSON(visible=False)
+    
+    # Show the current status on page load; the health event doubles as an API endpoint
+    demo.load(status_text, outputs=[status_output])
+    demo.load(get_health, outputs=[health_output], api_name="health")
+    
+    # Admin-only API endpoint (needs ADMIN_TOKEN); not shown in the UI
+    admin_token_input = gr.Textbox(visible=False)
+    reload_output = gr.JSON(visible=False)
+    reload_btn = gr.Button(visible=False)
+    reload_btn.click(trigger_reload, inputs=[admin_token_input], outputs=[reload_output], api_name="reload")
+    
     with gr.Row():
         with gr.Column():
             question_input = gr.Textbox(
@@ -124,19 +388,29 @@ with gr.Blocks(title="Mental Health Support Assistant") as demo:
     *This is an AI assistant providing information only. For emergencies, please contact crisis services or emergency services immediately.*
     """)
     
-    # Event handlers
+    # Event handlers (both share one concurrency group)
     ask_btn.click(
         fn=answer_question,
         inputs=[question_input],
-        outputs=[answer_output]
-    )
+        outputs=[answer_output],
+        concurrency_id="answer"
+    ).then(status_text, outputs=[status_output])
     
     # Also trigger on Enter key
     question_input.submit(
         fn=answer_question,
         inputs=[question_input],
-        outputs=[answer_output]
-    )
+        outputs=[answer_output],
+        concurrency_id="answer"
+    ).then(status_text, outputs=[status_output])
+
+demo.queue(default_concurrency_limit=CONCURRENCY_LIMIT, max_size=QUEUE_MAX_SIZE)
+
+# Load the model and index in the background while the UI comes up
+start_background_initialization()
 
 if __name__ == "__main__":
+    # Started here, not on import, so importing the module never takes the port
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT, render_metrics, host=METRICS_HOST)
     demo.launch()
\ No newline at end of file
@@ -0,0 +1,120 @@
+import argparse
+import gc
+import time
+
+import numpy as np
+
+from embeddings import EMBEDDING_BACKENDS, EmbeddingGenerator
+from txt_processor import TXTProcessor
+
+# Typical student questions; retrieval over the guide is compared per backend
+QUESTIONS = [
+    "How do I deal with anxiety?",
+    "What is depression?",
+    "How can I cope with stress before exams?",
+    "What are the signs of burnout?",
+    "I can't sleep at night, what should I do?",
+    "How do I help a friend who is struggling?",
+    "What is a panic attack?",
+    "How can I practice mindfulness?",
+    "Who can I call in a crisis?",
+    "How do I talk to someone about my feelings?",
+    "¿Cómo puedo manejar la ansiedad?",
+    "Wie gehe ich mit Stress um?",
+]
+
+def current_rss_mb() -> float:
+    """Resident memory of this process in MB (Linux; falls back to peak RSS)"""
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def normalize(embeddings) -> np.ndarray:
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+def benchmark_backend(backend: str, chunks, repeats: int, batch_size: int):
+    """Load one backend and time single-query and batched encoding
+    
+    Memory is the RSS growth while loading; freed memory is not always
+    returned to the OS, so run one backend per process for exact figures.
+    """
+    gc.collect()
+    rss_before = current_rss_mb()
+    started = time.perf_counter()
+    generator = EmbeddingGenerator(backend=backend)
+    load_seconds = time.perf_counter() - started
+    rss_after = current_rss_mb()
+    
+    # Warm-up so one-time graph setup is not counted
+    generator.model.encode(QUESTIONS[:2])
+    
+    latencies = []
+    for _ in range(repeats):
+        for question in QUESTIONS:
+            started = time.perf_counter()
+            generator.model.encode([question])
+            latencies.append(time.perf_counter() - started)
+    latencies_ms = np.array(latencies) * 1000.0
+    
+    started = time.perf_counter()
+    chunk_embeddings = generator.model.encode(chunks, batch_size=batch_size)
+    throughput = len(chunks) / (time.perf_counter() - started)
+    question_embeddings = generator.model.encode(QUESTIONS)
+    
+    report = {
+        "load_s": load_seconds,
+        "model_mb": rss_after - rss_before,
+        "query_ms_p50": float(np.percentile(latencies_ms, 50)),
+        "query_ms_p95": float(np.percentile(latencies_ms, 95)),
+        "chunks_per_s": throughput,
+        "chunk_embeddings": normalize(chunk_embeddings),
+        "question_embeddings": normalize(question_embeddings),
+    }
+    del generator
+    gc.collect()
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backends on the bundled guide")
+    parser.add_argument("--file", default="Mental_Health_Guide.txt")
+    parser.add_argument("--backends", nargs="+", default=list(EMBEDDING_BACKENDS))
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--repeats", type=int, default=5, help="Passes over the question set for latency")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+    
+    chunks = TXTProcessor().extract_chunks(args.file)
+    print(f"=== Embedding backend benchmark: {len(chunks)} chunks, {len(QUESTIONS)} questions ===")
+    
+    reports = {}
+    for backend in args.backends:
+        try:
+            reports[backend] = benchmark_backend(backend, chunks, args.repeats, args.batch_size)
+        except Exception as e:
+            print(f"Skipping {backend}: {e}")
+    
+    if not reports:
+        return
+    # Drift is measured against the full-precision backend when it was run
+    reference_name = "torch" if "torch" in reports else next(iter(reports))
+    reference = reports[reference_name]
+    reference_top = np.argsort(-(reference["question_embeddings"] @ reference["chunk_embeddings"].T), axis=1)[:, :args.top_k]
+    
+    print(f"\nRecall@{args.top_k} and cosine similarity are relative to the {reference_name} backend")
+    print(f"{'backend':<11} {'load s':>7} {'RSS MB':>7} {'p50 ms':>7} {'p95 ms':>7} {'chunks/s':>9} {'recall':>7} {'cos':>7}")
+    for backend, report in reports.items():
+        top = np.argsort(-(report["question_embeddings"] @ report["chunk_embeddings"].T), axis=1)[:, :args.top_k]
+        recall = np.mean([len(set(a) & set(b)) / args.top_k for a, b in zip(top, reference_top)])
+        cosine = float(np.mean(np.sum(report["chunk_embeddings"] * reference["chunk_embeddings"], axis=1)))
+        print(f"{backend:<11} {report['load_s']:>7.2f} {report['model_mb']:>7.0f} {report['query_ms_p50']:>7.2f} "
+              f"{report['query_ms_p95']:>7.2f} {report['chunks_per_s']:>9.1f} {recall:>7.3f} {cosine:>7.4f}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,361 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmark_embeddings import current_rss_mb
+from fake_genai import FakeGenaiClient
+
+# Fixed question set; each question should retrieve a chunk containing its phrase
+QUESTIONS = [
+    ("What are the signs of depression?", "depression"),
+    ("How can I manage my anxiety?", "anxiety"),
+    ("How do I cope with exam pressure?", "exam"),
+    ("How do I get over a breakup?", "breakup"),
+    ("What is burnout and how do I recover?", "burnout"),
+    ("I feel lonely at university, what can I do?", "lonel"),
+    ("I can't fall asleep at night", "sleep"),
+    ("I keep bingeing and I hate my body", "body image"),
+    ("How can I build my self-esteem?", "self-esteem"),
+    ("How do I stop procrastinating?", "procrastinat"),
+    ("I think I am drinking too much alcohol", "alcohol"),
+    ("How do I deal with grief after losing someone?", "grief"),
+    ("Why is it so hard to ask for help?", "seeking help"),
+    ("What can I do every day to look after myself?", "self-care"),
+]
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process so far in MB (Linux reports KB)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def build_corpus(source_file: str, scale: int, directory: str, seed: int = 0) -> str:
+    """Write `scale` shuffled copies of the source file; returns the corpus path
+    
+    Paragraph order is shuffled per copy (deterministically) so copies
+    produce different chunks instead of being deduplicated.
+    """
+    if scale == 1:
+        return os.path.abspath(source_file)
+    with open(source_file, "r", encoding="utf-8") as file:
+        paragraphs = [paragraph for paragraph in file.read().split("\n\n") if paragraph.strip()]
+    corpus_dir = os.path.join(directory, f"corpus_x{scale}")
+    os.makedirs(corpus_dir, exist_ok=True)
+    for copy in range(scale):
+        shuffled = list(paragraphs)
+        random.Random(seed + copy).shuffle(shuffled)
+        with open(os.path.join(corpus_dir, f"copy_{copy:04d}.txt"), "w", encoding="utf-8") as file:
+            file.write(f"Synthetic copy {copy}\n\n" + "\n\n".join(shuffled))
+    return corpus_dir
+
+def latency_summary(seconds) -> dict:
+    milliseconds = np.array(seconds) * 1000.0
+    if len(milliseconds) == 0:
+        return {}
+    return {
+        "p50_ms": float(np.percentile(milliseconds, 50)),
+        "p95_ms": float(np.percentile(milliseconds, 95)),
+        "p99_ms": float(np.percentile(milliseconds, 99)),
+        "avg_ms": float(milliseconds.mean()),
+    }
+
+def create_rag(args, store_dir: str, fake_client: FakeGenaiClient):
+    """RAGSystem over store_dir with the cache off and the fake Gemini client"""
+    from rag_system import RAGSystem
+    from semantic_cache import SemanticCache
+    from llm_client import LLMClient
+    rag = RAGSystem(
+        api_key="",
+        embed_workers=args.embed_workers,
+        answer_cache=SemanticCache(max_entries=0),
+        vector_backend=args.vector_backend,
+        embedding_backend=args.embedding_backend,
+        vector_store_path=store_dir,
+        hybrid_search=not args.no_hybrid,
+        rerank_model=args.rerank_model or None,
+        llm=LLMClient(client=fake_client, max_concurrency=1000)
+    )
+    return rag
+
+def close_rag(rag):
+    rag.query_batcher.close()
+    rag.executor.shutdown(wait=True)
+
+def fake_client_from_args(args) -> FakeGenaiClient:
+    return FakeGenaiClient(
+        ttft_ms=args.llm_ttft_ms,
+        tokens_per_second=args.llm_tokens_per_second,
+        answer_tokens=args.llm_answer_tokens
+    )
+
+def measure_recall(rag, top_k: int, dense_only: bool = False) -> float:
+    """Share of questions whose top_k chunks contain the expected phrase
+    
+    Uses the retrieval queries are served with (BM25 + vector fusion and
+    re-ranking when enabled); dense_only measures the vector search alone.
+    """
+    hits = 0
+    for question, phrase in QUESTIONS:
+        embedding = rag.query_batcher.embed(question)
+        if dense_only:
+            chunks = rag.vector_store.search(embedding, top_k=top_k)
+        else:
+            chunks = rag._search(question, embedding, top_k)
+        hits += any(phrase in chunk.lower() for chunk, _ in chunks)
+    return hits / len(QUESTIONS)
+
+def measure_stages(rag, rounds: int) -> dict:
+    """Sequential replay of the question set; per-stage latency from the request traces"""
+    from telemetry import Metrics
+    rag.metrics = Metrics()
+    for _ in range(rounds):
+        for question, _ in QUESTIONS:
+            for _ in rag.query_stream(question):
+                pass
+    return {
+        stage: {name: value for name, value in stats.items() if name != "count"}
+        for stage, stats in rag.metrics.snapshot()["latency"].items()
+    }
+
+async def run_clients(rag, clients: int, rounds: int) -> dict:
+    """N concurrent clients, each streaming the question set `rounds` times"""
+    latencies = []
+    ttfts = []
+    
+    async def client(offset: int):
+        # Clients start at different questions so batches mix
+        order = QUESTIONS[offset % len(QUESTIONS):] + QUESTIONS[:offset % len(QUESTIONS)]
+        for _ in range(rounds):
+            for question, _ in order:
+                started = time.perf_counter()
+                first = None
+                async for _ in rag.aquery_stream(question):
+                    if first is None:
+                        first = time.perf_counter()
+                latencies.append(time.perf_counter() - started)
+                ttfts.append(first - started)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(client(index) for index in range(clients)))
+    wall = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "qps": len(latencies) / wall,
+        "latency": latency_summary(latencies),
+        "ttft": latency_summary(ttfts),
+    }
+
+def measure_cold_start(args, store_dir: str) -> dict:
+    """Start a fresh interpreter over the persisted index and time it to the first search"""
+    command = [
+        sys.executable, os.path.abspath(__file__), "--startup-probe", store_dir,
+        "--vector-backend", args.vector_backend,
+        "--embedding-backend", args.embedding_backend,
+        "--rerank-model", args.rerank_model,
+        "--llm-ttft-ms", str(args.llm_ttft_ms),
+        "--llm-tokens-per-second", str(args.llm_tokens_per_second),
+        "--llm-answer-tokens", str(args.llm_answer_tokens),
+    ]
+    if args.no_hybrid:
+        command.append("--no-hybrid")
+    started = time.perf_counter()
+    result = subprocess.run(command, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        return {"error": f"startup probe exited with {result.returncode}"}
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report["process_s"] = wall
+    return report
+
+def startup_probe(args):
+    """Child side of measure_cold_start: prints one JSON line"""
+    started = time.perf_counter()
+    import rag_system  # noqa: F401 (timed: the heavy imports)
+    imported = time.perf_counter()
+    report = measure_start(args, args.startup_probe)
+    report["import_s"] = imported - started
+    report["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(report))
+
+def measure_start(args, store_dir: str) -> dict:
+    """Load the model and persisted index, warm up and run one search"""
+    started = time.perf_counter()
+    rag = create_rag(args, store_dir, fake_client_from_args(args))
+    loaded = time.perf_counter()
+    rag.warm_up()
+    warmed = time.perf_counter()
+    question = QUESTIONS[0][0]
+    embedding = rag.query_batcher.embed(question)
+    rag._search(question, embedding, args.top_k)
+    first_search = time.perf_counter()
+    close_rag(rag)
+    return {
+        "init_s": loaded - started,
+        "warm_up_s": warmed - loaded,
+        "first_search_ms": (first_search - warmed) * 1000.0,
+        "ready_s": warmed - started,
+    }
+
+def benchmark_scale(args, scale: int, work_dir: str) -> dict:
+    print(f"\n=== Scale {scale}x ===")
+    corpus = build_corpus(args.file, scale, work_dir, seed=args.seed)
+    store_dir = os.path.join(work_dir, f"index_x{scale}")
+    result = {"scale": scale}
+    
+    fake_client = fake_client_from_args(args)
+    rag = create_rag(args, store_dir, fake_client)
+    rss_before = current_rss_mb()
+    started = time.perf_counter()
+    if args.bulk:
+        from bulk_ingest import bulk_ingest
+        bulk_ingest(rag, corpus, workers=args.bulk_workers, batch_size=args.batch_size)
+    else:
+        rag.process_path(corpus, batch_size=args.batch_size)
+    ingest_seconds = time.perf_counter() - started
+    documents = rag.vector_store.count()
+    result["ingest"] = {
+        "documents": documents,
+        "seconds": ingest_seconds,
+        "chunks_per_s": documents / ingest_seconds if ingest_seconds > 0 else None,
+        "rss_growth_mb": current_rss_mb() - rss_before,
+    }
+    print(f"Ingested {documents} chunks in {ingest_seconds:.1f} s")
+    
+    result["recall_at_k"] = measure_recall(rag, args.top_k)
+    result["dense_recall_at_k"] = measure_recall(rag, args.top_k, dense_only=True)
+    print(f"Recall@{args.top_k}: {result['recall_at_k']:.2f} served, {result['dense_recall_at_k']:.2f} dense only")
+    result["stages"] = measure_stages(rag, args.rounds)
+    result["concurrency"] = {}
+    for clients in args.clients:
+        report = asyncio.run(run_clients(rag, clients, args.rounds))
+        result["concurrency"][str(clients)] = report
+        print(f"{clients:>4} clients: {report['qps']:.1f} QPS, p95 {report['latency']['p95_ms']:.0f} ms")
+    result["llm_calls"] = fake_client.calls
+    close_rag(rag)
+    
+    # Warm start: modules imported and model files cached; cold start: fresh process
+    result["warm_start"] = measure_start(args, store_dir)
+    if not args.skip_cold_start:
+        result["cold_start"] = measure_cold_start(args, store_dir)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+def flatten(value, prefix: str = "") -> dict:
+    """Numeric leaves of a nested result as {"a.b.c": value}"""
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix: float(value)}
+    return {}
+
+def higher_is_better(metric: str):
+    """True/False for throughput/latency-like metrics, None for plain counts"""
+    name = metric.rsplit(".", 1)[-1]
+    if name in ("qps", "chunks_per_s") or name.endswith("recall_at_k"):
+        return True
+    if name.endswith(("_ms", "_s", "_mb", "seconds")):
+        return False
+    return None
+
+def compare(baseline_file: str, candidate_file: str, threshold: float) -> int:
+    """Print metric changes between two result files; returns the number of regressions"""
+    with open(baseline_file) as file:
+        baseline = flatten(json.load(file)["results"])
+    with open(candidate_file) as file:
+        candidate = flatten(json.load(file)["results"])
+    
+    regressions = 0
+    print(f"{'metric':<52} {'baseline':>11} {'candidate':>11} {'change':>8}")
+    for metric in sorted(set(baseline) & set(candidate)):
+        old, new = baseline[metric], candidate[metric]
+        change = (new - old) / old if old else 0.0
+        direction = higher_is_better(metric)
+        flag = ""
+        if direction is not None and abs(change) > threshold:
+            worse = change < 0 if direction else change > 0
+            flag = "  REGRESSION" if worse else "  improved"
+            regressions += worse
+        print(f"{metric:<52} {old:>11.3f} {new:>11.3f} {change * 100:>7.1f}%{flag}")
+    print(f"\n{regressions} regression(s) beyond {threshold * 100:.0f}%")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the RAG pipeline (Gemini is simulated)")
+    parser.add_argument("--file", default="Mental_Health_Guide.txt")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100],
+                        help="Corpus sizes as multiples of the guide (1000 takes a while)")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32], help="Concurrent client counts")
+    parser.add_argument("--rounds", type=int, default=2, help="Passes over the question set per client")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=64, help="Chunks per ingest batch")
+    parser.add_argument("--bulk", action="store_true", help="Ingest with bulk_ingest instead of process_path")
+    parser.add_argument("--bulk-workers", type=int, default=None)
+    parser.add_argument("--embed-workers", type=int, default=4)
+    parser.add_argument("--vector-backend", default="chroma")
+    parser.add_argument("--embedding-backend", default="torch")
+    parser.add_argument("--no-hybrid", action="store_true", help="Serve with vector search only (no BM25 fusion)")
+    parser.add_argument("--rerank-model", default="", help="Cross-encoder to re-rank the fused candidates")
+    parser.add_argument("--llm-ttft-ms", type=float, default=300.0, help="Simulated Gemini time to first token")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=100.0)
+    parser.add_argument("--llm-answer-tokens", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-cold-start", action="store_true")
+    parser.add_argument("--work-dir", default=None, help="Corpora and indexes (default: a temporary directory)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"),
+                        help="Compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change reported as a regression")
+    parser.add_argument("--startup-probe", metavar="STORE_DIR", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.compare:
+        sys.exit(1 if compare(args.compare[0], args.compare[1], args.threshold) else 0)
+    if args.startup_probe:
+        startup_probe(args)
+        return
+    
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="rag-bench-")
+    os.makedirs(work_dir, exist_ok=True)
+    try:
+        results = {str(scale): benchmark_scale(args, scale, work_dir) for scale in args.scales}
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    output = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("compare", "startup_probe")},
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(output, file, indent=2)
+    print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,112 @@
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from vector_store import create_vector_store
+
+def make_embeddings(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Random unit vectors, so L2 (Chroma) and cosine (NumPy) rankings agree"""
+    rng = np.random.default_rng(seed)
+    embeddings = rng.normal(size=(n, dim)).astype(np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+def benchmark_backend(backend: str, embeddings: np.ndarray, queries: np.ndarray, top_k: int, batch_size: int,
+                      **store_options):
+    """Time add, single-query search and batched search for one backend"""
+    path = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+    try:
+        store = create_vector_store(backend, path=path, collection_name="benchmark", reset=True, **store_options)
+        documents = [f"document {i}" for i in range(len(embeddings))]
+        ids = [str(i) for i in range(len(embeddings))]
+        
+        started = time.perf_counter()
+        # Chroma caps the size of a single add, so insert in slices
+        for start in range(0, len(embeddings), 5000):
+            end = start + 5000
+            store.add_documents(
+                documents[start:end],
+                embeddings[start:end],
+                ids=ids[start:end],
+                metadatas=[{"source": "benchmark"} for _ in ids[start:end]]
+            )
+        store.flush()
+        add_seconds = time.perf_counter() - started
+        
+        latencies = []
+        results = []
+        for query in queries:
+            started = time.perf_counter()
+            results.append([doc for doc, _ in store.search(query, top_k=top_k)])
+            latencies.append(time.perf_counter() - started)
+        latencies_ms = np.array(latencies) * 1000.0
+        
+        started = time.perf_counter()
+        for start in range(0, len(queries), batch_size):
+            store.search_batch(queries[start:start + batch_size], top_k=top_k)
+        batch_seconds = time.perf_counter() - started
+        
+        # Chroma keeps float32 vectors (plus its HNSW graph, not counted here)
+        memory = store.memory_stats() if hasattr(store, "memory_stats") else None
+        
+        return {
+            "add_s": add_seconds,
+            "search_ms_p50": float(np.percentile(latencies_ms, 50)),
+            "search_ms_p95": float(np.percentile(latencies_ms, 95)),
+            "single_qps": len(queries) / (latencies_ms.sum() / 1000.0),
+            "batch_qps": len(queries) / batch_seconds,
+            "bytes_per_vector": memory["bytes_per_vector"] if memory else 4.0 * embeddings.shape[1],
+            "results": results,
+        }
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the Chroma and NumPy vector store backends and storage modes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 1000, 10000], help="Corpus sizes to test")
+    parser.add_argument("--dim", type=int, default=384, help="Embedding dimension (MiniLM-L12 uses 384)")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries per run")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=32, help="Queries per search_batch call")
+    parser.add_argument("--backends", nargs="+", default=["chroma", "numpy"])
+    parser.add_argument("--storage", nargs="+", default=["float32", "float16", "int8"],
+                        help="NumPy storage modes to compare")
+    parser.add_argument("--rescore-factor", type=int, default=4,
+                        help="Candidates re-scored at full precision, as a multiple of top_k (0 disables)")
+    args = parser.parse_args()
+    
+    print("=== Vector store benchmark ===")
+    for size in args.sizes:
+        embeddings = make_embeddings(size, args.dim, seed=size)
+        queries = make_embeddings(args.queries, args.dim, seed=size + 1)
+        reports = {}
+        for backend in args.backends:
+            if backend != "numpy":
+                reports[backend] = benchmark_backend(backend, embeddings, queries, args.top_k, args.batch_size)
+                continue
+            for storage in args.storage:
+                reports[f"numpy-{storage}"] = benchmark_backend(
+                    backend, embeddings, queries, args.top_k, args.batch_size,
+                    storage=storage, rescore_factor=args.rescore_factor
+                )
+        
+        # Exact brute-force ranking is the reference for recall
+        exact = np.argsort(-(queries @ embeddings.T), axis=1)[:, :args.top_k]
+        
+        print(f"\n--- {size} documents, dim {args.dim}, top_k {args.top_k} ---")
+        print(f"{'backend':<14} {'add s':>8} {'p50 ms':>8} {'p95 ms':>8} {'QPS':>10} {'batch QPS':>10} "
+              f"{'B/vector':>9} {'recall':>7}")
+        for backend, report in reports.items():
+            hits = sum(
+                len({f"document {i}" for i in expected} & set(found))
+                for expected, found in zip(exact, report["results"])
+            )
+            recall = hits / exact.size
+            print(f"{backend:<14} {report['add_s']:>8.3f} {report['search_ms_p50']:>8.3f} "
+                  f"{report['search_ms_p95']:>8.3f} {report['single_qps']:>10.0f} "
+                  f"{report['batch_qps']:>10.0f} {report['bytes_per_vector']:>9.0f} {recall:>7.3f}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,282 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Set
+
+from rag_system import RAGSystem, STATE_EMPTY, STATE_READY
+from txt_processor import TXTProcessor
+
+def read_and_chunk(file_path: str, source: str, chunk_size: int, chunk_overlap: int,
+                   model_key: str, batch_size: int, out_queue) -> None:
+    """Read one file and send its keyed chunks in batches (runs in a worker process)
+    
+    Puts ("chunks", file_path, source, chunks, ids, seconds) for every
+    batch_size chunks and ("done", file_path, source) at the end, so no
+    more than a batch of the file is held here, in the queue or in the
+    parent at a time.
+    """
+    processor = TXTProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks = []
+    ids = []
+    seen_ids = set()
+    started = time.perf_counter()
+    for chunk in processor.iter_chunks(file_path):
+        chunk_id = processor.chunk_id(chunk, source, model_key)
+        # Repeated chunks are only stored once
+        if chunk_id in seen_ids:
+            continue
+        seen_ids.add(chunk_id)
+        chunks.append(chunk)
+        ids.append(chunk_id)
+        if len(ids) >= batch_size:
+            out_queue.put(("chunks", file_path, source, chunks, ids, time.perf_counter() - started))
+            chunks, ids = [], []
+            started = time.perf_counter()
+    if ids:
+        out_queue.put(("chunks", file_path, source, chunks, ids, time.perf_counter() - started))
+    out_queue.put(("done", file_path, source))
+
+class StageStats:
+    """Items processed and busy time for one pipeline stage"""
+    
+    def __init__(self, name: str, parallelism: int = 1):
+        self.name = name
+        self.parallelism = parallelism
+        self.items = 0
+        self.seconds = 0.0
+    
+    def add(self, items: int, seconds: float):
+        self.items += items
+        self.seconds += seconds
+    
+    def report(self) -> Dict:
+        # Busy time is summed over workers, so divide by the parallelism to
+        # get what the stage can sustain as a whole
+        effective_seconds = self.seconds / self.parallelism
+        return {
+            "chunks": self.items,
+            "busy_seconds": round(self.seconds, 3),
+            "workers": self.parallelism,
+            "chunks_per_sec": round(self.items / effective_seconds, 1) if effective_seconds > 0 else None,
+        }
+
+def bulk_ingest(rag, path: str, workers: Optional[int] = None, encode_processes: int = 0,
+                batch_size: int = 256, incremental: bool = True) -> Dict:
+    """Ingest many TXT files in parallel into rag's vector store
+    
+    Reading and chunking run in a process pool, embeddings are computed in
+    batches (across a multi-process SentenceTransformer pool when
+    encode_processes > 1) and a single writer thread inserts into the vector
+    store, so the three stages overlap. Chunks travel from the workers in
+    batches through a bounded queue, so memory stays bounded however large
+    a file is. Writes go to the index generation current at the start,
+    held for the whole run. Chunks of files that are no longer under path
+    are removed. Returns per-stage throughput.
+    """
+    files = rag.txt_processor.find_files(path)
+    if not files:
+        raise FileNotFoundError(f"No TXT files found for: {path}")
+    root = rag.txt_processor.corpus_root(path)
+    source_keys = {file_path: rag.txt_processor.source_key(file_path, root) for file_path in files}
+    workers = workers or os.cpu_count() or 1
+    print(f"BULK INGEST: {len(files)} files, {workers} chunking workers, "
+          f"{encode_processes or 1} encode process(es), batch size {batch_size}")
+    
+    chunk_stats = StageStats("read_chunk", parallelism=min(workers, len(files)))
+    embed_stats = StageStats("embed")
+    write_stats = StageStats("write")
+    started = time.perf_counter()
+    
+    # Held until the end so a hot reload cannot delete it while it is written
+    index = rag.acquire_index()
+    vector_store, lexical_index = index.vector_store, index.lexical_index
+    
+    # Single writer: inserts and deletes are applied in order from one thread
+    write_queue = queue.Queue(maxsize=4)
+    write_errors = []
+    
+    def writer():
+        while True:
+            item = write_queue.get()
+            if item is None:
+                return
+            try:
+                write_started = time.perf_counter()
+                action, payload = item
+                if action == "add":
+                    chunks, ids, sources, embeddings = payload
+                    vector_store.add_documents(
+                        chunks,
+                        embeddings,
+                        ids=ids,
+                        metadatas=[{"source": source} for source in sources]
+                    )
+                    if lexical_index is not None:
+                        lexical_index.add(ids, chunks, sources)
+                    write_stats.add(len(ids), time.perf_counter() - write_started)
+                else:
+                    vector_store.delete(payload)
+                    if lexical_index is not None:
+                        lexical_index.delete(payload)
+            except Exception as e:
+                write_errors.append(e)
+    
+    writer_thread = threading.Thread(target=writer, name="bulk-ingest-writer", daemon=True)
+    writer_thread.start()
+    
+    pool = rag.embedding_generator.start_pool(encode_processes) if encode_processes > 1 else None
+    pending_chunks, pending_ids, pending_sources = [], [], []
+    totals = {"files": len(files), "chunks": 0, "embedded": 0, "stale": 0}
+    # Stored and seen IDs of the files still being chunked
+    existing: Dict[str, Set[str]] = {}
+    seen: Dict[str, Set[str]] = {}
+    
+    def embed_pending():
+        embed_started = time.perf_counter()
+        if pool is not None:
+            embeddings = rag.embedding_generator.generate_embeddings_pool(pending_chunks, pool)
+        else:
+            embeddings = rag.embedding_generator.generate_embeddings(pending_chunks)
+        embed_stats.add(len(pending_chunks), time.perf_counter() - embed_started)
+        write_queue.put(("add", (list(pending_chunks), list(pending_ids), list(pending_sources), embeddings)))
+        totals["embedded"] += len(pending_ids)
+        pending_chunks.clear()
+        pending_ids.clear()
+        pending_sources.clear()
+    
+    def file_started(file_path: str, source: str):
+        existing_ids = vector_store.get_ids(source=source)
+        if not incremental:
+            write_queue.put(("delete", list(existing_ids)))
+            existing_ids = set()
+        existing[file_path] = existing_ids
+        seen[file_path] = set()
+    
+    def file_done(file_path: str):
+        stale_ids = existing.pop(file_path) - seen.pop(file_path)
+        if stale_ids:
+            write_queue.put(("delete", list(stale_ids)))
+            totals["stale"] += len(stale_ids)
+    
+    try:
+        with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=workers) as executor:
+            # Bounded: workers wait while the embedder is behind
+            chunk_queue = manager.Queue(maxsize=2 * workers)
+            futures = [
+                executor.submit(
+                    read_and_chunk,
+                    file_path,
+                    source_keys[file_path],
+                    rag.txt_processor.chunk_size,
+                    rag.txt_processor.chunk_overlap,
+                    rag.embedding_generator.model_key,
+                    batch_size,
+                    chunk_queue
+                )
+                for file_path in files
+            ]
+            try:
+                done = 0
+                while done < len(files):
+                    try:
+                        message = chunk_queue.get(timeout=0.5)
+                    except queue.Empty:
+                        # A worker that failed never reports its file as done
+                        for future in futures:
+                            if future.done() and future.exception() is not None:
+                                raise future.exception()
+                        continue
+                    kind, file_path, source = message[:3]
+                    if file_path not in existing:
+                        file_started(file_path, source)
+                    if kind == "done":
+                        file_done(file_path)
+                        done += 1
+                        print(f"BULK INGEST: {done}/{len(files)} files chunked, {totals['embedded']} chunks embedded")
+                        continue
+                    chunks, ids, seconds = message[3:]
+                    chunk_stats.add(len(chunks), seconds)
+                    totals["chunks"] += len(chunks)
+                    seen[file_path].update(ids)
+                    for chunk, chunk_id in zip(chunks, ids):
+                        if chunk_id in existing[file_path]:
+                            continue
+                        pending_chunks.append(chunk)
+                        pending_ids.append(chunk_id)
+                        pending_sources.append(source)
+                        if len(pending_ids) >= batch_size:
+                            embed_pending()
+            except BaseException:
+                # Workers may be blocked on the full queue: drain it until they stop
+                for future in futures:
+                    future.cancel()
+                while not all(future.done() for future in futures):
+                    try:
+                        chunk_queue.get(timeout=0.1)
+                    except queue.Empty:
+                        pass
+                raise
+            if pending_ids:
+                embed_pending()
+        
+        write_queue.put(None)
+        writer_thread.join()
+        if write_errors:
+            raise write_errors[0]
+        # Files deleted, renamed or moved out of the path
+        totals["stale"] += rag.prune_sources(set(source_keys.values()), index)
+        rag.persist_index(index)
+        
+        if index is rag.index:
+            # Cached answers may be based on content that just changed
+            if totals["embedded"] or totals["stale"]:
+                rag.answer_cache.invalidate()
+            rag.state = STATE_READY if vector_store.count() > 0 else STATE_EMPTY
+        else:
+            print("BULK INGEST: A hot reload replaced the index while ingesting; "
+                  "these changes were written to the retired generation")
+    finally:
+        if writer_thread.is_alive():
+            write_queue.put(None)
+            writer_thread.join()
+        if pool is not None:
+            rag.embedding_generator.stop_pool(pool)
+        index.release()
+    
+    wall_seconds = time.perf_counter() - started
+    report = dict(totals)
+    report["wall_seconds"] = round(wall_seconds, 3)
+    report["chunks_per_sec"] = round(totals["chunks"] / wall_seconds, 1) if wall_seconds > 0 else None
+    report["stages"] = {stats.name: stats.report() for stats in (chunk_stats, embed_stats, write_stats)}
+    print(f"BULK INGEST: Done - {report}")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest many TXT files into the vector store in parallel")
+    parser.add_argument("path", help="TXT file, directory or glob pattern")
+    parser.add_argument("--workers", type=int, default=None, help="Processes for reading and chunking (default: CPU count)")
+    parser.add_argument("--encode-processes", type=int, default=0, help="Processes for embedding (0 or 1 encodes in-process)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks per embedding batch")
+    parser.add_argument("--backend", default=os.environ.get("VECTOR_BACKEND", "chroma"), help="Vector store backend")
+    parser.add_argument("--embedding-backend", default=os.environ.get("EMBEDDING_BACKEND", "torch"),
+                        help="Embedding backend (torch, torch-int8, onnx, onnx-int8)")
+    parser.add_argument("--full", action="store_true", help="Re-embed everything instead of only new chunks")
+    args = parser.parse_args()
+    
+    rag = RAGSystem(api_key=os.environ.get("GEMINI_API_KEY", ""), vector_backend=args.backend,
+                    embedding_backend=args.embedding_backend)
+    bulk_ingest(
+        rag,
+        args.path,
+        workers=args.workers,
+        encode_processes=args.encode_processes,
+        batch_size=args.batch_size,
+        incremental=not args.full
+    )
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,111 @@
+import math
+from typing import Dict, List, Tuple
+
+class ContextBuilder:
+    """Assembles retrieved chunks into a compact, token-budgeted context
+    
+    Neighbouring chunks from TXTProcessor share up to chunk_overlap
+    characters, so retrieved chunks are merged where one ends with the start
+    of another (or contains it), then packed in rank order until the token
+    budget is used up. Tokens are estimated from the character count.
+    """
+    
+    def __init__(self, token_budget: int = 1200, chars_per_token: float = 4.0,
+                 min_overlap: int = 40, max_overlap: int = 400):
+        self.token_budget = token_budget
+        self.chars_per_token = chars_per_token
+        # Overlaps shorter than this are treated as coincidence
+        self.min_overlap = min_overlap
+        # Longest overlap searched for (must cover TXTProcessor.chunk_overlap)
+        self.max_overlap = max_overlap
+    
+    def estimate_tokens(self, text: str) -> int:
+        """Rough token count for Gemini (about four characters per token)"""
+        return math.ceil(len(text) / self.chars_per_token)
+    
+    def _overlap(self, first: str, second: str) -> int:
+        """Length of the longest suffix of first that is also a prefix of second"""
+        probe = second[:self.min_overlap]
+        if len(probe) < self.min_overlap:
+            return 0
+        position = first.find(probe, max(0, len(first) - self.max_overlap))
+        while position != -1:
+            if second.startswith(first[position:]):
+                return len(first) - position
+            position = first.find(probe, position + 1)
+        return 0
+    
+    def _try_merge(self, first: str, second: str):
+        """Merged text of two chunks, or None if they do not overlap"""
+        if second in first:
+            return first
+        if first in second:
+            return second
+        overlap = self._overlap(first, second)
+        if overlap:
+            return first + second[overlap:]
+        overlap = self._overlap(second, first)
+        if overlap:
+            return second + first[overlap:]
+        return None
+    
+    def merge(self, chunks: List[str]) -> List[str]:
+        """Merge duplicate, contained and overlapping chunks, keeping rank order"""
+        merged: List[str] = []
+        for chunk in chunks:
+            merged.append(chunk)
+            # A new chunk can bridge two earlier ones, so keep merging until stable
+            changed = True
+            while changed:
+                changed = False
+                for i in range(len(merged)):
+                    for j in range(i + 1, len(merged)):
+                        combined = self._try_merge(merged[i], merged[j])
+                        if combined is not None:
+                            merged[i] = combined
+                            del merged[j]
+                            changed = True
+                            break
+                    if changed:
+                        break
+        return merged
+    
+    def _truncate(self, text: str, max_chars: int) -> str:
+        """Cut text to max_chars, preferring a sentence or word boundary"""
+        if len(text) <= max_chars:
+            return text
+        cut = text[:max_chars]
+        for delimiter in ['. ', '\n', ' ']:
+            position = cut.rfind(delimiter)
+            if position > max_chars // 2:
+                return cut[:position + len(delimiter)].rstrip()
+        return cut
+    
+    def build(self, relevant_chunks: List[Tuple[str, float]]) -> Tuple[str, Dict]:
+        """Return the packed context and a report on what was removed"""
+        chunks = [chunk for chunk, _ in relevant_chunks]
+        raw_context = "\n\n".join(chunks)
+        merged = self.merge(chunks)
+        
+        parts = []
+        used_tokens = 0
+        for chunk in merged:
+            tokens = self.estimate_tokens(chunk)
+            if used_tokens + tokens > self.token_budget:
+                # The best-ranked chunk is always included, truncated if needed;
+                # lower-ranked ones are skipped but a shorter one may still fit
+                if not parts:
+                    parts.append(self._truncate(chunk, int(self.token_budget * self.chars_per_token)))
+                    used_tokens += self.estimate_tokens(parts[0])
+                continue
+            parts.append(chunk)
+            used_tokens += tokens
+        
+        context = "\n\n".join(parts)
+        return context, {
+            "chunks_retrieved": len(chunks),
+            "chunks_after_merge": len(merged),
+            "chunks_packed": len(parts),
+            "raw_context_tokens": self.estimate_tokens(raw_context),
+            "context_tokens": self.estimate_tokens(context),
+        }
\ No newline at end of file
@@ -0,0 +1,115 @@
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Dict
+
+import numpy as np
+
+class EmbeddingBatcher:
+    """Collects query embeddings that arrive close together into one encode call"""
+    
+    def __init__(self, embedding_generator, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.embedding_generator = embedding_generator
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        
+        # Metrics (recent queueing delays are kept for percentiles)
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._batch_sizes = Counter()
+        self._queue_delays = deque(maxlen=1000)
+        self._encode_seconds = 0.0
+        
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+    
+    def submit(self, text: str) -> Future:
+        """Queue a text for embedding; the future resolves to its embedding"""
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+    
+    def embed(self, text: str) -> np.ndarray:
+        """Embed a single text, blocking until its batch has been encoded"""
+        return self.submit(text).result()
+    
+    def close(self):
+        """Stop the worker thread after the queued texts are encoded"""
+        self._queue.put(None)
+        self._thread.join()
+    
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            
+            # Keep collecting until the window closes or the batch is full
+            batch = [item]
+            deadline = time.perf_counter() + self.max_wait
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            try:
+                self._process(batch)
+            except Exception as e:
+                # Never let one bad batch stop the worker: later embeds would hang
+                print(f"EMBEDDING BATCHER ERROR: {e}")
+            if stopping:
+                return
+    
+    def _process(self, batch):
+        # Drop texts whose caller gave up (a cancelled async query); the rest
+        # can no longer be cancelled, so setting their results cannot fail
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        texts = [text for text, _, _ in batch]
+        started = time.perf_counter()
+        try:
+            embeddings = self.embedding_generator.generate_embeddings(texts)
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        finished = time.perf_counter()
+        
+        with self._lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._batch_sizes[len(batch)] += 1
+            self._queue_delays.extend(started - enqueued for _, _, enqueued in batch)
+            self._encode_seconds += finished - started
+        
+        for (_, future, _), embedding in zip(batch, embeddings):
+            future.set_result(embedding)
+    
+    def get_metrics(self) -> Dict:
+        """Batch size and queueing delay statistics"""
+        with self._lock:
+            delays_ms = np.array(self._queue_delays) * 1000.0
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "queue_depth": self._queue.qsize(),
+                "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+                "batch_size_counts": dict(sorted(self._batch_sizes.items())),
+                "avg_encode_ms": self._encode_seconds * 1000.0 / self._batches if self._batches else 0.0,
+                "queue_delay_ms_avg": float(delays_ms.mean()) if len(delays_ms) else 0.0,
+                "queue_delay_ms_p50": float(np.percentile(delays_ms, 50)) if len(delays_ms) else 0.0,
+                "queue_delay_ms_p95": float(np.percentile(delays_ms, 95)) if len(delays_ms) else 0.0,
+                "queue_delay_ms_max": float(delays_ms.max()) if len(delays_ms) else 0.0,
+            }
\ No newline at end of file
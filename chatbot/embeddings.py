@@ -1,33 +1,119 @@
+import logging
 from typing import List
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger("EMBEDDINGS")
+
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+
+# Inference backends for the embedding model:
+#   torch       - full-precision PyTorch (the original behaviour)
+#   torch-int8  - PyTorch with Linear layers dynamically quantized to int8
+#   onnx        - ONNX Runtime, exported from the PyTorch weights if needed
+#   onnx-int8   - ONNX Runtime with an int8-quantized graph published with the model
+# The ONNX backends need the optional extra: pip install "sentence-transformers[onnx]"
+EMBEDDING_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+# Quantized graphs published in the model repository, one per CPU instruction set
+ONNX_INT8_FILES = (
+    "onnx/model_quint8_avx2.onnx",
+    "onnx/model_qint8_avx512.onnx",
+    "onnx/model_qint8_avx512_vnni.onnx",
+    "onnx/model_qint8_arm64.onnx",
+)
+ONNX_INT8_FILE = ONNX_INT8_FILES[0]
+
+class EmbeddingError(RuntimeError):
+    """The model failed to encode a batch of texts"""
 
 class EmbeddingGenerator:
     """Generates embeddings using Sentence Transformers (all-MiniLM-L6-v2)"""
     
-    def __init__(self, api_key: str = None):
-        print("Initializing Sentence Transformer model...")
+    def __init__(self, api_key: str = None, model_name: str = MODEL_NAME, backend: str = "torch",
+                 onnx_int8_file: str = ONNX_INT8_FILE):
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown embedding backend: {backend} (expected one of {EMBEDDING_BACKENDS})")
+        # Imported here: sentence_transformers pulls in torch, which takes seconds
+        from sentence_transformers import SentenceTransformer
+        
+        print(f"Initializing Sentence Transformer model ({backend} backend)...")
+        self.model_name = model_name
+        self.backend = backend
+        self.onnx_int8_file = onnx_int8_file
         # Load the model - this will download it on first run
-        self.model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
+        if backend in ("onnx", "onnx-int8"):
+            self.model = self._load_onnx(SentenceTransformer, model_name, backend, onnx_int8_file)
+        else:
+            self.model = SentenceTransformer(model_name)
+            if backend == "torch-int8":
+                import torch
+                self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.dimension = self.model.get_sentence_embedding_dimension()
         print("Sentence Transformer model initialized!")
     
+    @staticmethod
+    def _load_onnx(model_class, model_name: str, backend: str, onnx_int8_file: str):
+        """Load the ONNX graph, explaining the two usual failures"""
+        model_kwargs = {"file_name": onnx_int8_file} if backend == "onnx-int8" else None
+        try:
+            return model_class(model_name, backend="onnx", model_kwargs=model_kwargs)
+        except ImportError as e:
+            raise RuntimeError(f"The {backend} embedding backend needs ONNX Runtime: "
+                               f"pip install \"sentence-transformers[onnx]\" ({e})") from e
+        except Exception as e:
+            if backend != "onnx-int8":
+                raise
+            raise RuntimeError(f"Could not load the int8 graph {onnx_int8_file} of {model_name}: {e}. "
+                               f"Published graphs: {', '.join(ONNX_INT8_FILES)}; pick the one for this "
+                               f"CPU (EMBEDDING_ONNX_FILE) or use the onnx backend") from e
+    
+    @property
+    def model_key(self) -> str:
+        """Identifies the vectors this generator produces (model + backend)
+        
+        Recorded with the index: vectors from different backends differ
+        slightly and must never be compared with each other. The int8 graphs
+        for different instruction sets are quantized differently, so the
+        graph file is part of the key.
+        """
+        if self.backend == "onnx-int8":
+            graph = self.onnx_int8_file.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+            return f"{self.model_name}@{self.backend}:{graph}"
+        return f"{self.model_name}@{self.backend}"
+    
     def update_api_key(self, api_key: str):
         """Update API key (not needed for local embeddings)"""
         pass
     
-    def generate_embeddings(self, texts: List[str]) -> List[np.ndarray]:
-        """Generate embeddings for a list of texts"""
-        print(f"EMBEDDINGS: Generating embeddings for {len(texts)} texts...")
+    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Generate embeddings for a list of texts as one (len(texts), dimension) float32 array
+        
+        Raises EmbeddingError if encoding fails. There is no zero-vector
+        fallback: ingested vectors are stored under content-addressed IDs and
+        never re-embedded, so placeholder vectors would stay in the index.
+        """
+        logger.debug(f"Generating embeddings for {len(texts)} texts...")
         try:
             # Generate embeddings
             # convert_to_numpy=True is default, but being explicit
             embeddings = self.model.encode(texts, convert_to_numpy=True)
-            print(f"EMBEDDINGS: Successfully generated {len(embeddings)} embeddings")
-            return list(embeddings)
+            logger.debug(f"Successfully generated {len(embeddings)} embeddings")
+            # encode already returns a 2-D float32 array, so this does not copy
+            return np.asarray(embeddings, dtype=np.float32)
         except Exception as e:
-            print(f"EMBEDDINGS ERROR: {e}")
-            import traceback
-            traceback.print_exc()
-            # Return empty embeddings in case of error (fallback)
-            # 384 is the dimension for all-MiniLM-L6-v2
-            return [np.zeros(384) for _ in texts]
\ No newline at end of file
+            logger.exception(f"Embedding failed: {e}")
+            raise EmbeddingError(f"Embedding failed for {len(texts)} texts: {e}") from e
+    
+    def start_pool(self, num_processes: int):
+        """Start a multi-process encode pool with num_processes CPU workers"""
+        print(f"EMBEDDINGS: Starting multi-process pool with {num_processes} workers...")
+        return self.model.start_multi_process_pool(target_devices=["cpu"] * num_processes)
+    
+    def stop_pool(self, pool):
+        """Stop a pool created by start_pool"""
+        self.model.stop_multi_process_pool(pool)
+    
+    def generate_embeddings_pool(self, texts: List[str], pool) -> np.ndarray:
+        """Generate embeddings for a list of texts across a multi-process pool (2-D float32 array)"""
+        print(f"EMBEDDINGS: Generating embeddings for {len(texts)} texts across processes...")
+        embeddings = self.model.encode_multi_process(texts, pool)
+        return np.asarray(embeddings, dtype=np.float32)
\ No newline at end of file
@@ -0,0 +1,199 @@
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from fake_genai import ANSWER_WORDS
+
+# Google API error statuses for the codes the server can return
+ERROR_STATUS = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE"}
+
+class FakeGeminiServer:
+    """Local HTTP server speaking the Gemini generateContent REST API
+    
+    Point the real client at it (create_genai_client(key, base_url=...) or
+    GEMINI_BASE_URL) to exercise timeouts, retries, hedging and rate limits
+    without network access or quota. Behaviour is set by the config dict and
+    can be changed at runtime with POST /admin/config; GET /admin/stats
+    returns request counts.
+    """
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **config):
+        self.config = {
+            "ttft_ms": 200.0,          # delay before the first chunk
+            "tokens_per_second": 200.0,
+            "answer_tokens": 60,
+            "chunk_tokens": 8,
+            "fail_rate": 0.0,          # share of requests answered with 500/503
+            "throttle_rate": 0.0,      # share of requests answered with 429
+            "slow_rate": 0.0,          # share of requests delayed by slow_ms (tail latency)
+            "slow_ms": 2000.0,
+        }
+        self.config.update(config)
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0, "slow": 0}
+        self._lock = threading.Lock()
+        self._random = random.Random(self.config.pop("seed", 0))
+        handler = type("FakeGeminiHandler", (_Handler,), {"server_state": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+    
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self) -> "FakeGeminiServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-gemini", daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+    
+    def plan(self) -> Dict:
+        """Draw the fate of one request: an error code or the delays to apply"""
+        with self._lock:
+            config = dict(self.config)
+            self.stats["requests"] += 1
+            draw = self._random.random()
+            error = None
+            if draw < config["throttle_rate"]:
+                error = 429
+                self.stats["throttled"] += 1
+            elif draw < config["throttle_rate"] + config["fail_rate"]:
+                error = self._random.choice((500, 503))
+                self.stats["errors"] += 1
+            slow = error is None and self._random.random() < config["slow_rate"]
+            if slow:
+                self.stats["slow"] += 1
+        ttft = config["ttft_ms"] + (config["slow_ms"] if slow else 0.0)
+        return {"error": error, "ttft": ttft / 1000.0, "config": config}
+
+class _Handler(BaseHTTPRequestHandler):
+    server_state: FakeGeminiServer = None
+    protocol_version = "HTTP/1.1"
+    
+    def do_GET(self):
+        if self.path.split("?")[0] == "/admin/stats":
+            with self.server_state._lock:
+                self._send_json(200, dict(self.server_state.stats))
+            return
+        self._send_error(404, "NOT_FOUND", "Not found")
+    
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        path = self.path.split("?")[0]
+        if path == "/admin/config":
+            with self.server_state._lock:
+                self.server_state.config.update(json.loads(body or b"{}"))
+                self._send_json(200, dict(self.server_state.config))
+            return
+        if path.endswith(":generateContent"):
+            self._generate(body, stream=False)
+        elif path.endswith(":streamGenerateContent"):
+            self._generate(body, stream=True)
+        else:
+            self._send_error(404, "NOT_FOUND", f"Unknown method {path}")
+    
+    def _generate(self, body: bytes, stream: bool):
+        plan = self.server_state.plan()
+        config = plan["config"]
+        time.sleep(plan["ttft"])
+        if plan["error"]:
+            code = plan["error"]
+            self._send_error(code, ERROR_STATUS[code], "Simulated failure")
+            return
+        
+        words = [ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(int(config["answer_tokens"]))]
+        size = max(1, int(config["chunk_tokens"]))
+        chunks = [" ".join(words[i:i + size]) + " " for i in range(0, len(words), size)]
+        interval = size / config["tokens_per_second"] if config["tokens_per_second"] > 0 else 0.0
+        prompt_tokens = len(body) // 4
+        
+        if not stream:
+            time.sleep(interval * len(chunks))
+            self._send_json(200, _response("".join(chunks), prompt_tokens, len(words)))
+            return
+        
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for index, chunk in enumerate(chunks):
+                if index:
+                    time.sleep(interval)
+                last = index == len(chunks) - 1
+                event = _response(chunk, prompt_tokens, len(words) if last else None)
+                self._write_chunk(f"data: {json.dumps(event)}\r\n\r\n".encode("utf-8"))
+            self._write_chunk(b"")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client gave up (timeout or a hedged request that lost the race)
+            self.close_connection = True
+    
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+    
+    def _send_json(self, code: int, payload: Dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def _send_error(self, code: int, status: str, message: str):
+        self._send_json(code, {"error": {"code": code, "message": message, "status": status}})
+    
+    def log_message(self, format, *args):
+        pass
+
+def _response(text: str, prompt_tokens: int, candidate_tokens: Optional[int]) -> Dict:
+    response = {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}],
+        "modelVersion": "fake-gemini",
+    }
+    if candidate_tokens is not None:
+        response["candidates"][0]["finishReason"] = "STOP"
+        response["usageMetadata"] = {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": candidate_tokens,
+            "totalTokenCount": prompt_tokens + candidate_tokens,
+        }
+    return response
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake of the Gemini REST API for resilience testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft-ms", type=float, default=200.0)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Share of requests failing with 500/503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of requests failing with 429")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of requests delayed by --slow-ms")
+    parser.add_argument("--slow-ms", type=float, default=2000.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    server = FakeGeminiServer(
+        args.host, args.port, ttft_ms=args.ttft_ms, tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens, fail_rate=args.fail_rate, throttle_rate=args.throttle_rate,
+        slow_rate=args.slow_rate, slow_ms=args.slow_ms, seed=args.seed
+    )
+    print(f"FAKE GEMINI: Listening on {server.base_url} (set GEMINI_BASE_URL to use it)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
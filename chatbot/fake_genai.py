@@ -0,0 +1,89 @@
+import asyncio
+import time
+from typing import Iterator, List
+
+# Filler for simulated answers (about one token per word)
+ANSWER_WORDS = ("I'm sorry you're going through this. Here are a few things that can help: "
+                "take slow breaths, talk to someone you trust and consider contacting a "
+                "counsellor if it keeps affecting your studies or sleep.").split()
+
+class FakeUsageMetadata:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.cached_content_token_count = 0
+
+class FakeResponse:
+    def __init__(self, text: str, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+class FakeGenaiClient:
+    """Offline stand-in for google.genai.Client with simulated latency
+    
+    Supports the calls RAGSystem makes: models.generate_content(_stream)
+    and their aio counterparts. Each answer waits ttft_ms before the first
+    token, then produces tokens_per_second tokens in chunks of chunk_tokens.
+    """
+    
+    def __init__(self, ttft_ms: float = 300.0, tokens_per_second: float = 100.0,
+                 answer_tokens: int = 120, chunk_tokens: int = 8):
+        self.ttft = ttft_ms / 1000.0
+        self.token_interval = 1.0 / tokens_per_second if tokens_per_second > 0 else 0.0
+        self.answer_tokens = answer_tokens
+        self.chunk_tokens = chunk_tokens
+        self.calls = 0
+        self.models = _FakeModels(self)
+        self.aio = _FakeAio(_FakeAsyncModels(self))
+    
+    def _chunks(self) -> List[str]:
+        words = [ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(self.answer_tokens)]
+        return [" ".join(words[i:i + self.chunk_tokens]) + " " for i in range(0, len(words), self.chunk_tokens)]
+    
+    def _usage(self, contents) -> FakeUsageMetadata:
+        self.calls += 1
+        return FakeUsageMetadata(len(str(contents)) // 4, self.answer_tokens)
+
+class _FakeModels:
+    def __init__(self, client: FakeGenaiClient):
+        self._client = client
+    
+    def generate_content(self, model: str, contents, config=None) -> FakeResponse:
+        chunks = self._client._chunks()
+        time.sleep(self._client.ttft + self._client.token_interval * self._client.answer_tokens)
+        return FakeResponse("".join(chunks), self._client._usage(contents))
+    
+    def generate_content_stream(self, model: str, contents, config=None) -> Iterator[FakeResponse]:
+        chunks = self._client._chunks()
+        time.sleep(self._client.ttft)
+        for index, chunk in enumerate(chunks):
+            time.sleep(self._client.token_interval * self._client.chunk_tokens)
+            # Usage is reported on the last chunk, as by the real API
+            usage = self._client._usage(contents) if index == len(chunks) - 1 else None
+            yield FakeResponse(chunk, usage)
+
+class _FakeAsyncModels:
+    def __init__(self, client: FakeGenaiClient):
+        self._client = client
+    
+    async def generate_content(self, model: str, contents, config=None) -> FakeResponse:
+        chunks = self._client._chunks()
+        await asyncio.sleep(self._client.ttft + self._client.token_interval * self._client.answer_tokens)
+        return FakeResponse("".join(chunks), self._client._usage(contents))
+    
+    async def generate_content_stream(self, model: str, contents, config=None):
+        client = self._client
+        
+        async def stream():
+            chunks = client._chunks()
+            await asyncio.sleep(client.ttft)
+            for index, chunk in enumerate(chunks):
+                await asyncio.sleep(client.token_interval * client.chunk_tokens)
+                usage = client._usage(contents) if index == len(chunks) - 1 else None
+                yield FakeResponse(chunk, usage)
+        
+        return stream()
+
+class _FakeAio:
+    def __init__(self, models: _FakeAsyncModels):
+        self.models = models
\ No newline at end of file
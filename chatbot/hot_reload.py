@@ -0,0 +1,231 @@
+import glob
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Tuple
+
+def generation_path(base_path: str, number: int) -> str:
+    """Directory of index generation `number` (generation 0 is the base directory itself)"""
+    return base_path if number == 0 else f"{base_path}.gen{number}"
+
+def read_current_generation(base_path: str) -> int:
+    """Generation recorded as current next to base_path, 0 if none"""
+    pointer = f"{base_path}.current"
+    if not os.path.exists(pointer):
+        return 0
+    try:
+        with open(pointer, 'r', encoding='utf-8') as file:
+            number = int(file.read().strip())
+    except (OSError, ValueError) as e:
+        print(f"HOT RELOAD ERROR: Could not read {pointer}, using generation 0: {e}")
+        return 0
+    if not os.path.isdir(generation_path(base_path, number)):
+        print(f"HOT RELOAD ERROR: Generation {number} is missing, using generation 0")
+        return 0
+    return number
+
+def write_current_generation(base_path: str, number: int):
+    """Record the current generation so a restart opens the same index"""
+    pointer = f"{base_path}.current"
+    # Written to a temporary file first so a crash never leaves a half-written pointer
+    with open(pointer + ".tmp", 'w', encoding='utf-8') as file:
+        file.write(str(number))
+    os.replace(pointer + ".tmp", pointer)
+
+def remove_stale_generations(base_path: str, current: int):
+    """Delete generations left behind by an interrupted reload or a crash before cleanup"""
+    stale = [] if current == 0 else [base_path]
+    for path in glob.glob(f"{glob.escape(base_path)}.gen*"):
+        suffix = path[len(base_path) + 4:]
+        if suffix.isdigit() and int(suffix) != current:
+            stale.append(path)
+    for path in stale:
+        if os.path.isdir(path):
+            print(f"HOT RELOAD: Removing stale index generation {path}")
+            shutil.rmtree(path, ignore_errors=True)
+
+class IndexGeneration:
+    """One version of the index: a vector store and its BM25 index
+    
+    Searches hold a reference while they run. Once a newer generation is
+    swapped in, this one is retired and its files are deleted as soon as
+    the last search using it releases it.
+    """
+    
+    def __init__(self, number: int, vector_store, lexical_index=None):
+        self.number = number
+        self.vector_store = vector_store
+        self.lexical_index = lexical_index
+        self.path = vector_store.path
+        self._lock = threading.Lock()
+        self._refs = 0
+        self._retired = False
+        self._collected = False
+    
+    def acquire(self):
+        with self._lock:
+            self._refs += 1
+    
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+            collect = self._retired and self._refs == 0 and not self._collected
+            self._collected = self._collected or collect
+        if collect:
+            self._collect()
+    
+    def retire(self):
+        """Mark the generation as replaced; it is deleted once no search uses it"""
+        with self._lock:
+            self._retired = True
+            collect = self._refs == 0 and not self._collected
+            self._collected = self._collected or collect
+        if collect:
+            self._collect()
+    
+    def in_use(self) -> int:
+        with self._lock:
+            return self._refs
+    
+    def _collect(self):
+        print(f"HOT RELOAD: Removing index generation {self.number} ({self.path})")
+        # Chroma keeps a connection and loaded segments per path until closed
+        self.vector_store.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+class HotReloader:
+    """Rebuilds the knowledge base in the background and swaps it in atomically
+    
+    A reload builds a new index generation next to the current one, reusing
+    the stored embedding of every chunk whose content ID is unchanged, then
+    swaps it in with RAGSystem.swap_index. Searches already running finish
+    on the old generation, which is deleted afterwards; the answer cache is
+    invalidated on the swap.
+    
+    Reloads run on a background thread, when trigger() is called (e.g. from
+    an admin endpoint) or, with interval_s > 0, when the source files' size
+    or modification time changed and then stayed the same for one interval.
+    """
+    
+    def __init__(self, rag, path: str, interval_s: float = 0.0, batch_size: int = 64):
+        self.rag = rag
+        self.path = path
+        self.interval_s = interval_s
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._requested = False
+        self._stopping = False
+        self._thread = None
+        # Highest generation number handed out; a failed reload never reuses its number
+        self._last_generation = rag.index.number
+        # Fingerprint of the files the current generation was built from
+        self._loaded = self._fingerprint()
+        self.stats = {"reloads": 0, "failures": 0, "last_seconds": 0.0, "last_error": "", "reloading": False}
+    
+    def _fingerprint(self) -> Tuple[Tuple[str, int, int], ...]:
+        fingerprint = []
+        for file_path in self.rag.txt_processor.find_files(self.path):
+            try:
+                status = os.stat(file_path)
+            except OSError:
+                continue
+            fingerprint.append((file_path, status.st_mtime_ns, status.st_size))
+        return tuple(fingerprint)
+    
+    def start(self):
+        """Start the background thread (watching the files if interval_s > 0)"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="hot-reload", daemon=True)
+            self._thread.start()
+            if self.interval_s > 0:
+                print(f"HOT RELOAD: Watching {self.path} every {self.interval_s:g} s")
+    
+    def stop(self):
+        self._stopping = True
+        self._wake.set()
+    
+    def trigger(self):
+        """Ask the background thread to reload now"""
+        self._requested = True
+        self._wake.set()
+    
+    def _run(self):
+        changed = None
+        while not self._stopping:
+            self._wake.wait(self.interval_s if self.interval_s > 0 else None)
+            self._wake.clear()
+            if self._stopping:
+                return
+            if self._requested:
+                self._requested = False
+                changed = None
+                self._reload_logged()
+                continue
+            fingerprint = self._fingerprint()
+            if fingerprint == self._loaded:
+                changed = None
+            elif fingerprint == changed:
+                # Unchanged for a whole interval: the files are no longer being written
+                changed = None
+                self._reload_logged()
+            else:
+                changed = fingerprint
+    
+    def _reload_logged(self):
+        try:
+            self.reload()
+        except Exception as e:
+            print(f"HOT RELOAD ERROR: {e}")
+    
+    def reload(self) -> Dict:
+        """Build a new generation from the source files and swap it in (blocking)"""
+        with self._lock:
+            fingerprint = self._fingerprint()
+            files: List[str] = [file_path for file_path, _, _ in fingerprint]
+            if not files:
+                raise FileNotFoundError(f"No TXT files found for: {self.path}")
+            
+            root = self.rag.txt_processor.corpus_root(self.path)
+            started = time.perf_counter()
+            self.stats["reloading"] = True
+            old = self.rag.acquire_index()
+            new = None
+            # A fresh number every attempt: a failed generation's path may hold
+            # half-written files, and Chroma caches its client per path
+            number = max(old.number, self._last_generation) + 1
+            self._last_generation = number
+            try:
+                new = self.rag.open_generation(number, fresh=True)
+                print(f"HOT RELOAD: Building index generation {new.number} from {len(files)} file(s)...")
+                chunks = 0
+                for file_path in files:
+                    # swap_index persists the generation once it is complete
+                    chunks += self.rag.process_file(
+                        file_path, batch_size=self.batch_size, index=new, reuse=old, persist=False,
+                        source=self.rag.txt_processor.source_key(file_path, root)
+                    )
+                self.rag.swap_index(new)
+            except Exception as e:
+                if new is not None:
+                    new.retire()
+                self.stats["failures"] += 1
+                self.stats["last_error"] = str(e)
+                raise
+            finally:
+                old.release()
+                self.stats["reloading"] = False
+            
+            self._loaded = fingerprint
+            seconds = time.perf_counter() - started
+            self.stats["reloads"] += 1
+            self.stats["last_seconds"] = seconds
+            self.stats["last_error"] = ""
+            print(f"HOT RELOAD: Generation {new.number} is live ({chunks} chunks, {seconds:.1f} s)")
+            return self.get_stats()
+    
+    def get_stats(self) -> Dict:
+        stats = dict(self.stats)
+        stats["generation"] = self.rag.index.number
+        return stats
\ No newline at end of file
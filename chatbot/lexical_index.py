@@ -0,0 +1,175 @@
+import heapq
+import json
+import math
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Very common English words carry no ranking signal and bloat the postings
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "for", "from", "how",
+    "i", "if", "in", "is", "it", "me", "my", "of", "on", "or", "so", "that", "the", "this",
+    "to", "was", "what", "when", "with", "you", "your",
+}
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word and number tokens (numbers such as "988" are kept)"""
+    return [token for token in re.findall(r"\w+", text.lower()) if token not in STOPWORDS]
+
+def reciprocal_rank_fusion(result_lists: Sequence[List[Tuple[str, float]]], k: int = 60) -> List[Tuple[str, float]]:
+    """Merge ranked (document, score) lists; each list adds 1 / (k + rank) per document
+    
+    Only ranks are used, so dense distances and BM25 scores need no
+    calibration against each other.
+    """
+    fused: Dict[str, float] = {}
+    for results in result_lists:
+        for rank, (document, _) in enumerate(results, start=1):
+            fused[document] = fused.get(document, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+class LexicalIndex:
+    """BM25 inverted index over the stored chunks, persisted as JSON
+    
+    Kept in step with the vector store by chunk ID: ingest adds and deletes
+    the same IDs in both, and save() writes the index next to the vector
+    index. Per-chunk term counts are persisted so loading only rebuilds the
+    postings, without re-tokenizing.
+    """
+    
+    def __init__(self, path: str = "./lexical_index", name: str = "mental_health_docs",
+                 k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        os.makedirs(path, exist_ok=True)
+        self.file_path = os.path.join(path, f"{name}.bm25.json")
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # id -> (document, source, length)
+        self._docs: Dict[str, Tuple[str, str, int]] = {}
+        # id -> {term: count}
+        self._terms: Dict[str, Dict[str, int]] = {}
+        # term -> {id: count}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._total_length = 0
+        self._dirty = False
+        self._load()
+    
+    def _load(self):
+        if not os.path.exists(self.file_path):
+            return
+        try:
+            with open(self.file_path, 'r', encoding='utf-8') as file:
+                docs = json.load(file)["docs"]
+        except Exception as e:
+            print(f"LEXICAL INDEX ERROR: Could not load {self.file_path}, starting empty: {e}")
+            return
+        for doc_id, entry in docs.items():
+            self._insert(doc_id, entry["text"], entry["source"], entry["terms"])
+        print(f"LEXICAL INDEX: Loaded {len(self._docs)} documents")
+    
+    def _insert(self, doc_id: str, document: str, source: str, terms: Dict[str, int]):
+        # Caller holds the lock (or is loading)
+        if doc_id in self._docs:
+            return
+        length = sum(terms.values())
+        self._docs[doc_id] = (document, source, length)
+        self._terms[doc_id] = terms
+        self._total_length += length
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = count
+    
+    def add(self, ids: List[str], documents: List[str], sources: List[str]):
+        """Index chunks (IDs already present are skipped)"""
+        with self._lock:
+            for doc_id, document, source in zip(ids, documents, sources):
+                terms: Dict[str, int] = {}
+                for token in tokenize(document):
+                    terms[token] = terms.get(token, 0) + 1
+                self._insert(doc_id, document, source, terms)
+            self._dirty = True
+    
+    def delete(self, ids: Iterable[str]):
+        with self._lock:
+            for doc_id in ids:
+                if doc_id not in self._docs:
+                    continue
+                self._total_length -= self._docs.pop(doc_id)[2]
+                for term in self._terms.pop(doc_id):
+                    postings = self._postings[term]
+                    del postings[doc_id]
+                    if not postings:
+                        del self._postings[term]
+                self._dirty = True
+    
+    def ids(self) -> set:
+        with self._lock:
+            return set(self._docs)
+    
+    def count(self) -> int:
+        return len(self._docs)
+    
+    def rebuild(self, items: Iterable[Tuple[str, str, Dict]]):
+        """Re-index from (id, document, metadata) triples, e.g. the vector store's documents"""
+        self.clear()
+        batch_ids, batch_documents, batch_sources = [], [], []
+        for doc_id, document, metadata in items:
+            batch_ids.append(doc_id)
+            batch_documents.append(document)
+            batch_sources.append((metadata or {}).get("source", ""))
+            if len(batch_ids) >= 1000:
+                self.add(batch_ids, batch_documents, batch_sources)
+                batch_ids, batch_documents, batch_sources = [], [], []
+        self.add(batch_ids, batch_documents, batch_sources)
+        self.save()
+    
+    def search(self, query: str, top_k: int = 20) -> List[Tuple[str, float]]:
+        """BM25 top-k as (document, score) pairs, best first"""
+        terms = set(tokenize(query))
+        with self._lock:
+            if not self._docs or not terms:
+                return []
+            total = len(self._docs)
+            average_length = self._total_length / total
+            scores: Dict[str, float] = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log((total - len(postings) + 0.5) / (len(postings) + 0.5) + 1.0)
+                for doc_id, count in postings.items():
+                    length = self._docs[doc_id][2]
+                    norm = count + self.k1 * (1.0 - self.b + self.b * length / average_length)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * count * (self.k1 + 1.0) / norm
+            best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+            return [(self._docs[doc_id][0], score) for doc_id, score in best]
+    
+    def save(self):
+        """Write the index to disk if it changed"""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = {
+                    "docs": {
+                        doc_id: {"text": document, "source": source, "terms": self._terms[doc_id]}
+                        for doc_id, (document, source, _) in self._docs.items()
+                    }
+                }
+                self._dirty = False
+            # Written to a temporary file first so a crash never leaves a half-written index
+            tmp_path = self.file_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump(data, file)
+            os.replace(tmp_path, self.file_path)
+    
+    def clear(self):
+        with self._lock:
+            self._docs = {}
+            self._terms = {}
+            self._postings = {}
+            self._total_length = 0
+            self._dirty = False
+            if os.path.exists(self.file_path):
+                os.remove(self.file_path)
\ No newline at end of file
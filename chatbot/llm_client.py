@@ -0,0 +1,432 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import AsyncIterator, Iterator, Optional
+
+# HTTP statuses worth retrying: timeouts, throttling and transient server errors
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+class LLMOverloadedError(RuntimeError):
+    """Raised when admission control refuses a call (rate limit or concurrency cap reached)"""
+
+class LLMDeadlineExceeded(TimeoutError):
+    """Raised when a call and its retries did not finish within the request deadline"""
+
+def create_genai_client(api_key: str, timeout_s: Optional[float] = None, base_url: Optional[str] = None):
+    """Create a Gemini client (google.genai is imported on first use, it is slow to import)
+    
+    One client is shared by all requests, so its HTTP connection pool is
+    reused. timeout_s bounds each HTTP request; base_url points the client at
+    another endpoint such as fake_gemini_server.py.
+    """
+    from google import genai
+    from google.genai import types
+    options = {}
+    if timeout_s:
+        options["timeout"] = int(timeout_s * 1000)
+    if base_url:
+        options["base_url"] = base_url
+    return genai.Client(api_key=api_key, http_options=types.HttpOptions(**options) if options else None)
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed call may succeed when retried"""
+    if isinstance(error, (LLMOverloadedError, LLMDeadlineExceeded)):
+        return False
+    status = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS
+    if isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return True
+    try:
+        import httpx
+        return isinstance(error, httpx.TransportError)
+    except ImportError:
+        return False
+
+class TokenBucket:
+    """Token-bucket rate limiter: rate_per_s sustained, bursts of up to burst calls"""
+    
+    def __init__(self, rate_per_s: float, burst: int):
+        self.rate = rate_per_s
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+    
+    def try_acquire(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available (caller locks)"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+class LLMClient:
+    """Gemini calls with deadlines, retries, hedging and admission control
+    
+    - Each HTTP attempt is bounded by timeout_s (the client's HttpOptions)
+      and no retry starts after deadline_s; async calls are also cut off
+      at deadline_s.
+    - Throttling, timeouts and 5xx responses are retried up to max_attempts
+      times with exponential backoff and full jitter. Streams are only
+      retried until their first chunk arrives.
+    - With hedge_percentile set, a second identical request is sent when the
+      first has not answered (or, for streams, produced its first chunk)
+      within that percentile of recent latencies; the first to succeed wins.
+      Synchronous streams are not hedged.
+    - A token bucket (rate_per_s, burst) and a cap on calls in flight guard
+      the upstream; a call that cannot be admitted within admission_wait_s
+      fails fast with LLMOverloadedError instead of queueing.
+    """
+    
+    def __init__(self, api_key: str = "", client=None, base_url: Optional[str] = None,
+                 timeout_s: float = 30.0, deadline_s: float = 60.0, max_attempts: int = 3,
+                 backoff_s: float = 0.5, max_backoff_s: float = 8.0,
+                 hedge_percentile: Optional[float] = None, hedge_min_delay_s: float = 0.5,
+                 rate_per_s: float = 0.0, burst: int = 10, max_concurrency: int = 32,
+                 admission_wait_s: float = 0.0, metrics=None):
+        self.base_url = base_url
+        self.timeout_s = timeout_s
+        self.client = client if client is not None else (
+            create_genai_client(api_key, timeout_s, base_url) if api_key else None
+        )
+        self.deadline_s = deadline_s
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay_s = hedge_min_delay_s
+        self.max_concurrency = max_concurrency
+        self.admission_wait_s = admission_wait_s
+        self.metrics = metrics
+        
+        self._lock = threading.Lock()
+        self._bucket = TokenBucket(rate_per_s, burst) if rate_per_s > 0 else None
+        self._in_flight = 0
+        # Recent latencies: whole responses and time to the first stream chunk
+        self._latencies = {"generate": deque(maxlen=500), "first_chunk": deque(maxlen=500)}
+        # Runs the racing requests of hedged synchronous calls
+        self._hedge_pool = ThreadPoolExecutor(max_workers=max(2, max_concurrency), thread_name_prefix="llm-hedge")
+    
+    def set_api_key(self, api_key: str):
+        self.client = create_genai_client(api_key, self.timeout_s, self.base_url)
+    
+    def _count(self, name: str, **labels):
+        if self.metrics is not None:
+            self.metrics.inc(name, **labels)
+    
+    # ------------------------------------------------------------------ admission
+    
+    def _try_admit(self) -> float:
+        """Admit a call and return 0, or return how long to wait before trying again"""
+        with self._lock:
+            if self._in_flight >= self.max_concurrency:
+                return 0.01
+            wait_s = self._bucket.try_acquire() if self._bucket is not None else 0.0
+            if wait_s == 0.0:
+                self._in_flight += 1
+                if self.metrics is not None:
+                    self.metrics.set_gauge("llm_in_flight", self._in_flight)
+            return wait_s
+    
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+            if self.metrics is not None:
+                self.metrics.set_gauge("llm_in_flight", self._in_flight)
+    
+    def _refuse(self):
+        self._count("llm_rejected_total")
+        return LLMOverloadedError("Too many requests to the language model right now; please try again shortly")
+    
+    def _admit(self):
+        give_up_at = time.monotonic() + self.admission_wait_s
+        while True:
+            wait_s = self._try_admit()
+            if wait_s == 0.0:
+                return
+            if time.monotonic() + wait_s > give_up_at:
+                raise self._refuse()
+            time.sleep(wait_s)
+    
+    async def _aadmit(self):
+        give_up_at = time.monotonic() + self.admission_wait_s
+        while True:
+            wait_s = self._try_admit()
+            if wait_s == 0.0:
+                return
+            if time.monotonic() + wait_s > give_up_at:
+                raise self._refuse()
+            await asyncio.sleep(wait_s)
+    
+    # ------------------------------------------------------------------ retries and hedging
+    
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0.0, min(self.max_backoff_s, self.backoff_s * 2 ** (attempt - 1)))
+    
+    def _record_latency(self, kind: str, seconds: float):
+        with self._lock:
+            self._latencies[kind].append(seconds)
+    
+    def _hedge_delay(self, kind: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None if hedging is off or there is too little history"""
+        if not self.hedge_percentile:
+            return None
+        with self._lock:
+            recent = sorted(self._latencies[kind])
+        if len(recent) < 20:
+            return None
+        index = min(len(recent) - 1, int(len(recent) * self.hedge_percentile / 100.0))
+        return max(self.hedge_min_delay_s, recent[index])
+    
+    def _check_client(self):
+        if self.client is None:
+            raise ValueError("No Gemini API key configured")
+    
+    def _check_deadline(self, error: BaseException, deadline: float):
+        """Turn a timeout at the request deadline into LLMDeadlineExceeded"""
+        if isinstance(error, asyncio.TimeoutError) and time.monotonic() >= deadline:
+            self._count("llm_requests_total", outcome="deadline")
+            raise LLMDeadlineExceeded(f"No answer from the language model within {self.deadline_s:g} s") from error
+    
+    def _should_retry(self, error: BaseException, attempt: int, deadline: float) -> Optional[float]:
+        """Backoff before the next attempt, or None to give up"""
+        if attempt >= self.max_attempts or not is_retryable(error):
+            return None
+        delay = self._backoff(attempt)
+        if time.monotonic() + delay >= deadline:
+            return None
+        self._count("llm_retries_total")
+        return delay
+    
+    def _run_hedged(self, call, delay: Optional[float]):
+        """Run call(); if it is slower than delay, race a second copy (synchronous)"""
+        if delay is None:
+            return call()
+        primary = self._hedge_pool.submit(call)
+        done, _ = wait([primary], timeout=delay)
+        if done or self._try_admit() != 0.0:
+            return primary.result()
+        self._count("llm_hedges_total")
+        hedge = self._hedge_pool.submit(call)
+        hedge.add_done_callback(lambda _: self._release())
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count("llm_hedge_wins_total")
+                    # The loser cannot be cancelled mid-request; its result is dropped
+                    return future.result()
+                error = future.exception()
+        raise error
+    
+    async def _arun_hedged(self, make_call, delay: Optional[float], on_loser=None):
+        """Async counterpart of _run_hedged; the losing request is cancelled"""
+        primary = asyncio.ensure_future(make_call())
+        hedge = None
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done and self._try_admit() == 0.0:
+                    self._count("llm_hedges_total")
+                    hedge = asyncio.ensure_future(make_call())
+            if hedge is None:
+                return await primary
+            pending = {primary, hedge}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if task is hedge:
+                        self._count("llm_hedge_wins_total")
+                    loser = primary if task is hedge else hedge
+                    if on_loser is not None and loser in done and loser.exception() is None:
+                        await on_loser(loser.result())
+                    return task.result()
+            raise error
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+            if hedge is not None:
+                self._release()
+    
+    # ------------------------------------------------------------------ calls
+    
+    def generate_content(self, model: str, contents, config=None):
+        """client.models.generate_content with deadline, retries and hedging"""
+        self._check_client()
+        started = time.monotonic()
+        deadline = started + self.deadline_s
+        attempt = 0
+        while True:
+            attempt += 1
+            self._admit()
+            attempt_started = time.monotonic()
+            try:
+                response = self._run_hedged(
+                    lambda: self.client.models.generate_content(model=model, contents=contents, config=config),
+                    self._hedge_delay("generate")
+                )
+            except Exception as e:
+                delay = self._should_retry(e, attempt, deadline)
+                if delay is None:
+                    self._count("llm_requests_total", outcome="error")
+                    raise
+                time.sleep(delay)
+                continue
+            finally:
+                self._release()
+            self._record_latency("generate", time.monotonic() - attempt_started)
+            self._count("llm_requests_total", outcome="ok")
+            return response
+    
+    def generate_content_stream(self, model: str, contents, config=None) -> Iterator:
+        """client.models.generate_content_stream, retried until the first chunk arrives"""
+        self._check_client()
+        deadline = time.monotonic() + self.deadline_s
+        attempt = 0
+        while True:
+            attempt += 1
+            self._admit()
+            attempt_started = time.monotonic()
+            try:
+                stream = iter(self.client.models.generate_content_stream(model=model, contents=contents, config=config))
+                first = next(stream, None)
+            except BaseException as e:
+                self._release()
+                if not isinstance(e, Exception):
+                    raise
+                delay = self._should_retry(e, attempt, deadline)
+                if delay is None:
+                    self._count("llm_requests_total", outcome="error")
+                    raise
+                time.sleep(delay)
+                continue
+            break
+        self._record_latency("first_chunk", time.monotonic() - attempt_started)
+        try:
+            if first is not None:
+                yield first
+            for chunk in stream:
+                yield chunk
+            self._count("llm_requests_total", outcome="ok")
+        except Exception:
+            self._count("llm_requests_total", outcome="error")
+            raise
+        finally:
+            self._release()
+    
+    async def agenerate_content(self, model: str, contents, config=None):
+        """Async generate_content with deadline, retries and hedging"""
+        self._check_client()
+        deadline = time.monotonic() + self.deadline_s
+        attempt = 0
+        while True:
+            attempt += 1
+            await self._aadmit()
+            attempt_started = time.monotonic()
+            try:
+                remaining = deadline - time.monotonic()
+                response = await asyncio.wait_for(
+                    self._arun_hedged(
+                        lambda: self.client.aio.models.generate_content(model=model, contents=contents, config=config),
+                        self._hedge_delay("generate")
+                    ),
+                    timeout=remaining
+                )
+            except Exception as e:
+                self._check_deadline(e, deadline)
+                delay = self._should_retry(e, attempt, deadline)
+                if delay is None:
+                    self._count("llm_requests_total", outcome="error")
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            finally:
+                self._release()
+            self._record_latency("generate", time.monotonic() - attempt_started)
+            self._count("llm_requests_total", outcome="ok")
+            return response
+    
+    async def _aopen_stream(self, model: str, contents, config):
+        """Start a stream and wait for its first chunk"""
+        stream = (await self.client.aio.models.generate_content_stream(
+            model=model, contents=contents, config=config
+        )).__aiter__()
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            first = None
+        return first, stream
+    
+    @staticmethod
+    async def _aclose_stream(opened):
+        _, stream = opened
+        close = getattr(stream, "aclose", None)
+        if close is not None:
+            await close()
+    
+    async def agenerate_content_stream(self, model: str, contents, config=None) -> AsyncIterator:
+        """Async stream with a deadline; retried and hedged until the first chunk arrives"""
+        self._check_client()
+        deadline = time.monotonic() + self.deadline_s
+        attempt = 0
+        while True:
+            attempt += 1
+            await self._aadmit()
+            attempt_started = time.monotonic()
+            try:
+                first, stream = await asyncio.wait_for(
+                    self._arun_hedged(
+                        lambda: self._aopen_stream(model, contents, config),
+                        self._hedge_delay("first_chunk"),
+                        on_loser=self._aclose_stream
+                    ),
+                    timeout=deadline - time.monotonic()
+                )
+            except BaseException as e:
+                # Also when the caller is cancelled (the client went away)
+                # before the first chunk, or the slot is never given back
+                self._release()
+                if not isinstance(e, Exception):
+                    raise
+                self._check_deadline(e, deadline)
+                delay = self._should_retry(e, attempt, deadline)
+                if delay is None:
+                    self._count("llm_requests_total", outcome="error")
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            break
+        self._record_latency("first_chunk", time.monotonic() - attempt_started)
+        try:
+            if first is not None:
+                yield first
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout=deadline - time.monotonic())
+                except StopAsyncIteration:
+                    break
+                yield chunk
+            self._count("llm_requests_total", outcome="ok")
+        except Exception as e:
+            self._check_deadline(e, deadline)
+            self._count("llm_requests_total", outcome="error")
+            raise
+        finally:
+            self._release()
+    
+    def get_stats(self):
+        with self._lock:
+            return {"in_flight": self._in_flight, "max_concurrency": self.max_concurrency}
\ No newline at end of file
@@ -0,0 +1,375 @@
+import json
+import os
+import threading
+import uuid
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+from vector_store import BaseVectorStore
+
+# In-memory formats for the vectors that are scanned on every search
+STORAGE_MODES = ("float32", "float16", "int8")
+# Rows converted to float32 at a time when scanning a compact matrix
+SCAN_BLOCK_ROWS = 8192
+
+class NumpyVectorStore(BaseVectorStore):
+    """In-process vector store backed by one float32 matrix
+    
+    Embeddings are L2-normalized and kept in a single contiguous matrix that
+    is memory-mapped from a .npy file; documents, IDs and metadata live in a
+    JSON file next to it. Top-k search is one matrix-vector product plus
+    argpartition, and distances are cosine distances (1 - similarity).
+    
+    With storage="float16" or "int8" (per-vector scaled) searches scan a
+    compact in-memory copy instead, and the best top_k * rescore_factor
+    candidates are re-scored against the float32 rows, which are read from
+    the memory-mapped file only for those candidates. storage="auto" picks
+    the most precise mode whose matrix fits memory_budget_mb.
+    """
+    
+    def __init__(self, collection_name: str = "mental_health_docs", reset: bool = False,
+                 path: str = "./numpy_index", storage: str = "float32",
+                 memory_budget_mb: float = 0.0, rescore_factor: int = 4):
+        if storage not in STORAGE_MODES + ("auto",):
+            raise ValueError(f"Unknown storage mode: {storage} (expected one of {STORAGE_MODES + ('auto',)})")
+        print("Initializing NumPy vector store...")
+        self.collection_name = collection_name
+        self.path = path
+        self.storage = storage
+        self.memory_budget_mb = memory_budget_mb
+        self.rescore_factor = rescore_factor
+        os.makedirs(path, exist_ok=True)
+        self.matrix_path = os.path.join(path, f"{collection_name}.npy")
+        self.meta_path = os.path.join(path, f"{collection_name}.json")
+        
+        # Writers are serialized; readers take a snapshot of the state tuple,
+        # which is swapped in one assignment after each change
+        self._write_lock = threading.Lock()
+        self._state = self._empty_state()
+        # Batches added since the last merge. Reads merge them in memory;
+        # only flush() writes the index files, so neither batched ingest nor
+        # searches during it rewrite the whole matrix per batch
+        self._pending = []
+        # Whether the in-memory state has changes flush() has not written
+        self._dirty = False
+        self._index_key = None
+        # (ids list, {id: row}) for the state it was built from; see get_embeddings
+        self._rows = (None, {})
+        
+        if reset:
+            self.clear()
+        else:
+            self._load()
+        print(f"NumPy vector store initialized with collection: {collection_name} ({self.count()} documents)")
+    
+    @staticmethod
+    def _empty_state():
+        # (matrix, ids, documents, metadatas, compact); compact is None or
+        # (codes, scales) for float16/int8 storage
+        return (np.zeros((0, 0), dtype=np.float32), [], [], [], None)
+    
+    def _storage_for(self, rows: int, dimension: int) -> str:
+        """Storage mode to use for a matrix of the given shape"""
+        if self.storage != "auto":
+            return self.storage
+        budget = self.memory_budget_mb * 1024 * 1024
+        for mode in STORAGE_MODES:
+            if not budget or rows * self._bytes_per_vector(mode, dimension) <= budget:
+                return mode
+        print(f"VECTOR STORE: {rows} vectors exceed the {self.memory_budget_mb:g} MB budget even as int8")
+        return "int8"
+    
+    @staticmethod
+    def _bytes_per_vector(mode: str, dimension: int) -> int:
+        if mode == "float16":
+            return 2 * dimension
+        if mode == "int8":
+            # One byte per dimension plus a float32 scale
+            return dimension + 4
+        return 4 * dimension
+    
+    def _compress(self, matrix: np.ndarray):
+        """Compact copy of the matrix for scanning, or None to scan it directly"""
+        mode = self._storage_for(*matrix.shape) if matrix.size else "float32"
+        if mode == "float32":
+            return None
+        if mode == "float16":
+            return (matrix.astype(np.float16), None)
+        codes = np.empty(matrix.shape, dtype=np.int8)
+        scales = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), SCAN_BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+            block_scales = np.abs(block).max(axis=1) / 127.0
+            block_scales[block_scales == 0] = 1.0
+            codes[start:start + len(block)] = np.rint(block / block_scales[:, None])
+            scales[start:start + len(block)] = block_scales
+        return (codes, scales)
+    
+    @staticmethod
+    def _normalize(embeddings) -> np.ndarray:
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.ascontiguousarray(matrix / norms, dtype=np.float32)
+    
+    def _load(self):
+        if not (os.path.exists(self.matrix_path) and os.path.exists(self.meta_path)):
+            return
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+            matrix = np.load(self.matrix_path, mmap_mode='r')
+            if len(matrix) != len(meta["ids"]):
+                raise ValueError("index files are out of sync")
+            self._state = (matrix, meta["ids"], meta["documents"], meta["metadatas"], self._compress(matrix))
+            self._index_key = meta.get("index_key")
+        except Exception as e:
+            print(f"VECTOR STORE ERROR: Could not load {self.matrix_path}, starting empty: {e}")
+            self._state = self._empty_state()
+    
+    def _save(self, state):
+        """Write the state to disk and swap in a memory-mapped copy"""
+        matrix, ids, documents, metadatas, compact = state
+        # Write to temporary files first so a crash never leaves a half-written index
+        matrix_tmp = self.matrix_path + ".tmp.npy"
+        meta_tmp = self.meta_path + ".tmp"
+        np.save(matrix_tmp, matrix)
+        with open(meta_tmp, 'w', encoding='utf-8') as file:
+            json.dump({
+                "index_key": self._index_key,
+                "ids": ids,
+                "documents": documents,
+                "metadatas": metadatas
+            }, file)
+        os.replace(matrix_tmp, self.matrix_path)
+        os.replace(meta_tmp, self.meta_path)
+        
+        if len(matrix):
+            matrix = np.load(self.matrix_path, mmap_mode='r')
+        self._state = (matrix, ids, documents, metadatas, compact)
+        self._dirty = False
+    
+    def add_documents(self, documents: List[str], embeddings: np.ndarray,
+                      ids: Optional[List[str]] = None, metadatas: Optional[List[Dict]] = None):
+        """Add documents and their embeddings to the store"""
+        if not documents:
+            return
+        
+        print(f"VECTOR STORE: Adding {len(documents)} documents to NumPy index...")
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in documents]
+        if metadatas is None:
+            metadatas = [{} for _ in documents]
+        
+        with self._write_lock:
+            self._pending.append((self._normalize(embeddings), list(ids), list(documents), list(metadatas)))
+        print("VECTOR STORE: Documents added successfully")
+    
+    def flush(self):
+        """Merge pending batches into the matrix and persist it"""
+        with self._write_lock:
+            self._merge()
+            if self._dirty:
+                self._save(self._state)
+    
+    def _set_state(self, matrix: np.ndarray, ids: List[str], documents: List[str], metadatas: List[Dict]):
+        # Caller holds the write lock; written to disk by the next flush()
+        self._state = (matrix, ids, documents, metadatas, self._compress(matrix))
+        self._dirty = True
+    
+    def _merge(self):
+        """Fold pending batches into the in-memory state (caller holds the write lock)"""
+        if not self._pending:
+            return
+        parts = [self._state] + self._pending if len(self._state[0]) else self._pending
+        self._pending = []
+        self._set_state(
+            np.concatenate([part[0] for part in parts]),
+            [doc_id for part in parts for doc_id in part[1]],
+            [document for part in parts for document in part[2]],
+            [meta for part in parts for meta in part[3]]
+        )
+    
+    def _snapshot(self):
+        """Current state including pending batches, merged in memory"""
+        if self._pending:
+            with self._write_lock:
+                self._merge()
+        return self._state
+    
+    def get_ids(self, source: Optional[str] = None) -> Set[str]:
+        """Return the IDs stored in the index, optionally only those from one source"""
+        with self._write_lock:
+            _, ids, _, metadatas, _ = self._state
+            pending = list(self._pending)
+        ids = list(ids) + [doc_id for part in pending for doc_id in part[1]]
+        metadatas = list(metadatas) + [meta for part in pending for meta in part[3]]
+        if source is None:
+            return set(ids)
+        return {doc_id for doc_id, meta in zip(ids, metadatas) if meta.get("source") == source}
+    
+    def get_ids_by_source(self) -> Dict[str, Set[str]]:
+        """Stored IDs grouped by their source metadata"""
+        with self._write_lock:
+            _, ids, _, metadatas, _ = self._state
+            pending = list(self._pending)
+        by_source: Dict[str, Set[str]] = {}
+        for doc_id, meta in zip(ids, metadatas):
+            by_source.setdefault(meta.get("source", ""), set()).add(doc_id)
+        for part in pending:
+            for doc_id, meta in zip(part[1], part[3]):
+                by_source.setdefault(meta.get("source", ""), set()).add(doc_id)
+        return by_source
+    
+    def delete(self, ids: List[str]):
+        """Remove documents by ID (written to disk by the next flush)"""
+        if not ids:
+            return
+        print(f"VECTOR STORE: Deleting {len(ids)} documents...")
+        to_delete = set(ids)
+        with self._write_lock:
+            self._merge()
+            matrix, old_ids, documents, metadatas, _ = self._state
+            keep = [i for i, doc_id in enumerate(old_ids) if doc_id not in to_delete]
+            if len(keep) == len(old_ids):
+                return
+            if not keep:
+                self._state = self._empty_state()
+                self._dirty = True
+                return
+            self._set_state(
+                np.ascontiguousarray(matrix[keep]),
+                [old_ids[i] for i in keep],
+                [documents[i] for i in keep],
+                [metadatas[i] for i in keep]
+            )
+    
+    def get_index_key(self) -> Optional[str]:
+        """Key of the embedding model/backend the stored vectors came from"""
+        return self._index_key
+    
+    def set_index_key(self, index_key: str):
+        """Record the embedding model/backend; written with the index files"""
+        with self._write_lock:
+            if self._index_key == index_key:
+                return
+            self._index_key = index_key
+            if os.path.exists(self.meta_path):
+                self._save(self._state)
+    
+    def count(self) -> int:
+        """Number of documents in the store"""
+        with self._write_lock:
+            return len(self._state[1]) + sum(len(part[1]) for part in self._pending)
+    
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[Tuple[str, str, Dict]]:
+        """Yield (id, document, metadata) for every stored chunk"""
+        _, ids, documents, metadatas, _ = self._snapshot()
+        yield from zip(ids, documents, metadatas)
+    
+    def get_embeddings(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        """Stored (normalized) vectors for those of ids that exist, as (found_ids, array)"""
+        matrix, stored_ids, _, _, _ = self._snapshot()
+        rows_for, rows = self._rows
+        if rows_for is not stored_ids:
+            rows = {doc_id: row for row, doc_id in enumerate(stored_ids)}
+            self._rows = (stored_ids, rows)
+        found = [doc_id for doc_id in ids if doc_id in rows]
+        if not found:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        return found, np.asarray(matrix[[rows[doc_id] for doc_id in found]], dtype=np.float32)
+    
+    def search(self, query_embedding: np.ndarray, top_k: int = 3) -> List[Tuple[str, float]]:
+        """Search for most similar documents"""
+        return self.search_batch([query_embedding], top_k=top_k)[0]
+    
+    def search_batch(self, query_embeddings: np.ndarray, top_k: int = 3) -> List[List[Tuple[str, float]]]:
+        """Search for several queries with one matrix-matrix product"""
+        matrix, _, documents, _, compact = self._snapshot()
+        if len(query_embeddings) == 0:
+            return []
+        if len(matrix) == 0 or top_k <= 0:
+            return [[] for _ in query_embeddings]
+        
+        queries = self._normalize(query_embeddings)
+        k = min(top_k, len(matrix))
+        if compact is None:
+            top, top_scores = self._top_k(queries @ matrix.T, k)
+        else:
+            pool = min(len(matrix), k * max(1, self.rescore_factor))
+            top, top_scores = self._top_k(self._scan(queries, compact), pool)
+            if self.rescore_factor:
+                # Exact scores for the candidates only, from the float32 rows
+                top_scores = np.einsum("qd,qcd->qc", queries, np.asarray(matrix[top], dtype=np.float32))
+                order = np.argsort(-top_scores, axis=1)[:, :k]
+                top = np.take_along_axis(top, order, axis=1)
+                top_scores = np.take_along_axis(top_scores, order, axis=1)
+            else:
+                top, top_scores = top[:, :k], top_scores[:, :k]
+        
+        return [
+            [(documents[i], float(1.0 - score)) for i, score in zip(row, row_scores)]
+            for row, row_scores in zip(top, top_scores)
+        ]
+    
+    @staticmethod
+    def _scan(queries: np.ndarray, compact) -> np.ndarray:
+        """Approximate similarities against the compact matrix, converted block by block"""
+        codes, scales = compact
+        scores = np.empty((len(queries), len(codes)), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_BLOCK_ROWS):
+            block = codes[start:start + SCAN_BLOCK_ROWS].astype(np.float32)
+            scores[:, start:start + len(block)] = queries @ block.T
+        if scales is not None:
+            scores *= scales
+        return scores
+    
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Row-wise indices and scores of the k highest scores, best first"""
+        # argpartition finds the k best without sorting everything; only those get sorted
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(scores.shape[1]), (len(scores), 1))
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+    
+    def memory_stats(self) -> Dict:
+        """Storage mode in use and the bytes scanned per search"""
+        matrix, ids, _, _, compact = self._snapshot()
+        if compact is None:
+            mode, scanned = "float32", matrix.nbytes
+        else:
+            codes, scales = compact
+            mode = "float16" if scales is None else "int8"
+            scanned = codes.nbytes + (scales.nbytes if scales is not None else 0)
+        return {
+            "storage": mode,
+            "vectors": len(ids),
+            "bytes": int(scanned),
+            "bytes_per_vector": scanned / len(ids) if ids else 0.0,
+        }
+    
+    def close(self):
+        """Drop the memory-mapped matrix and anything not yet persisted"""
+        with self._write_lock:
+            self._state = self._empty_state()
+            self._pending = []
+            self._dirty = False
+    
+    def clear(self):
+        """Clear the vector store"""
+        print("VECTOR STORE: Clearing NumPy index...")
+        with self._write_lock:
+            self._state = self._empty_state()
+            self._pending = []
+            self._dirty = False
+            self._index_key = None
+            for file_path in (self.matrix_path, self.meta_path):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
\ No newline at end of file
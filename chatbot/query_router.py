@@ -0,0 +1,325 @@
+import logging
+import re
+import threading
+import unicodedata
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger("ROUTER")
+
+# Routes chosen by QueryRouter
+ROUTE_GREETING = "greeting"
+ROUTE_CRISIS = "crisis"
+ROUTE_RAG = "rag"
+
+DEFAULT_LANGUAGE = "en"
+
+# Local replies, so short social messages never reach retrieval or Gemini
+GREETING_REPLIES = {
+    "en": {
+        "greeting": "Hi there! How can I help you today?",
+        "thanks": "You're welcome, take care!",
+        "farewell": "Goodbye, take good care of yourself!",
+    },
+    "es": {
+        "greeting": "¡Hola! ¿En qué puedo ayudarte hoy?",
+        "thanks": "¡De nada, cuídate!",
+        "farewell": "¡Adiós, cuídate mucho!",
+    },
+    "de": {
+        "greeting": "Hallo! Wie kann ich dir heute helfen?",
+        "thanks": "Gern geschehen, pass auf dich auf!",
+        "farewell": "Tschüss, pass gut auf dich auf!",
+    },
+    "fr": {
+        "greeting": "Bonjour ! Comment puis-je t'aider aujourd'hui ?",
+        "thanks": "De rien, prends soin de toi !",
+        "farewell": "Au revoir, prends bien soin de toi !",
+    },
+}
+
+# The Crisis Protocol script from SYSTEM_INSTRUCTION, word for word in English
+CRISIS_PROTOCOL = {
+    "en": (
+        "I’m concerned you might be in immediate danger.\n\n"
+        "If you are in immediate danger, call your local emergency number now (for example, 112 or 911).\n\n"
+        "If you can, contact a crisis line or a trusted person nearby.\n\n"
+        "I’m here to listen — would you like to tell me if you’re safe right now?"
+    ),
+    "es": (
+        "Me preocupa que puedas estar en peligro inmediato.\n\n"
+        "Si estás en peligro inmediato, llama ahora a tu número de emergencias local (por ejemplo, 112 o 911).\n\n"
+        "Si puedes, contacta con una línea de crisis o con una persona de confianza cercana.\n\n"
+        "Estoy aquí para escucharte — ¿quieres contarme si estás a salvo ahora mismo?"
+    ),
+    "de": (
+        "Ich mache mir Sorgen, dass du in unmittelbarer Gefahr sein könntest.\n\n"
+        "Wenn du in unmittelbarer Gefahr bist, ruf jetzt deine örtliche Notrufnummer an (zum Beispiel 112 oder 911).\n\n"
+        "Wenn du kannst, wende dich an eine Krisenhotline oder eine Vertrauensperson in deiner Nähe.\n\n"
+        "Ich bin hier und höre dir zu — magst du mir sagen, ob du gerade in Sicherheit bist?"
+    ),
+    "fr": (
+        "Je crains que tu sois en danger immédiat.\n\n"
+        "Si tu es en danger immédiat, appelle maintenant ton numéro d'urgence local (par exemple le 112 ou le 911).\n\n"
+        "Si tu le peux, contacte une ligne d'écoute de crise ou une personne de confiance proche de toi.\n\n"
+        "Je suis là pour t'écouter — veux-tu me dire si tu es en sécurité en ce moment ?"
+    ),
+}
+
+# Whole-message greetings (after normalization) per language and kind
+GREETING_PHRASES = {
+    "en": {
+        "greeting": ["hi", "hello", "hey", "hiya", "good morning", "good afternoon", "good evening", "hi there", "hello there"],
+        "thanks": ["thanks", "thank you", "thanks a lot", "thank you so much", "thx", "ty"],
+        "farewell": ["bye", "goodbye", "bye bye", "see you", "see you later", "good night"],
+    },
+    "es": {
+        "greeting": ["hola", "buenos dias", "buenas tardes", "buenas noches", "buenas"],
+        "thanks": ["gracias", "muchas gracias"],
+        "farewell": ["adios", "hasta luego", "chao", "nos vemos"],
+    },
+    "de": {
+        "greeting": ["hallo", "guten morgen", "guten tag", "guten abend", "servus", "moin"],
+        "thanks": ["danke", "vielen dank", "danke schon", "dankeschon"],
+        "farewell": ["tschuss", "auf wiedersehen", "bis spater", "gute nacht"],
+    },
+    "fr": {
+        "greeting": ["bonjour", "salut", "bonsoir", "coucou"],
+        "thanks": ["merci", "merci beaucoup"],
+        "farewell": ["au revoir", "a bientot", "bonne nuit"],
+    },
+}
+
+# First-person phrases signalling imminent risk; matched anywhere in the
+# normalized message. Bare topic words ("suicide", "overdose", "self harm")
+# are left out on purpose: they also appear in informational and third-party
+# questions ("warning signs of suicide in a friend"), which must get a
+# regular answer. Those messages go to the stricter embedding check instead.
+# Verbs that are also idioms ("mi madre va a matarme", "ça va me tuer",
+# "meine Mutter bringt mich um") are only listed with a first-person intent
+# ("quiero matarme", "je veux me tuer").
+CRISIS_KEYWORDS = {
+    "en": ["kill myself", "killing myself", "end my life", "ending my life", "take my own life",
+           "i want to die", "i wanna die", "i want to be dead", "i wish i was dead", "i wish i were dead",
+           "i don't want to live", "i dont want to live", "i do not want to live", "i don't want to be alive",
+           "end it all", "ending it all", "hurt myself", "hurting myself", "harm myself", "harming myself",
+           "cut myself", "cutting myself", "i am suicidal", "i'm suicidal", "i feel suicidal",
+           "i'm feeling suicidal", "i want to commit suicide", "i'm going to commit suicide",
+           "i took an overdose", "i'm going to overdose", "i want to overdose", "i have no reason to live",
+           "i'd be better off dead", "i'm better off dead", "i want to kill someone",
+           "i'm going to kill someone", "i want to hurt someone", "i'm going to hurt someone"],
+    "es": ["suicidarme", "quiero matarme", "voy a matarme", "ganas de matarme", "pienso en matarme",
+           "me quiero matar", "me voy a matar", "quitarme la vida", "quiero morir", "me quiero morir",
+           "quiero hacerme daño", "voy a hacerme daño", "ganas de hacerme daño", "me quiero hacer daño",
+           "no quiero vivir", "no quiero seguir viviendo"],
+    "de": ["ich will mich umbringen", "ich werde mich umbringen", "ich möchte mich umbringen",
+           "ich bringe mich um", "mich selbst umbringen", "mir das leben nehmen", "ich will sterben",
+           "ich möchte sterben", "ich will nicht mehr leben", "ich möchte nicht mehr leben",
+           "ich will mich verletzen", "ich möchte mich verletzen", "mich selbst verletzen", "mich ritzen"],
+    "fr": ["me suicider", "je veux me tuer", "je vais me tuer", "envie de me tuer", "je pense à me tuer",
+           "mettre fin à mes jours", "j'ai envie de mourir", "je veux mourir", "je ne veux plus vivre",
+           "je veux en finir", "envie d'en finir", "je veux me faire du mal", "je vais me faire du mal",
+           "envie de me faire du mal"],
+}
+
+# Accidents that share a crisis keyword ("I cut myself cooking"), as
+# regular expressions over the normalized message. Matching spans are
+# removed before the keyword check, so a crisis statement elsewhere in the
+# same message still matches; "want to cut myself" is never an accident.
+_SELF_INJURY = r"(?<!\bto )(?<!\bgonna )(?:hurt|hurting|cut|cutting|harm|harming|burnt|burned|burn|injured) myself"
+_ACCIDENT = (r"(?:by accident|accidentally|cooking|shaving|chopping|slicing|peeling|gardening|lifting|"
+             r"running|exercising|working out|playing|falling|tripping|on (?:a|an|some|broken) \w+|"
+             r"at (?:work|the gym|practice|training))")
+CRISIS_EXCLUSIONS = {
+    "en": [rf"\b(?:accidentally|by accident) {_SELF_INJURY}\b",
+           rf"\b{_SELF_INJURY} (?:\w+ ){{0,3}}?{_ACCIDENT}\b"],
+}
+
+# Examples for the embedding-similarity check; the multilingual model places
+# paraphrases and translations close to these
+GREETING_EXEMPLARS = {
+    "greeting": ["hi", "hello there", "hey, how are you?", "good morning", "hola", "hallo", "bonjour"],
+    "thanks": ["thanks", "thank you very much", "thanks for the help", "gracias", "danke", "merci"],
+    "farewell": ["bye", "goodbye, see you later", "adiós", "tschüss", "au revoir"],
+}
+CRISIS_EXEMPLARS = [
+    "I want to kill myself",
+    "I am going to end my life tonight",
+    "I don't want to live anymore",
+    "I have a plan to commit suicide",
+    "I am going to hurt myself",
+    "I want to hurt someone",
+    "Quiero quitarme la vida",
+    "Ich will mich umbringen",
+    "Je veux mettre fin à mes jours",
+]
+
+# Common words used to guess the language of a message
+LANGUAGE_HINTS = {
+    "en": {"the", "and", "is", "i", "you", "my", "to", "what", "how", "do", "it", "me", "am", "want", "not"},
+    "es": {"el", "la", "los", "las", "y", "es", "yo", "tu", "mi", "que", "como", "quiero", "no", "estoy", "me", "por"},
+    "de": {"der", "die", "das", "und", "ist", "ich", "du", "mein", "was", "wie", "nicht", "mich", "bin", "will", "mir"},
+    "fr": {"le", "la", "les", "et", "est", "je", "tu", "mon", "que", "comment", "pas", "suis", "veux", "ne", "moi"},
+}
+
+def normalize_text(text: str) -> str:
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+def detect_language(text: str) -> str:
+    """Guess the language from common words (defaults to English)"""
+    words = normalize_text(text).split()
+    scores = {language: sum(word in hints for word in words) for language, hints in LANGUAGE_HINTS.items()}
+    language = max(scores, key=scores.get)
+    return language if scores[language] > 0 else DEFAULT_LANGUAGE
+
+class Route:
+    """Routing decision for one question"""
+    
+    def __init__(self, kind: str, language: str, reply: str = "", method: str = "", score: float = 1.0):
+        self.kind = kind
+        self.language = language
+        self.reply = reply
+        # "keyword" or "embedding"
+        self.method = method
+        self.score = score
+
+class QueryRouter:
+    """Answers greetings and crisis messages locally before retrieval and generation
+    
+    Keywords are checked first and need no embedding. Messages they do not
+    match are compared with greeting and crisis exemplars using the question
+    embedding the RAG pipeline computes anyway. Greetings get a template
+    reply; crisis messages get the Crisis Protocol script straight away, in
+    the message's language, optionally followed by a generated answer.
+    """
+    
+    def __init__(self, embedding_generator=None, greeting_similarity: float = 0.80,
+                 crisis_similarity: float = 0.80, max_greeting_words: int = 5,
+                 crisis_follow_up: bool = True):
+        self.embedding_generator = embedding_generator
+        self.greeting_similarity = greeting_similarity
+        # Strict: only paraphrases of a first-person crisis statement, not
+        # questions that merely mention the topic. Both 0.80 defaults are set
+        # by hand, not measured: run benchmark_router.py on the deployed
+        # embedding model and use the thresholds it reports
+        self.crisis_similarity = crisis_similarity
+        # Longer messages are never treated as greetings ("hi, I feel anxious...")
+        self.max_greeting_words = max_greeting_words
+        self.crisis_follow_up = crisis_follow_up
+        self._greeting_phrases = {
+            normalize_text(phrase): (language, kind)
+            for language, kinds in GREETING_PHRASES.items()
+            for kind, phrases in kinds.items()
+            for phrase in phrases
+        }
+        self._crisis_keywords = [
+            (language, normalize_text(keyword))
+            for language, keywords in CRISIS_KEYWORDS.items()
+            for keyword in keywords
+        ]
+        self._crisis_exclusions = [
+            re.compile(pattern) for patterns in CRISIS_EXCLUSIONS.values() for pattern in patterns
+        ]
+        self._exemplars = None
+        self._exemplar_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {"greeting": 0, "crisis": 0, "rag": 0, "llm_calls_avoided": 0, "retrievals_avoided": 0}
+    
+    def _greeting_route(self, kind: str, language: str, method: str, score: float = 1.0) -> Route:
+        replies = GREETING_REPLIES.get(language, GREETING_REPLIES[DEFAULT_LANGUAGE])
+        return Route(ROUTE_GREETING, language, replies[kind], method, score)
+    
+    def _crisis_route(self, language: str, method: str, score: float = 1.0) -> Route:
+        reply = CRISIS_PROTOCOL.get(language, CRISIS_PROTOCOL[DEFAULT_LANGUAGE])
+        return Route(ROUTE_CRISIS, language, reply, method, score)
+    
+    def match_keywords(self, question: str) -> Optional[Route]:
+        """Route by keyword alone (no embedding needed)"""
+        text = normalize_text(question)
+        if not text:
+            return None
+        # Crisis first: "hi, I want to kill myself" must never get a greeting
+        padded = f" {text} "
+        for pattern in self._crisis_exclusions:
+            padded = pattern.sub(" / ", padded)
+        for language, keyword in self._crisis_keywords:
+            if f" {keyword} " in padded:
+                return self._crisis_route(language, "keyword")
+        
+        if text in self._greeting_phrases:
+            language, kind = self._greeting_phrases[text]
+            return self._greeting_route(kind, language, "keyword")
+        return None
+    
+    def _load_exemplars(self) -> Dict:
+        """Embed the exemplars once (on first use or from warm_up)"""
+        with self._exemplar_lock:
+            if self._exemplars is None:
+                labels = [kind for kind, texts in GREETING_EXEMPLARS.items() for _ in texts]
+                texts = [text for kinds in GREETING_EXEMPLARS.values() for text in kinds]
+                labels += [ROUTE_CRISIS] * len(CRISIS_EXEMPLARS)
+                texts += CRISIS_EXEMPLARS
+                matrix = np.asarray(self.embedding_generator.generate_embeddings(texts), dtype=np.float32)
+                matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+                self._exemplars = {"labels": labels, "matrix": matrix}
+            return self._exemplars
+    
+    def scores(self, query_embedding) -> Optional[Dict[str, float]]:
+        """Highest exemplar similarity per label (crisis, greeting, thanks, farewell)"""
+        exemplars = self._load_exemplars()
+        vector = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        similarities = exemplars["matrix"] @ (vector / norm)
+        best: Dict[str, float] = {}
+        for label, score in zip(exemplars["labels"], similarities):
+            best[label] = max(best.get(label, -1.0), float(score))
+        return best
+    
+    def match_embedding(self, question: str, query_embedding) -> Optional[Route]:
+        """Route by similarity of the question embedding to the exemplars"""
+        if self.embedding_generator is None:
+            return None
+        scores = self.scores(query_embedding)
+        if scores is None:
+            return None
+        
+        crisis = scores.pop(ROUTE_CRISIS)
+        if crisis >= self.crisis_similarity:
+            return self._crisis_route(detect_language(question), "embedding", crisis)
+        
+        if len(normalize_text(question).split()) <= self.max_greeting_words:
+            kind = max(scores, key=scores.get)
+            if scores[kind] >= self.greeting_similarity:
+                return self._greeting_route(kind, detect_language(question), "embedding", scores[kind])
+        return None
+    
+    def record(self, route: Optional[Route], follow_up: bool = False):
+        """Count a routing decision and the Gemini calls and searches it saved"""
+        with self._stats_lock:
+            if route is None:
+                self.stats["rag"] += 1
+                return
+            self.stats[route.kind] += 1
+            if not follow_up:
+                self.stats["llm_calls_avoided"] += 1
+                self.stats["retrievals_avoided"] += 1
+        ending = "with a generated follow-up" if follow_up else "locally"
+        logger.debug(f"{route.kind} ({route.language}, {route.method}, score {route.score:.2f}) answered {ending}")
+    
+    def get_stats(self) -> Dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        total = stats["greeting"] + stats["crisis"] + stats["rag"]
+        stats["routed_locally_rate"] = (stats["greeting"] + stats["crisis"]) / total if total else 0.0
+        return stats
+    
+    def warm_up(self):
+        if self.embedding_generator is not None:
+            self._load_exemplars()
\ No newline at end of file
@@ -1,72 +1,46 @@
-from google import genai
+import asyncio
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Set, Tuple
+import numpy as np
 from txt_processor import TXTProcessor
-from vector_store import VectorStore
-from embeddings import EmbeddingGenerator
+from vector_store import DEFAULT_STORE_PATHS, create_vector_store
+from embeddings import ONNX_INT8_FILE, EmbeddingGenerator
+from embedding_batcher import EmbeddingBatcher
+from semantic_cache import SemanticCache
+from context_builder import ContextBuilder
+from query_router import QueryRouter, Route, ROUTE_CRISIS, detect_language
+from telemetry import Metrics, Trace
+from lexical_index import LexicalIndex, reciprocal_rank_fusion
+from llm_client import LLMClient
+from hot_reload import (IndexGeneration, generation_path, read_current_generation,
+                        remove_stale_generations, write_current_generation)
 
-class RAGSystem:
-    """Main RAG system orchestrator"""
-    
-    def __init__(self, api_key: str):
-        self.api_key = api_key
-        self.client = genai.Client(api_key=api_key) if api_key else None
-        self.txt_processor = TXTProcessor()
-        self.embedding_generator = EmbeddingGenerator(api_key)
-        self.vector_store = VectorStore()
-        self.processed = False
-    
-    def update_api_key(self, api_key: str):
-        """Update API key"""
-        self.api_key = api_key
-        self.client = genai.Client(api_key=api_key)
-        self.embedding_generator.update_api_key(api_key)
-    
-    def process_file(self, file_path: str) -> int:
-        """Process TXT file and store embeddings"""
-        print(f"RAG: Starting to process file: {file_path}")
-        
-        # Extract text chunks
-        print("RAG: Extracting text chunks...")
-        chunks = self.txt_processor.extract_chunks(file_path)
-        print(f"RAG: Extracted {len(chunks)} chunks")
-        
-        # Generate embeddings
-        print("RAG: Generating embeddings...")
-        embeddings = self.embedding_generator.generate_embeddings(chunks)
-        print(f"RAG: Generated {len(embeddings)} embeddings")
-        
-        # Store in vector store
-        print("RAG: Storing in vector store...")
-        self.vector_store.add_documents(chunks, embeddings)
-        self.processed = True
-        print("RAG: Processing complete!")
-        
-        return len(chunks)
-    
-    def query(self, question: str, top_k: int = 3) -> str:
-        """Query the RAG system"""
-        if not self.processed:
-            raise ValueError("No PDF has been processed yet")
-        
-        # Generate query embedding
-        query_embedding = self.embedding_generator.generate_embeddings([question])[0]
-        
-        # Retrieve relevant chunks
-        relevant_chunks = self.vector_store.search(query_embedding, top_k=top_k)
-        
-        # Build context
-        context = "\n\n".join([chunk for chunk, _ in relevant_chunks])
-        
-        # Generate answer using Gemini
-        prompt = f"""You are a compassionate, non-judgmental mental-health support assistant. Your job is to give safe, clear, and accurate answers only using the information in {context}. Do not hallucinate, invent facts, or use outside knowledge except for the general safety instructions in the Crisis Protocol below. If the context does not contain enough information to answer, say so plainly and offer safe, non-medical next steps the user can take.
+logger = logging.getLogger("RAG")
+
+GEMINI_MODEL = "gemini-2.5-flash"
+
+# Index states (see RAGSystem.state)
+STATE_EMPTY = "empty"
+STATE_INDEXING = "indexing"
+STATE_READY = "ready"
+
+# Fixed instructions, sent once per request as the system instruction. They
+# form an identical prefix on every call, so Gemini's implicit context
+# caching can reuse them.
+SYSTEM_INSTRUCTION = """You are a compassionate, non-judgmental mental-health support assistant. Your job is to give safe, clear, and accurate answers only using the information in the Context given with each question. Do not hallucinate, invent facts, or use outside knowledge except for the general safety instructions in the Crisis Protocol below. If the context does not contain enough information to answer, say so plainly and offer safe, non-medical next steps the user can take.
 
 Always respond in the same language as the user's question.
 
 INPUT:
-- Context: {context}
-- Question: {question}
+Each message contains a Context section (retrieved from the mental-health resources) followed by the user's Question.
 
 # Greeting detection
-If {question} matches a greeting or short social phrase (e.g. exactly "hi", "hello", "hey", "good morning", "thanks", "bye", or is shorter than 5 words and contains only casual words), respond with just a simple greeting in about 5 words, that sounds appropriate.
+If the Question matches a greeting or short social phrase (e.g. exactly "hi", "hello", "hey", "good morning", "thanks", "bye", or is shorter than 5 words and contains only casual words), respond with just a simple greeting in about 5 words, that sounds appropriate.
 Do not run the main answer rules for this input. End the response.
 
 RESPONSE FORMAT & RULES (must follow):
@@ -111,19 +85,781 @@ EXAMPLE OUTPUT STRUCTURE (strictly follow):
 5. 1–3 next steps (safe, non-medical).
 6. If crisis signs detected: include Crisis Protocol text immediately.
 """
+
+# Appended to the prompt when the router has already shown the Crisis Protocol
+CRISIS_FOLLOW_UP_NOTE = ("Note: the Crisis Protocol script has already been shown to the user "
+                         "directly above your answer. Do not repeat it; continue with a brief, "
+                         "supportive reply.")
+
+class RAGSystem:
+    """Main RAG system orchestrator"""
+    
+    def __init__(self, api_key: str, embed_workers: int = 4,
+                 embed_batch_size: int = 32, embed_batch_wait_ms: float = 5.0,
+                 answer_cache: Optional[SemanticCache] = None, vector_backend: str = "chroma",
+                 embedding_backend: str = "torch", context_token_budget: int = 1200,
+                 router_enabled: bool = True, crisis_follow_up: bool = True,
+                 metrics: Optional[Metrics] = None, vector_store_path: Optional[str] = None,
+                 hybrid_search: bool = True, candidate_pool: int = 20,
+                 rerank_model: Optional[str] = None, rerank_budget_ms: float = 150.0,
+                 llm: Optional[LLMClient] = None, vector_storage: str = "float32",
+                 vector_memory_mb: float = 0.0, retrieval_client=None,
+                 embedding_onnx_file: str = ONNX_INT8_FILE):
+        self.api_key = api_key
+        self.txt_processor = TXTProcessor()
+        # With a retrieval service (retrieval_service.py) this process keeps no
+        # model or index: embedding and search are remote, ingest happens there
+        self.retrieval_client = retrieval_client
+        if retrieval_client is not None:
+            from retrieval_service import RemoteEmbeddingGenerator
+            self.embedding_generator = RemoteEmbeddingGenerator(retrieval_client)
+        else:
+            self.embedding_generator = EmbeddingGenerator(api_key, backend=embedding_backend,
+                                                          onnx_int8_file=embedding_onnx_file)
+        # The index lives in the backend's default directory unless a path is given;
+        # hot reloads build new generations next to it (see hot_reload.py)
+        self._vector_backend = vector_backend
+        self._base_path = vector_store_path or DEFAULT_STORE_PATHS.get(vector_backend, "./index")
+        self._store_options = {}
+        # Compact (float16/int8) vector storage is a NumPy-backend option
+        if vector_backend == "numpy":
+            self._store_options.update(storage=vector_storage, memory_budget_mb=vector_memory_mb)
+        self._hybrid_search = hybrid_search
+        # Searches take the current generation under this lock (see acquire_index)
+        self._index_lock = threading.Lock()
+        if retrieval_client is not None:
+            from retrieval_service import RemoteVectorStore
+            # Reports the service's generation (see _on_remote_generation)
+            self.index = IndexGeneration(retrieval_client.health().get("generation", 0),
+                                         RemoteVectorStore(retrieval_client))
+        else:
+            self.index = self.open_generation(read_current_generation(self._base_path))
+            remove_stale_generations(self._base_path, self.index.number)
+            self._check_index_key()
+            if self.lexical_index is not None:
+                self._sync_lexical_index()
+        # Dense and lexical retrieval each return this many candidates for fusion
+        self.candidate_pool = candidate_pool
+        self.reranker = None
+        if rerank_model and retrieval_client is None:
+            from reranker import CrossEncoderReranker
+            self.reranker = CrossEncoderReranker(rerank_model, budget_ms=rerank_budget_ms,
+                                                 max_candidates=candidate_pool)
+        # Concurrent questions are encoded together in micro-batches
+        self.query_batcher = EmbeddingBatcher(
+            self.embedding_generator,
+            max_batch_size=embed_batch_size,
+            max_wait_ms=embed_batch_wait_ms
+        )
+        # Bounded pool for the blocking vector search of async queries
+        self.executor = ThreadPoolExecutor(max_workers=embed_workers, thread_name_prefix="rag-embed")
+        # Answers to near-identical questions are served without calling Gemini
+        self.answer_cache = answer_cache if answer_cache is not None else SemanticCache()
+        if retrieval_client is not None:
+            # Hot reloads happen on the service; this worker's cache must follow them
+            retrieval_client.watch_generation(self._on_remote_generation)
+        # A persisted index can serve queries straight away; otherwise the
+        # system is ready once the first ingest finishes
+        self.state = STATE_READY if self.vector_store.count() > 0 else STATE_EMPTY
+        self.last_stream_timing = None
+        # Per-request stage latencies and counters (see telemetry.py)
+        self.metrics = metrics if metrics is not None else Metrics()
+        # Gemini calls go through a shared client with retries, deadlines and rate limiting
+        self.llm = llm if llm is not None else LLMClient(api_key)
+        if self.llm.metrics is None:
+            self.llm.metrics = self.metrics
+        # Retrieved chunks are merged and packed into a token budget
+        self.context_builder = ContextBuilder(token_budget=context_token_budget)
+        self._config = None
+        # Greetings and crisis messages are answered before retrieval and generation
+        self.router = QueryRouter(self.embedding_generator, crisis_follow_up=crisis_follow_up) if router_enabled else None
+        self._stats_lock = threading.Lock()
+        self.prompt_stats = {
+            "requests": 0,
+            "estimated_tokens_before": 0,
+            "estimated_tokens_after": 0,
+            "prompt_tokens": 0,
+            "cached_prompt_tokens": 0,
+        }
+    
+    @property
+    def vector_store(self):
+        """Vector store of the current index generation"""
+        return self.index.vector_store
+    
+    @property
+    def lexical_index(self) -> Optional[LexicalIndex]:
+        """BM25 index of the current generation (None when hybrid search is off)"""
+        return self.index.lexical_index
+    
+    def open_generation(self, number: int, fresh: bool = False) -> IndexGeneration:
+        """Open (or create) index generation `number`: a vector store plus its BM25 index
+        
+        With fresh=True anything left at the generation's path (e.g. by a
+        reload that failed) is removed first, so the generation starts empty.
+        """
+        path = generation_path(self._base_path, number)
+        if fresh and os.path.exists(path):
+            shutil.rmtree(path, ignore_errors=True)
+        store = create_vector_store(self._vector_backend, path=path, **self._store_options)
+        # A persisted store keeps its key so _check_index_key can detect a model change
+        if store.count() == 0:
+            store.set_index_key(self.embedding_generator.model_key)
+        # BM25 index over the same chunks, stored next to the vector index
+        lexical_index = None
+        if self._hybrid_search:
+            lexical_index = LexicalIndex(path=store.path, name=store.collection_name)
+        return IndexGeneration(number, store, lexical_index)
+    
+    def acquire_index(self) -> IndexGeneration:
+        """Current generation, held until release() so a reload cannot delete it mid-search"""
+        with self._index_lock:
+            index = self.index
+            index.acquire()
+        return index
+    
+    def swap_index(self, index: IndexGeneration):
+        """Make a fully built generation current and retire the old one
+        
+        Searches that already hold the old generation finish on it; it is
+        deleted when the last of them releases it.
+        """
+        self.persist_index(index)
+        with self._index_lock:
+            old, self.index = self.index, index
+        write_current_generation(self._base_path, index.number)
+        # Cached answers were generated from the old content
+        self.answer_cache.invalidate()
+        self.state = STATE_READY if index.vector_store.count() > 0 else STATE_EMPTY
+        print(f"RAG: Index generation {index.number} is now current ({index.vector_store.count()} chunks)")
+        old.retire()
+    
+    def _on_remote_generation(self, generation: int):
+        """The retrieval service swapped in a new index: cached answers are stale"""
+        self.index.number = generation
+        self.answer_cache.invalidate()
+    
+    def _check_index_key(self):
+        """Drop a persisted index built with a different embedding model or backend"""
+        model_key = self.embedding_generator.model_key
+        stored_key = self.vector_store.get_index_key()
+        if stored_key != model_key and self.vector_store.count() > 0:
+            print(f"RAG: Index was built with {stored_key or 'an unrecorded model'}, "
+                  f"not {model_key}; clearing it so vectors are never mixed")
+            self.vector_store.clear()
+        self.vector_store.set_index_key(model_key)
+    
+    def _sync_lexical_index(self):
+        """Rebuild the BM25 index from the vector store if they hold different chunks"""
+        if self.lexical_index.ids() == self.vector_store.get_ids():
+            return
+        print("RAG: Lexical index is out of date; rebuilding it from the vector store...")
+        self.lexical_index.rebuild(self.vector_store.iter_documents())
+        print(f"RAG: Lexical index rebuilt ({self.lexical_index.count()} chunks)")
+    
+    def update_api_key(self, api_key: str):
+        """Update API key"""
+        self.api_key = api_key
+        self.llm.set_api_key(api_key)
+        self.embedding_generator.update_api_key(api_key)
+    
+    def process_file(self, file_path: str, incremental: bool = True, batch_size: int = 64,
+                     progress: Optional[Callable[[str, int, int], None]] = None,
+                     index: Optional[IndexGeneration] = None,
+                     reuse: Optional[IndexGeneration] = None, persist: bool = True,
+                     source: Optional[str] = None) -> int:
+        """Process TXT file and store embeddings
+        
+        The file is streamed: chunks are embedded and inserted in batches of
+        batch_size, so memory stays flat however large the file is. With
+        incremental=True only chunks whose content-addressed ID is not
+        already in the vector store get embedded, and chunks that no longer
+        appear in the file are removed. progress(file_path, chunks_read,
+        chunks_embedded) is called after every batch.
+        
+        index writes into another generation than the current one (a hot
+        reload); chunks whose ID is stored in reuse copy its vectors instead
+        of being embedded again. With persist=False the index is not written
+        to disk; callers ingesting many files persist once at the end (see
+        persist_index), since each write rewrites the whole index.
+        
+        Chunks are recorded under source, the file's path relative to its
+        corpus root (process_path passes it); a file processed on its own is
+        keyed by its name.
+        """
+        print(f"RAG: Starting to process file: {file_path}")
+        if source is None:
+            source = self.txt_processor.source_key(file_path, os.path.dirname(file_path) or ".")
+        live = index is None
+        if live:
+            index = self.index
+            if self.state != STATE_READY:
+                self.state = STATE_INDEXING
+        vector_store, lexical_index = index.vector_store, index.lexical_index
+        
+        existing_ids = vector_store.get_ids(source=source)
+        if not incremental:
+            vector_store.delete(list(existing_ids))
+            if lexical_index is not None:
+                lexical_index.delete(existing_ids)
+            existing_ids = set()
+        
+        num_chunks = 0
+        num_embedded = 0
+        num_reused = 0
+        seen_ids = set()
+        batch_chunks = []
+        batch_ids = []
+        
+        def flush_batch():
+            nonlocal num_embedded, num_reused
+            num_reused += self._embed_and_store(batch_chunks, batch_ids, source, index, reuse)
+            num_embedded += len(batch_ids)
+            batch_chunks.clear()
+            batch_ids.clear()
+            if progress is not None:
+                progress(file_path, num_chunks, num_embedded)
+            else:
+                print(f"RAG: {file_path}: {num_chunks} chunks read, {num_embedded} embedded")
+        
+        # Key every chunk on its content, the embedding model and chunker settings
+        for chunk in self.txt_processor.iter_chunks(file_path):
+            num_chunks += 1
+            chunk_id = self.txt_processor.chunk_id(chunk, source, self.embedding_generator.model_key)
+            # Repeated chunks are only stored once
+            if chunk_id in seen_ids:
+                continue
+            seen_ids.add(chunk_id)
+            if chunk_id in existing_ids:
+                continue
+            batch_chunks.append(chunk)
+            batch_ids.append(chunk_id)
+            if len(batch_ids) >= batch_size:
+                flush_batch()
+        if batch_ids:
+            flush_batch()
+        
+        # Remove chunks that are no longer in the file
+        stale_ids = [chunk_id for chunk_id in existing_ids if chunk_id not in seen_ids]
+        if stale_ids:
+            vector_store.delete(stale_ids)
+            if lexical_index is not None:
+                lexical_index.delete(stale_ids)
+        if persist:
+            self.persist_index(index)
+        print(f"RAG: {num_embedded} new ({num_reused} with reused embeddings), "
+              f"{len(seen_ids) - num_embedded} unchanged, {len(stale_ids)} stale chunks")
+        
+        if not live:
+            # swap_index makes the generation current and invalidates the cache
+            return num_chunks
         
-        response = self.client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt
+        # Cached answers may be based on content that just changed
+        if num_embedded or stale_ids:
+            self.answer_cache.invalidate()
+        
+        self.state = STATE_READY
+        print("RAG: Processing complete!")
+        
+        return num_chunks
+    
+    def process_path(self, path: str, incremental: bool = True, batch_size: int = 64,
+                     progress: Optional[Callable[[str, int, int], None]] = None, prune: bool = True) -> int:
+        """Process a TXT file, a directory of TXT files or a glob pattern
+        
+        With prune=True the index mirrors the path: chunks of files that
+        were deleted, renamed or moved out of it are removed.
+        """
+        files = self.txt_processor.find_files(path)
+        if not files:
+            raise FileNotFoundError(f"No TXT files found for: {path}")
+        root = self.txt_processor.corpus_root(path)
+        
+        total_chunks = 0
+        index = self.acquire_index()
+        try:
+            sources = set()
+            for number, file_path in enumerate(files, start=1):
+                print(f"RAG: File {number}/{len(files)}")
+                source = self.txt_processor.source_key(file_path, root)
+                sources.add(source)
+                total_chunks += self.process_file(file_path, incremental=incremental, batch_size=batch_size,
+                                                  progress=progress, persist=False, source=source)
+            if prune:
+                self.prune_sources(sources, index)
+            # Written once for the whole path, not once per file
+            self.persist_index(index)
+        finally:
+            index.release()
+        return total_chunks
+    
+    def prune_sources(self, sources: Set[str], index: Optional[IndexGeneration] = None) -> int:
+        """Remove the chunks of every source not in sources; returns the number removed"""
+        index = index if index is not None else self.index
+        stale_ids = [chunk_id for source, ids in index.vector_store.get_ids_by_source().items()
+                     if source not in sources for chunk_id in ids]
+        if not stale_ids:
+            return 0
+        print(f"RAG: Removing {len(stale_ids)} chunks of files that are no longer in the corpus")
+        index.vector_store.delete(stale_ids)
+        if index.lexical_index is not None:
+            index.lexical_index.delete(stale_ids)
+        if index is self.index:
+            self.answer_cache.invalidate()
+            if index.vector_store.count() == 0:
+                self.state = STATE_EMPTY
+        return len(stale_ids)
+    
+    @staticmethod
+    def persist_index(index: IndexGeneration):
+        """Write a generation's pending vectors and its BM25 index to disk"""
+        index.vector_store.flush()
+        if index.lexical_index is not None:
+            index.lexical_index.save()
+    
+    def _embed_and_store(self, chunks: List[str], chunk_ids: List[str], source: str,
+                         index: IndexGeneration, reuse: Optional[IndexGeneration] = None) -> int:
+        """Embed one batch of chunks and insert it into a generation; returns the number of reused vectors"""
+        found_ids, found = reuse.vector_store.get_embeddings(chunk_ids) if reuse is not None else ([], None)
+        if found_ids:
+            # Unchanged chunks keep their vectors; only the rest are encoded
+            row_of = {chunk_id: row for row, chunk_id in enumerate(found_ids)}
+            embeddings = np.empty((len(chunk_ids), found.shape[1]), dtype=np.float32)
+            reused = [i for i, chunk_id in enumerate(chunk_ids) if chunk_id in row_of]
+            embeddings[reused] = found[[row_of[chunk_ids[i]] for i in reused]]
+            missing = [i for i, chunk_id in enumerate(chunk_ids) if chunk_id not in row_of]
+            if missing:
+                embeddings[missing] = self.embedding_generator.generate_embeddings([chunks[i] for i in missing])
+        else:
+            embeddings = self.embedding_generator.generate_embeddings(chunks)
+        index.vector_store.add_documents(
+            list(chunks),
+            embeddings,
+            ids=list(chunk_ids),
+            metadatas=[{"source": source} for _ in chunk_ids]
         )
+        if index.lexical_index is not None:
+            index.lexical_index.add(list(chunk_ids), list(chunks), [source] * len(chunk_ids))
+        return len(found_ids)
+    
+    def _build_prompt(self, question: str, relevant_chunks: List[Tuple[str, float]],
+                      crisis_shown: bool = False) -> str:
+        """Build the Gemini prompt from the retrieved chunks
+        
+        The fixed instructions go separately as SYSTEM_INSTRUCTION; the prompt
+        only carries the merged, token-budgeted context and the question once.
+        """
+        context, report = self.context_builder.build(relevant_chunks)
+        prompt = f"Context:\n{context}\n\nQuestion: {question}"
+        if crisis_shown:
+            prompt += f"\n\n{CRISIS_FOLLOW_UP_NOTE}"
+        
+        # The previous prompt repeated the context and question inside the instructions
+        tokens_before = (self.context_builder.estimate_tokens(SYSTEM_INSTRUCTION)
+                         + 2 * report["raw_context_tokens"]
+                         + 2 * self.context_builder.estimate_tokens(question))
+        tokens_after = (self.context_builder.estimate_tokens(SYSTEM_INSTRUCTION)
+                        + self.context_builder.estimate_tokens(prompt))
+        with self._stats_lock:
+            self.prompt_stats["requests"] += 1
+            self.prompt_stats["estimated_tokens_before"] += tokens_before
+            self.prompt_stats["estimated_tokens_after"] += tokens_after
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Prompt ~{tokens_after} tokens (~{tokens_before} with the old prompt); "
+                         f"{report['chunks_retrieved']} chunks merged to {report['chunks_after_merge']}, "
+                         f"{report['chunks_packed']} packed")
+        return prompt
+    
+    def _record_usage(self, usage_metadata):
+        """Add Gemini's reported prompt token counts to prompt_stats"""
+        if usage_metadata is None:
+            return
+        with self._stats_lock:
+            self.prompt_stats["prompt_tokens"] += usage_metadata.prompt_token_count or 0
+            self.prompt_stats["cached_prompt_tokens"] += usage_metadata.cached_content_token_count or 0
+    
+    def _generation_config(self):
+        """Generation config carrying the fixed instructions as a system instruction"""
+        if self._config is None:
+            from google.genai import types
+            self._config = types.GenerateContentConfig(system_instruction=SYSTEM_INSTRUCTION)
+        return self._config
+    
+    def _route(self, question: str, trace: Trace) -> Tuple[Optional[Route], Optional[np.ndarray]]:
+        """Check the fast-path router; returns the route and, if computed, the question embedding"""
+        if self.router is None:
+            return None, None
+        route = self.router.match_keywords(question)
+        query_embedding = None
+        if route is None:
+            with trace.span("embed"):
+                query_embedding = self.query_batcher.embed(question)
+            route = self.router.match_embedding(question, query_embedding)
+        return route, query_embedding
+    
+    async def _aroute(self, question: str, trace: Trace) -> Tuple[Optional[Route], Optional[np.ndarray]]:
+        """Async counterpart of _route"""
+        if self.router is None:
+            return None, None
+        route = self.router.match_keywords(question)
+        query_embedding = None
+        if route is None:
+            with trace.span("embed"):
+                query_embedding = await self._aembed(question)
+            route = self.router.match_embedding(question, query_embedding)
+        return route, query_embedding
+    
+    def _follows_up(self, route: Optional[Route], trace: Trace) -> bool:
+        """Whether a generated answer follows the local reply (crisis messages only)"""
+        follow_up = (route is not None and route.kind == ROUTE_CRISIS
+                     and self.router.crisis_follow_up and self.is_ready())
+        if self.router is not None:
+            self.router.record(route, follow_up)
+        if route is not None:
+            trace.outcome = route.kind
+        return follow_up
+    
+    def query(self, question: str, top_k: int = 3) -> str:
+        """Query the RAG system"""
+        with Trace(self.metrics, "query") as trace:
+            return self._query(question, top_k, trace)
+    
+    def _query(self, question: str, top_k: int, trace: Trace) -> str:
+        route, query_embedding = self._route(question, trace)
+        follow_up = self._follows_up(route, trace)
+        if route is not None and not follow_up:
+            return route.reply
+        if not self.is_ready():
+            raise ValueError("No PDF has been processed yet")
+        
+        # Generate query embedding (batched with other in-flight questions)
+        if query_embedding is None:
+            with trace.span("embed"):
+                query_embedding = self.query_batcher.embed(question)
+        
+        # Crisis follow-ups are neither served from nor stored in the cache
+        cache_generation = self.answer_cache.generation
+        # Answers are cached per language (the prompt asks for the question's language)
+        language = detect_language(question)
+        cached = self.answer_cache.lookup(query_embedding, language) if route is None else None
+        if cached is not None:
+            trace.outcome = "cache"
+            return cached
         
+        # Retrieve relevant chunks
+        with trace.span("retrieve"):
+            relevant_chunks = self._search(question, query_embedding, top_k)
+        with trace.span("prompt_build"):
+            prompt = self._build_prompt(question, relevant_chunks, crisis_shown=follow_up)
+        
+        # Generate answer using Gemini
+        with trace.span("generate"):
+            response = self.llm.generate_content(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=self._generation_config()
+            )
+        self._record_usage(response.usage_metadata)
+        
+        if follow_up:
+            return f"{route.reply}\n\n{response.text}"
+        self.answer_cache.store(query_embedding, response.text, cache_generation, language)
         return response.text
     
+    async def _aembed(self, question: str) -> np.ndarray:
+        """Embed a question through the micro-batcher without blocking the event loop"""
+        return await asyncio.wrap_future(self.query_batcher.submit(question))
+    
+    def _search(self, question: str, query_embedding: np.ndarray, top_k: int) -> List[Tuple[str, float]]:
+        """Retrieve the top_k chunks, fusing dense and BM25 results when hybrid search is on
+        
+        Dense-only results are (chunk, distance) pairs; fused ones are
+        (chunk, score) pairs, higher is better.
+        """
+        if self.retrieval_client is not None:
+            # The service runs the same retrieval (hybrid and re-ranked if configured)
+            embedding = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+            return self.retrieval_client.search(embedding, top_k, questions=[question])[0]
+        index = self.acquire_index()
+        try:
+            if index.lexical_index is None:
+                return index.vector_store.search(query_embedding, top_k=top_k)
+            # BM25 runs in the pool while the dense search runs here
+            lexical = self.executor.submit(index.lexical_index.search, question, self.candidate_pool)
+            dense = index.vector_store.search(query_embedding, top_k=self.candidate_pool)
+            lexical = lexical.result()
+        finally:
+            index.release()
+        return self._fuse(question, dense, lexical, top_k)
+    
+    async def _asearch(self, question: str, query_embedding: np.ndarray, top_k: int) -> List[Tuple[str, float]]:
+        """Run the blocking searches in the bounded thread pool"""
+        loop = asyncio.get_running_loop()
+        if self.retrieval_client is not None:
+            return await loop.run_in_executor(self.executor, self._search, question, query_embedding, top_k)
+        index = self.acquire_index()
+        try:
+            if index.lexical_index is None:
+                return await loop.run_in_executor(
+                    self.executor, index.vector_store.search, query_embedding, top_k
+                )
+            dense, lexical = await asyncio.gather(
+                loop.run_in_executor(self.executor, index.vector_store.search, query_embedding, self.candidate_pool),
+                loop.run_in_executor(self.executor, index.lexical_index.search, question, self.candidate_pool)
+            )
+        finally:
+            index.release()
+        if self.reranker is None:
+            return self._fuse(question, dense, lexical, top_k)
+        return await loop.run_in_executor(self.executor, self._fuse, question, dense, lexical, top_k)
+    
+    def retrieve(self, question: str, top_k: int = 3,
+                 query_embedding: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """The top_k chunks for a question, embedding it first unless query_embedding is given"""
+        if query_embedding is None:
+            query_embedding = self.query_batcher.embed(question)
+        return self._search(question, query_embedding, top_k)
+    
+    def _fuse(self, question: str, dense: List[Tuple[str, float]], lexical: List[Tuple[str, float]],
+              top_k: int) -> List[Tuple[str, float]]:
+        """Reciprocal-rank fusion of both result lists, optionally re-ranked by the cross-encoder"""
+        fused = reciprocal_rank_fusion([dense, lexical])
+        if self.reranker is not None:
+            return self.reranker.rerank(question, fused, top_k)
+        return fused[:top_k]
+    
+    async def aquery(self, question: str, top_k: int = 3) -> str:
+        """Query the RAG system without blocking the event loop
+        
+        Encoding goes through the micro-batcher and search runs in the bounded
+        thread pool; generation uses the async genai client so many requests
+        can wait on Gemini at once.
+        """
+        with Trace(self.metrics, "aquery") as trace:
+            return await self._aquery(question, top_k, trace)
+    
+    async def _aquery(self, question: str, top_k: int, trace: Trace) -> str:
+        route, query_embedding = await self._aroute(question, trace)
+        follow_up = self._follows_up(route, trace)
+        if route is not None and not follow_up:
+            return route.reply
+        if not self.is_ready():
+            raise ValueError("No PDF has been processed yet")
+        
+        if query_embedding is None:
+            with trace.span("embed"):
+                query_embedding = await self._aembed(question)
+        
+        cache_generation = self.answer_cache.generation
+        language = detect_language(question)
+        cached = self.answer_cache.lookup(query_embedding, language) if route is None else None
+        if cached is not None:
+            trace.outcome = "cache"
+            return cached
+        
+        with trace.span("retrieve"):
+            relevant_chunks = await self._asearch(question, query_embedding, top_k)
+        with trace.span("prompt_build"):
+            prompt = self._build_prompt(question, relevant_chunks, crisis_shown=follow_up)
+        
+        with trace.span("generate"):
+            response = await self.llm.agenerate_content(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=self._generation_config()
+            )
+        self._record_usage(response.usage_metadata)
+        
+        if follow_up:
+            return f"{route.reply}\n\n{response.text}"
+        self.answer_cache.store(query_embedding, response.text, cache_generation, language)
+        return response.text
+    
+    def query_stream(self, question: str, top_k: int = 3) -> Iterator[str]:
+        """Query the RAG system, yielding answer text as Gemini produces it"""
+        with Trace(self.metrics, "stream") as trace:
+            yield from self._query_stream(question, top_k, trace)
+            self._report_stream_timing(trace)
+    
+    def _query_stream(self, question: str, top_k: int, trace: Trace) -> Iterator[str]:
+        route, query_embedding = self._route(question, trace)
+        follow_up = self._follows_up(route, trace)
+        if route is not None:
+            # The local reply goes out first; a crisis follow-up streams after it
+            trace.mark("ttft")
+            yield route.reply
+            if not follow_up:
+                return
+            yield "\n\n"
+        elif not self.is_ready():
+            raise ValueError("No PDF has been processed yet")
+        
+        if query_embedding is None:
+            with trace.span("embed"):
+                query_embedding = self.query_batcher.embed(question)
+        
+        cache_generation = self.answer_cache.generation
+        language = detect_language(question)
+        cached = self.answer_cache.lookup(query_embedding, language) if route is None else None
+        if cached is not None:
+            trace.outcome = "cache"
+            trace.mark("ttft")
+            yield cached
+            return
+        
+        with trace.span("retrieve"):
+            relevant_chunks = self._search(question, query_embedding, top_k)
+        with trace.span("prompt_build"):
+            prompt = self._build_prompt(question, relevant_chunks, crisis_shown=follow_up)
+        
+        parts = []
+        usage_metadata = None
+        with trace.span("generate"):
+            for chunk in self.llm.generate_content_stream(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=self._generation_config()
+            ):
+                # Usage is reported on the last chunk
+                usage_metadata = chunk.usage_metadata or usage_metadata
+                if chunk.text:
+                    trace.mark("ttft")
+                    parts.append(chunk.text)
+                    yield chunk.text
+        
+        self._record_usage(usage_metadata)
+        # Only complete answers are cached
+        if not follow_up:
+            self.answer_cache.store(query_embedding, "".join(parts), cache_generation, language)
+    
+    async def aquery_stream(self, question: str, top_k: int = 3) -> AsyncIterator[str]:
+        """Async counterpart of query_stream"""
+        with Trace(self.metrics, "stream") as trace:
+            async for text in self._aquery_stream(question, top_k, trace):
+                yield text
+            self._report_stream_timing(trace)
+    
+    async def _aquery_stream(self, question: str, top_k: int, trace: Trace) -> AsyncIterator[str]:
+        route, query_embedding = await self._aroute(question, trace)
+        follow_up = self._follows_up(route, trace)
+        if route is not None:
+            trace.mark("ttft")
+            yield route.reply
+            if not follow_up:
+                return
+            yield "\n\n"
+        elif not self.is_ready():
+            raise ValueError("No PDF has been processed yet")
+        
+        if query_embedding is None:
+            with trace.span("embed"):
+                query_embedding = await self._aembed(question)
+        
+        cache_generation = self.answer_cache.generation
+        language = detect_language(question)
+        cached = self.answer_cache.lookup(query_embedding, language) if route is None else None
+        if cached is not None:
+            trace.outcome = "cache"
+            trace.mark("ttft")
+            yield cached
+            return
+        
+        with trace.span("retrieve"):
+            relevant_chunks = await self._asearch(question, query_embedding, top_k)
+        with trace.span("prompt_build"):
+            prompt = self._build_prompt(question, relevant_chunks, crisis_shown=follow_up)
+        
+        parts = []
+        usage_metadata = None
+        with trace.span("generate"):
+            async for chunk in self.llm.agenerate_content_stream(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config=self._generation_config()
+            ):
+                # Usage is reported on the last chunk
+                usage_metadata = chunk.usage_metadata or usage_metadata
+                if chunk.text:
+                    trace.mark("ttft")
+                    parts.append(chunk.text)
+                    yield chunk.text
+        
+        self._record_usage(usage_metadata)
+        # Only complete answers are cached
+        if not follow_up:
+            self.answer_cache.store(query_embedding, "".join(parts), cache_generation, language)
+    
+    def _report_stream_timing(self, trace: Trace):
+        """Report time-to-first-token separately from total latency"""
+        ttft_ms = trace.spans["ttft"] * 1000.0 if "ttft" in trace.spans else None
+        total_ms = (time.perf_counter() - trace.started) * 1000.0
+        self.last_stream_timing = {"ttft_ms": ttft_ms, "total_ms": total_ms, "source": trace.outcome}
+        if logger.isEnabledFor(logging.DEBUG):
+            ttft_text = f"{ttft_ms:.0f} ms" if ttft_ms is not None else "n/a"
+            logger.debug(f"Streamed answer ({trace.outcome}) - time to first token {ttft_text}, total {total_ms:.0f} ms")
+    
+    def metrics_snapshot(self) -> Dict[str, float]:
+        """Cache, batcher, router and prompt statistics as flat gauges for /metrics"""
+        cache = self.answer_cache.get_stats()
+        batcher = self.query_batcher.get_metrics()
+        gauges = {
+            "rag_cache_hits": cache["hits"],
+            "rag_cache_misses": cache["misses"],
+            "rag_cache_hit_rate": cache["hit_rate"],
+            "rag_cache_entries": cache["entries"],
+            "rag_cache_bytes": cache["bytes"],
+            "rag_embed_queue_depth": batcher["queue_depth"],
+            "rag_embed_batches": batcher["batches"],
+            "rag_embed_avg_batch_size": batcher["avg_batch_size"],
+            "rag_embed_queue_delay_p50_seconds": batcher["queue_delay_ms_p50"] / 1000.0,
+            "rag_embed_queue_delay_p95_seconds": batcher["queue_delay_ms_p95"] / 1000.0,
+            "rag_index_documents": self.vector_store.count(),
+            "rag_index_generation": self.index.number,
+            "rag_index_ready": 1.0 if self.is_ready() else 0.0,
+        }
+        with self._stats_lock:
+            gauges["rag_prompt_requests"] = self.prompt_stats["requests"]
+            gauges["rag_prompt_estimated_tokens_before"] = self.prompt_stats["estimated_tokens_before"]
+            gauges["rag_prompt_estimated_tokens_after"] = self.prompt_stats["estimated_tokens_after"]
+            gauges["rag_prompt_tokens"] = self.prompt_stats["prompt_tokens"]
+            gauges["rag_prompt_cached_tokens"] = self.prompt_stats["cached_prompt_tokens"]
+        if hasattr(self.vector_store, "memory_stats"):
+            gauges["rag_index_vector_bytes"] = self.vector_store.memory_stats()["bytes"]
+        if self.lexical_index is not None:
+            gauges["rag_lexical_index_documents"] = self.lexical_index.count()
+        if self.reranker is not None:
+            reranker = self.reranker.get_stats()
+            gauges["rag_rerank_runs"] = reranker["reranked"]
+            gauges["rag_rerank_skipped"] = reranker["skipped"]
+            gauges["rag_rerank_over_budget"] = reranker["over_budget"]
+            gauges["rag_rerank_pair_seconds"] = reranker["pair_ms"] / 1000.0
+        if self.router is not None:
+            router = self.router.get_stats()
+            gauges["rag_router_llm_calls_avoided"] = router["llm_calls_avoided"]
+            gauges["rag_router_retrievals_avoided"] = router["retrievals_avoided"]
+        return gauges
+    
     def is_ready(self) -> bool:
         """Check if system is ready for queries"""
-        return self.processed
+        if self.retrieval_client is not None:
+            return self.retrieval_client.is_ready()
+        return self.state == STATE_READY
+    
+    def warm_up(self):
+        """Run one encode and one search so the first real query is not slow"""
+        query_embedding = self.query_batcher.embed("warm-up")
+        if self.router is not None:
+            self.router.warm_up()
+        if self.reranker is not None:
+            self.reranker.warm_up()
+        if self.vector_store.count() > 0:
+            self._search("warm-up", query_embedding, top_k=1)
     
     def clear(self):
         """Clear the system"""
         self.vector_store.clear()
-        self.processed = False
\ No newline at end of file
+        self.vector_store.set_index_key(self.embedding_generator.model_key)
+        if self.lexical_index is not None:
+            self.lexical_index.clear()
+        self.answer_cache.invalidate()
+        self.state = STATE_EMPTY
\ No newline at end of file
@@ -0,0 +1,79 @@
+import threading
+import time
+from typing import Dict, List, Tuple
+
+# Small multilingual cross-encoder (the guide is English, questions may not be)
+RERANK_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+class CrossEncoderReranker:
+    """Re-scores retrieval candidates with a cross-encoder within a latency budget
+    
+    The cost per (question, chunk) pair is tracked as a moving average and
+    only as many candidates as fit in budget_ms are scored; if fewer than
+    top_k would fit, the fused order is kept unchanged. Skipped calls
+    measure nothing, so every probe_every skipped calls the cost is
+    measured again on top_k candidates and replaces the estimate; one slow
+    sample does not turn re-ranking off for good.
+    """
+    
+    def __init__(self, model_name: str = RERANK_MODEL, budget_ms: float = 150.0, max_candidates: int = 20,
+                 probe_every: int = 20, model=None):
+        if model is None:
+            # Imported here: sentence_transformers pulls in torch
+            from sentence_transformers import CrossEncoder
+            
+            print(f"Initializing cross-encoder re-ranker ({model_name})...")
+            model = CrossEncoder(model_name)
+        self.model = model
+        self.budget_ms = budget_ms
+        self.max_candidates = max_candidates
+        self.probe_every = probe_every
+        self._pair_ms = None
+        self._skipped_in_row = 0
+        self._lock = threading.Lock()
+        self.stats = {"reranked": 0, "skipped": 0, "over_budget": 0, "probes": 0}
+    
+    def warm_up(self):
+        """One untimed prediction: the first includes lazy model initialization"""
+        self.model.predict([("warm-up", "warm-up")])
+    
+    def rerank(self, question: str, candidates: List[Tuple[str, float]], top_k: int) -> List[Tuple[str, float]]:
+        """Best top_k of candidates as (document, relevance) pairs"""
+        available = min(len(candidates), self.max_candidates)
+        probe = False
+        with self._lock:
+            limit = available
+            if self._pair_ms:
+                limit = min(limit, int(self.budget_ms / self._pair_ms))
+            if limit < top_k or limit < 2:
+                self._skipped_in_row += 1
+                if self._skipped_in_row < self.probe_every or available < max(top_k, 2):
+                    self.stats["skipped"] += 1
+                    return candidates[:top_k]
+                probe = True
+                limit = max(top_k, 2)
+            self._skipped_in_row = 0
+        
+        pool = candidates[:limit]
+        started = time.perf_counter()
+        scores = self.model.predict([(question, document) for document, _ in pool])
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        
+        with self._lock:
+            pair_ms = elapsed_ms / len(pool)
+            if probe or self._pair_ms is None:
+                self._pair_ms = pair_ms
+            else:
+                self._pair_ms = 0.8 * self._pair_ms + 0.2 * pair_ms
+            self.stats["probes" if probe else "reranked"] += 1
+            if elapsed_ms > self.budget_ms:
+                self.stats["over_budget"] += 1
+        
+        ranked = sorted(zip(pool, scores), key=lambda item: item[1], reverse=True)
+        return [(document, float(score)) for (document, _), score in ranked[:top_k]]
+    
+    def get_stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["pair_ms"] = self._pair_ms or 0.0
+            return stats
\ No newline at end of file
@@ -0,0 +1,470 @@
+import argparse
+import base64
+import errno
+import hmac
+import http.client
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+import numpy as np
+from vector_store import BaseVectorStore
+
+# The service loads the embedding model and the index once and serves them to
+# any number of stateless web workers (app.py with RETRIEVAL_SERVICE_URL set):
+#   GET  /health    readiness, document count, index generation, model key
+#   POST /embed     {"texts": [...]} -> {"embeddings": array}
+#   POST /search    {"embeddings": array, "questions": [...]?, "top_k": k} -> {"results": [...]}
+#                   with questions the full hybrid (BM25 + vector, re-ranked) retrieval
+#                   runs, otherwise a plain vector search
+#   POST /retrieve  {"questions": [...], "top_k": k} -> embeddings and results in one call
+#   POST /reload    rebuild the index now (needs the X-Admin-Token header)
+# /search and /retrieve answers also carry the index generation, so workers
+# notice a hot reload on their next query (and drop their cached answers).
+# Arrays travel as base64-encoded float32 with their shape, not as lists of floats.
+
+class RetrievalServiceError(RuntimeError):
+    """The retrieval service could not be reached or answered with an error"""
+
+def encode_array(array: np.ndarray) -> Dict:
+    array = np.ascontiguousarray(array, dtype=np.float32)
+    return {"shape": list(array.shape), "data": base64.b64encode(array.tobytes()).decode("ascii")}
+
+def decode_array(payload: Dict) -> np.ndarray:
+    # bytearray keeps the array writable (callers normalize in place)
+    data = bytearray(base64.b64decode(payload["data"]))
+    return np.frombuffer(data, dtype=np.float32).reshape(payload["shape"])
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """ThreadingHTTPServer counterpart listening on a Unix domain socket"""
+    daemon_threads = True
+    
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            self._remove_stale_socket(self.server_address)
+        socketserver.UnixStreamServer.server_bind(self)
+        # BaseHTTPRequestHandler expects these
+        self.server_name = "localhost"
+        self.server_port = 0
+    
+    @staticmethod
+    def _remove_stale_socket(path: str):
+        """Remove a socket left by a service that is gone; refuse to take over a live one"""
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            raise OSError(errno.EEXIST, f"{path} exists and is not a socket")
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.settimeout(1.0)
+            probe.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.remove(path)
+            return
+        finally:
+            probe.close()
+        raise OSError(errno.EADDRINUSE, f"A retrieval service is already listening on {path}")
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    service = None
+    protocol_version = "HTTP/1.1"
+    
+    def do_GET(self):
+        if self.path.split("?")[0] == "/health":
+            self._send_json(200, self.service.health())
+            return
+        self._send_json(404, {"error": f"Unknown path {self.path}"})
+    
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            self._send_json(400, {"error": f"Invalid JSON: {e}"})
+            return
+        path = self.path.split("?")[0]
+        if path == "/reload":
+            token = self.headers.get("X-Admin-Token", "")
+            if not self.service.admin_token or not hmac.compare_digest(token, self.service.admin_token):
+                self._send_json(403, {"error": "Reloading is disabled or the token is wrong"})
+                return
+        handler = {
+            "/embed": self.service.embed,
+            "/search": self.service.search,
+            "/retrieve": self.service.retrieve,
+            "/reload": self.service.reload,
+        }.get(path)
+        if handler is None:
+            self._send_json(404, {"error": f"Unknown path {path}"})
+            return
+        if path != "/reload" and not self.service.rag.is_ready():
+            self._send_json(503, {"error": f"Index not ready ({self.service.rag.state})"})
+            return
+        try:
+            self._send_json(200, handler(payload))
+        except (KeyError, ValueError, TypeError) as e:
+            self._send_json(400, {"error": f"Bad request: {e}"})
+        except Exception as e:
+            print(f"RETRIEVAL SERVICE ERROR: {path}: {e}")
+            self._send_json(500, {"error": str(e)})
+    
+    def _send_json(self, code: int, payload: Dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+    
+    def log_message(self, format, *args):
+        pass
+
+class RetrievalService:
+    """Serves one RAGSystem's embedding model and index over HTTP or a Unix socket
+    
+    Single questions from all workers go through the system's EmbeddingBatcher,
+    so concurrent requests share encode calls.
+    """
+    
+    def __init__(self, rag, reloader=None, admin_token: str = ""):
+        self.rag = rag
+        self.reloader = reloader
+        self.admin_token = admin_token
+        self.server = None
+    
+    def health(self) -> Dict:
+        return {
+            "ready": self.rag.is_ready(),
+            "state": self.rag.state,
+            "documents": self.rag.vector_store.count(),
+            "generation": self.rag.index.number,
+            "model_key": self.rag.embedding_generator.model_key,
+            "dimension": self.rag.embedding_generator.dimension,
+        }
+    
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.rag.embedding_generator.dimension), dtype=np.float32)
+        futures = [self.rag.query_batcher.submit(text) for text in texts]
+        return np.stack([future.result() for future in futures]).astype(np.float32, copy=False)
+    
+    @staticmethod
+    def _results(results) -> List:
+        return [[[document, float(score)] for document, score in found] for found in results]
+    
+    def embed(self, payload: Dict) -> Dict:
+        return {"embeddings": encode_array(self._embed(list(payload["texts"])))}
+    
+    def search(self, payload: Dict) -> Dict:
+        embeddings = decode_array(payload["embeddings"])
+        top_k = int(payload.get("top_k", 3))
+        questions = payload.get("questions")
+        if questions is None:
+            index = self.rag.acquire_index()
+            try:
+                return {
+                    "results": self._results(index.vector_store.search_batch(embeddings, top_k=top_k)),
+                    "generation": index.number,
+                }
+            finally:
+                index.release()
+        if len(questions) != len(embeddings):
+            raise ValueError("questions and embeddings differ in length")
+        generation = self.rag.index.number
+        return {
+            "results": self._results(
+                self.rag.retrieve(question, top_k=top_k, query_embedding=embedding)
+                for question, embedding in zip(questions, embeddings)
+            ),
+            "generation": generation,
+        }
+    
+    def retrieve(self, payload: Dict) -> Dict:
+        questions = list(payload["questions"])
+        top_k = int(payload.get("top_k", 3))
+        embeddings = self._embed(questions)
+        generation = self.rag.index.number
+        return {
+            "generation": generation,
+            "embeddings": encode_array(embeddings),
+            "results": self._results(
+                self.rag.retrieve(question, top_k=top_k, query_embedding=embedding)
+                for question, embedding in zip(questions, embeddings)
+            ),
+        }
+    
+    def reload(self, payload: Dict) -> Dict:
+        if self.reloader is None:
+            raise ValueError("Hot reload is not enabled")
+        self.reloader.trigger()
+        return self.reloader.get_stats()
+    
+    def serve(self, url: str):
+        """Listen on http://host:port or unix:///path/to.sock from a daemon thread"""
+        handler = type("ServiceHandler", (_ServiceHandler,), {"service": self})
+        parsed = urlparse(url)
+        if parsed.scheme == "unix":
+            self.server = ThreadingUnixHTTPServer(parsed.path, handler)
+        else:
+            self.server = ThreadingHTTPServer((parsed.hostname or "127.0.0.1", parsed.port or 8700), handler)
+            self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="retrieval-service", daemon=True).start()
+        print(f"RETRIEVAL SERVICE: Listening on {url}")
+    
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix domain socket"""
+    
+    def __init__(self, socket_path: str, timeout: float = 10.0):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+    
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+class RetrievalClient:
+    """Pooled keep-alive client for the retrieval service
+    
+    Up to pool_size idle connections are kept for reuse; a connection the
+    server closed while idle is replaced and the request retried once.
+    
+    The client tracks the service's index generation from its answers and
+    calls the watch_generation callbacks when it changes, so a worker can
+    drop answers it cached from the previous index.
+    """
+    
+    def __init__(self, url: str, pool_size: int = 8, timeout_s: float = 10.0):
+        self.url = url
+        self.pool_size = pool_size
+        self.timeout_s = timeout_s
+        parsed = urlparse(url)
+        if parsed.scheme == "unix":
+            self._connect = lambda: UnixHTTPConnection(parsed.path, timeout=timeout_s)
+        elif parsed.scheme == "http":
+            self._connect = lambda: http.client.HTTPConnection(parsed.hostname, parsed.port or 8700, timeout=timeout_s)
+        else:
+            raise ValueError(f"Unsupported retrieval service URL: {url} (use http://host:port or unix:///path)")
+        self._idle = []
+        self._lock = threading.Lock()
+        self._health = None
+        self._health_at = 0.0
+        self.generation = None
+        self._listeners = []
+        self._watcher = None
+    
+    def _request(self, method: str, path: str, payload: Optional[Dict] = None) -> Dict:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in range(2):
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            reused = connection is not None
+            if connection is None:
+                connection = self._connect()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, ConnectionResetError, BrokenPipeError) as e:
+                connection.close()
+                # A pooled connection may have been closed by the server while idle
+                if reused and attempt == 0:
+                    continue
+                raise RetrievalServiceError(f"Retrieval service at {self.url} disconnected: {e}") from e
+            except OSError as e:
+                connection.close()
+                raise RetrievalServiceError(f"Retrieval service at {self.url} unreachable: {e}") from e
+            with self._lock:
+                if len(self._idle) < self.pool_size and not response.will_close:
+                    self._idle.append(connection)
+                else:
+                    connection.close()
+            result = json.loads(data or b"{}")
+            if response.status != 200:
+                raise RetrievalServiceError(f"Retrieval service error {response.status}: {result.get('error', '')}")
+            if "generation" in result:
+                # /health is current; a search answer may be overtaken by a newer one
+                self._observe(result["generation"], current=path == "/health")
+            return result
+    
+    def _observe(self, generation: int, current: bool):
+        with self._lock:
+            previous = self.generation
+            if previous is not None and generation == previous:
+                return
+            if previous is not None and generation < previous and not current:
+                return
+            self.generation = generation
+            listeners = list(self._listeners)
+        if previous is not None:
+            print(f"RETRIEVAL CLIENT: Service index generation changed {previous} -> {generation}")
+            for listener in listeners:
+                listener(generation)
+    
+    def watch_generation(self, callback: Callable[[int], None], interval_s: float = 1.0):
+        """Call callback(generation) when the service swaps in a new index generation
+        
+        Changes are seen in search answers and, every interval_s, from a
+        background /health poll, so cached answers are dropped even when
+        every question is a cache hit.
+        """
+        with self._lock:
+            self._listeners.append(callback)
+            start = self._watcher is None and interval_s > 0
+            if start:
+                self._watcher = threading.Thread(target=self._watch, args=(interval_s,),
+                                                 name="retrieval-generation-watch", daemon=True)
+        if start:
+            self._watcher.start()
+    
+    def _watch(self, interval_s: float):
+        while True:
+            time.sleep(interval_s)
+            try:
+                self.health()
+            except RetrievalServiceError:
+                pass
+    
+    def health(self, max_age_s: float = 0.0) -> Dict:
+        """Service health, reusing an answer up to max_age_s old"""
+        if self._health is None or time.monotonic() - self._health_at > max_age_s:
+            self._health = self._request("GET", "/health")
+            self._health_at = time.monotonic()
+        return self._health
+    
+    def is_ready(self) -> bool:
+        try:
+            return bool(self.health(max_age_s=1.0)["ready"])
+        except RetrievalServiceError:
+            return False
+    
+    def wait_until_ready(self, poll_s: float = 1.0):
+        """Block until the service is up and its index is loaded"""
+        while not self.is_ready():
+            time.sleep(poll_s)
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return decode_array(self._request("POST", "/embed", {"texts": list(texts)})["embeddings"])
+    
+    def search(self, embeddings: np.ndarray, top_k: int = 3,
+               questions: Optional[List[str]] = None) -> List[List[Tuple[str, float]]]:
+        """Vector search, or the service's full hybrid retrieval when questions are given"""
+        payload = {"embeddings": encode_array(embeddings), "top_k": top_k}
+        if questions is not None:
+            payload["questions"] = list(questions)
+        results = self._request("POST", "/search", payload)["results"]
+        return [[(document, score) for document, score in found] for found in results]
+    
+    def retrieve(self, questions: List[str], top_k: int = 3) -> Tuple[np.ndarray, List[List[Tuple[str, float]]]]:
+        """Embed and retrieve for several questions in one call"""
+        response = self._request("POST", "/retrieve", {"questions": list(questions), "top_k": top_k})
+        results = [[(document, score) for document, score in found] for found in response["results"]]
+        return decode_array(response["embeddings"]), results
+
+class RemoteEmbeddingGenerator:
+    """EmbeddingGenerator stand-in that encodes on the retrieval service"""
+    
+    def __init__(self, client: RetrievalClient):
+        self.client = client
+        health = client.health()
+        self.model_key = health["model_key"]
+        self.dimension = health["dimension"]
+    
+    def update_api_key(self, api_key: str):
+        pass
+    
+    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+        return self.client.embed(texts)
+
+class RemoteVectorStore(BaseVectorStore):
+    """Read-only vector store backed by the retrieval service (ingest happens there)"""
+    
+    def __init__(self, client: RetrievalClient):
+        self.client = client
+        self.path = client.url
+        self.collection_name = "remote"
+    
+    def count(self) -> int:
+        return int(self.client.health(max_age_s=1.0)["documents"])
+    
+    def get_index_key(self) -> Optional[str]:
+        return self.client.health(max_age_s=1.0)["model_key"]
+    
+    def search(self, query_embedding: np.ndarray, top_k: int = 3) -> List[Tuple[str, float]]:
+        return self.client.search(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1), top_k)[0]
+    
+    def search_batch(self, query_embeddings: np.ndarray, top_k: int = 3) -> List[List[Tuple[str, float]]]:
+        if len(query_embeddings) == 0:
+            return []
+        return self.client.search(np.asarray(query_embeddings, dtype=np.float32), top_k)
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval service: one embedding model and index for many web workers")
+    parser.add_argument("--url", default=os.environ.get("RETRIEVAL_SERVICE_URL", "http://127.0.0.1:8700"),
+                        help="http://host:port or unix:///path/to.sock")
+    parser.add_argument("--file", default=os.environ.get("FILE_PATH", "Mental_Health_Guide.txt"))
+    parser.add_argument("--vector-backend", default=os.environ.get("VECTOR_BACKEND", "chroma"))
+    parser.add_argument("--vector-store-path", default=None)
+    parser.add_argument("--vector-storage", default=os.environ.get("VECTOR_STORAGE", "float32"))
+    parser.add_argument("--embedding-backend", default=os.environ.get("EMBEDDING_BACKEND", "torch"))
+    parser.add_argument("--embedding-onnx-file", default=os.environ.get("EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx"),
+                        help="int8 graph for the onnx-int8 backend")
+    parser.add_argument("--embed-workers", type=int, default=int(os.environ.get("EMBED_WORKERS", "4")))
+    parser.add_argument("--embed-batch-size", type=int, default=int(os.environ.get("EMBED_BATCH_SIZE", "32")))
+    parser.add_argument("--no-hybrid", action="store_true", help="Vector search only (no BM25 fusion)")
+    parser.add_argument("--candidate-pool", type=int, default=int(os.environ.get("CANDIDATE_POOL", "20")))
+    parser.add_argument("--rerank-model", default=os.environ.get("RERANK_MODEL", ""))
+    parser.add_argument("--batch-size", type=int, default=int(os.environ.get("INGEST_BATCH_SIZE", "64")))
+    parser.add_argument("--reload-interval", type=float, default=float(os.environ.get("HOT_RELOAD_INTERVAL_S", "30")))
+    parser.add_argument("--admin-token", default=os.environ.get("ADMIN_TOKEN", ""))
+    args = parser.parse_args()
+    
+    from rag_system import RAGSystem
+    from semantic_cache import SemanticCache
+    from hot_reload import HotReloader
+    
+    # No Gemini key, cache or router: the service only embeds and retrieves
+    rag = RAGSystem(
+        api_key="",
+        embed_workers=args.embed_workers,
+        embed_batch_size=args.embed_batch_size,
+        answer_cache=SemanticCache(max_entries=0),
+        vector_backend=args.vector_backend,
+        embedding_backend=args.embedding_backend,
+        embedding_onnx_file=args.embedding_onnx_file,
+        router_enabled=False,
+        vector_store_path=args.vector_store_path,
+        hybrid_search=not args.no_hybrid,
+        candidate_pool=args.candidate_pool,
+        rerank_model=args.rerank_model or None,
+        vector_storage=args.vector_storage
+    )
+    rag.warm_up()
+    reloader = HotReloader(rag, args.file, interval_s=args.reload_interval, batch_size=args.batch_size)
+    service = RetrievalService(rag, reloader, admin_token=args.admin_token)
+    # Serve straight away: a persisted index answers while the files are re-checked
+    service.serve(args.url)
+    if rag.txt_processor.find_files(args.file):
+        rag.process_path(args.file, batch_size=args.batch_size)
+    else:
+        print(f"RETRIEVAL SERVICE ERROR: Resource file '{args.file}' not found")
+    reloader.start()
+    print(f"RETRIEVAL SERVICE: Ready ({rag.vector_store.count()} chunks)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        service.shutdown()
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+class SemanticCache:
+    """Answer cache keyed on query embeddings
+    
+    A lookup hits when a cached query in the same language lies within
+    max_distance (cosine distance) of the new one. The embedding model is
+    multilingual, so translations of a question are close to each other;
+    matching on the language keeps an English answer from being served to
+    a Spanish question. Entries are evicted least-recently-used first
+    once max_entries or max_bytes is exceeded, and expire after ttl_seconds.
+    """
+    
+    def __init__(self, max_distance: float = 0.08, max_entries: int = 1000,
+                 ttl_seconds: float = 3600.0, max_bytes: int = 32 * 1024 * 1024):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (embedding, answer, created_at, size, language)
+        self._next_key = 0
+        self._bytes = 0
+        # Bumped by invalidate() so answers generated before it are not stored
+        self.generation = 0
+        # Stacked embeddings of all entries, rebuilt lazily after changes
+        self._matrix = None
+        self._matrix_keys = []
+        self._matrix_languages = None
+        
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+    
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    
+    def lookup(self, embedding: np.ndarray, language: str = "") -> Optional[str]:
+        """Return the cached answer for the nearest cached query in language, if close enough"""
+        query = self._normalize(embedding)
+        with self._lock:
+            self._expire()
+            if not self._entries:
+                self._misses += 1
+                return None
+            
+            if self._matrix is None:
+                self._matrix_keys = list(self._entries.keys())
+                self._matrix = np.stack([self._entries[key][0] for key in self._matrix_keys])
+                self._matrix_languages = np.array([self._entries[key][4] for key in self._matrix_keys])
+            
+            similarities = np.where(self._matrix_languages == language, self._matrix @ query, -np.inf)
+            best = int(np.argmax(similarities))
+            if 1.0 - float(similarities[best]) > self.max_distance:
+                self._misses += 1
+                return None
+            
+            key = self._matrix_keys[best]
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return self._entries[key][1]
+    
+    def store(self, embedding: np.ndarray, answer: str, generation: Optional[int] = None,
+              language: str = ""):
+        """Cache an answer for a query embedding and the language it was asked in
+        
+        Pass the generation read before retrieval; the answer is dropped if
+        the cache was invalidated while it was being generated.
+        """
+        if self.max_entries <= 0 or not answer:
+            return
+        vector = self._normalize(embedding)
+        size = vector.nbytes + len(answer.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = (vector, answer, time.monotonic(), size, language)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._pop_oldest()
+                self._evictions += 1
+            self._matrix = None
+    
+    def invalidate(self):
+        """Drop every entry, e.g. after the knowledge base changed"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._matrix = None
+            self.generation += 1
+            self._invalidations += 1
+    
+    def _pop_oldest(self):
+        size = self._entries.popitem(last=False)[1][3]
+        self._bytes -= size
+    
+    def _expire(self):
+        # Entries are only refreshed on use, so the oldest by creation time may
+        # sit anywhere; scan them all (the cache is small)
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [key for key, entry in self._entries.items() if entry[2] < cutoff]
+        for key in expired:
+            self._bytes -= self._entries.pop(key)[3]
+        if expired:
+            self._matrix = None
+    
+    def get_stats(self) -> Dict:
+        """Hit/miss counts and current size"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "evictions": self._evictions,
+                "invalidations": self._invalidations,
+            }
\ No newline at end of file
@@ -0,0 +1,81 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Readiness states reported by StartupTracker
+STARTING = "starting"
+READY = "ready"
+FAILED = "failed"
+
+class StartupTracker:
+    """Tracks the startup phase and per-phase timings of the app
+    
+    The state is STARTING until the first phase begins, then the name of the
+    running phase, and finally READY or FAILED. Phases that run after the app
+    became ready (e.g. refreshing a persisted index) are timed but do not
+    change the state; their errors are recorded with record_error.
+    """
+    
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.state = STARTING
+        self.message = "Starting up..."
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self.ready_after: Optional[float] = None
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def phase(self, name: str, message: str = ""):
+        """Time one startup phase and expose it as the current state"""
+        with self._lock:
+            if self.state != READY:
+                self.state = name
+                self.message = message or name
+        print(f"STARTUP: {name} ...")
+        phase_started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - phase_started
+            with self._lock:
+                self.timings[name] = seconds
+            print(f"STARTUP: {name} took {seconds * 1000.0:.0f} ms")
+    
+    def mark_ready(self, message: str):
+        with self._lock:
+            self.state = READY
+            self.message = message
+            if self.ready_after is None:
+                self.ready_after = time.perf_counter() - self.started_at
+        print(f"STARTUP: ready {self.ready_after * 1000.0:.0f} ms after launch - {message}")
+    
+    def mark_failed(self, error: str):
+        with self._lock:
+            self.state = FAILED
+            self.message = error
+            self.error = error
+        print(f"STARTUP: failed - {error}")
+    
+    def record_error(self, error: str):
+        """Report an error that did not stop the app from serving (the state is kept)"""
+        with self._lock:
+            self.error = error
+        print(f"STARTUP: error - {error}")
+    
+    def is_ready(self) -> bool:
+        return self.state == READY
+    
+    def health(self) -> Dict:
+        """Readiness snapshot for health checks"""
+        with self._lock:
+            return {
+                "state": self.state,
+                "ready": self.state == READY,
+                "message": self.message,
+                "error": self.error,
+                "uptime_seconds": round(time.perf_counter() - self.started_at, 3),
+                "ready_after_seconds": round(self.ready_after, 3) if self.ready_after is not None else None,
+                "phase_seconds": {name: round(seconds, 3) for name, seconds in self.timings.items()},
+            }
\ No newline at end of file
@@ -0,0 +1,225 @@
+import bisect
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger("TELEMETRY")
+
+# "Prefix: message", matching the print-style lines used elsewhere
+LOG_FORMAT = "%(name)s: %(message)s"
+
+QUANTILES = (0.5, 0.95, 0.99)
+# Upper bounds (seconds) of the Prometheus histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def configure_logging(level: str = "INFO"):
+    """Set up the per-module loggers; level "OFF" silences them completely"""
+    if level.upper() == "OFF":
+        logging.disable(logging.CRITICAL)
+        return
+    logging.basicConfig(level=getattr(logging, level.upper(), logging.INFO), format=LOG_FORMAT)
+
+class LatencyHistogram:
+    """Cumulative buckets for Prometheus plus a rolling window for percentiles"""
+    
+    def __init__(self, window: int = 2048):
+        self.bucket_counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self._recent = deque(maxlen=window)
+    
+    def observe(self, seconds: float):
+        index = bisect.bisect_left(BUCKETS, seconds)
+        if index < len(BUCKETS):
+            self.bucket_counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        self._recent.append(seconds)
+    
+    def percentiles(self) -> Dict[float, float]:
+        """Nearest-rank percentiles over the recent window"""
+        ordered = sorted(self._recent)
+        if not ordered:
+            return {quantile: 0.0 for quantile in QUANTILES}
+        return {
+            quantile: ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+            for quantile in QUANTILES
+        }
+
+class Metrics:
+    """Thread-safe registry of stage latencies, counters and gauges"""
+    
+    def __init__(self, window: int = 2048):
+        self.window = window
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._counters: Dict[tuple, float] = {}
+        self._gauges: Dict[str, float] = {}
+    
+    def observe(self, stage: str, seconds: float):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = LatencyHistogram(self.window)
+            histogram.observe(seconds)
+    
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+    
+    def add_gauge(self, name: str, delta: float):
+        with self._lock:
+            self._gauges[name] = self._gauges.get(name, 0.0) + delta
+    
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+    
+    def snapshot(self) -> Dict:
+        """Latency percentiles (ms), counters and gauges as plain values"""
+        with self._lock:
+            latencies = {
+                stage: {
+                    "count": histogram.count,
+                    "avg_ms": histogram.sum * 1000.0 / histogram.count if histogram.count else 0.0,
+                    **{f"p{int(quantile * 100)}_ms": seconds * 1000.0
+                       for quantile, seconds in histogram.percentiles().items()},
+                }
+                for stage, histogram in self._histograms.items()
+            }
+            counters = {
+                name + "".join(f"[{value}]" for _, value in labels): count
+                for (name, labels), count in self._counters.items()
+            }
+            return {"latency": latencies, "counters": counters, "gauges": dict(self._gauges)}
+    
+    def render(self, extra_gauges: Optional[Dict[str, float]] = None) -> str:
+        """Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            if self._histograms:
+                lines.append("# HELP rag_stage_latency_seconds Latency of each request stage")
+                lines.append("# TYPE rag_stage_latency_seconds histogram")
+                for stage, histogram in self._histograms.items():
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS, histogram.bucket_counts):
+                        cumulative += count
+                        lines.append(f'rag_stage_latency_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                    lines.append(f'rag_stage_latency_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'rag_stage_latency_seconds_sum{{stage="{stage}"}} {histogram.sum:.6f}')
+                    lines.append(f'rag_stage_latency_seconds_count{{stage="{stage}"}} {histogram.count}')
+                lines.append("# HELP rag_stage_latency_quantile_seconds Recent p50/p95/p99 of each request stage")
+                lines.append("# TYPE rag_stage_latency_quantile_seconds gauge")
+                for stage, histogram in self._histograms.items():
+                    for quantile, seconds in histogram.percentiles().items():
+                        lines.append(f'rag_stage_latency_quantile_seconds{{stage="{stage}",quantile="{quantile}"}} {seconds:.6f}')
+            
+            names = sorted({name for name, _ in self._counters})
+            for name in names:
+                lines.append(f"# TYPE {name} counter")
+                for (counter_name, labels), value in sorted(self._counters.items()):
+                    if counter_name == name:
+                        label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                        lines.append(f"{name}{{{label_text}}} {value:g}" if label_text else f"{name} {value:g}")
+            gauges = dict(self._gauges)
+        
+        gauges.update(extra_gauges or {})
+        for name, value in sorted(gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {float(value):g}")
+        return "\n".join(lines) + "\n"
+
+class Trace:
+    """Timings of one request, recorded into Metrics when the request ends
+    
+    Use as a context manager around the whole request. Stages (embed,
+    retrieve, prompt_build, generate) are timed with span(); "ttft" is
+    marked with mark() and, like "total", measured from the request start.
+    """
+    
+    _ids = itertools.count(1)
+    
+    def __init__(self, metrics: Metrics, kind: str = "query"):
+        self.metrics = metrics
+        self.id = next(Trace._ids)
+        self.kind = kind
+        # How the request was answered: "rag", "cache" or a router route
+        self.outcome = "rag"
+        self.spans: Dict[str, float] = {}
+        self.started = time.perf_counter()
+    
+    def __enter__(self):
+        self.metrics.add_gauge("rag_requests_in_flight", 1)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        total = time.perf_counter() - self.started
+        self.metrics.add_gauge("rag_requests_in_flight", -1)
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.outcome = "error"
+        elif exc_type is not None:
+            # Client went away before the answer finished
+            self.outcome = "cancelled"
+        self.spans["total"] = total
+        for stage, seconds in self.spans.items():
+            self.metrics.observe(stage, seconds)
+        self.metrics.inc("rag_requests_total", kind=self.kind, outcome=self.outcome)
+        if logger.isEnabledFor(logging.DEBUG):
+            stages = ", ".join(f"{stage} {seconds * 1000.0:.1f} ms" for stage, seconds in self.spans.items())
+            logger.debug(f"trace {self.id} {self.kind} ({self.outcome}): {stages}")
+        return False
+    
+    @contextmanager
+    def span(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[name] = self.spans.get(name, 0.0) + time.perf_counter() - started
+    
+    def mark(self, name: str, at: Optional[float] = None):
+        """Record the time from the request start to now (or to `at`), once"""
+        if name not in self.spans:
+            self.spans[name] = (at if at is not None else time.perf_counter()) - self.started
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    render: Callable[[], str] = None
+    
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        try:
+            body = self.render().encode("utf-8")
+        except Exception as e:
+            logger.exception("Could not render metrics")
+            self.send_error(500, str(e))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        # Scrapes are frequent; keep them out of the normal log
+        logger.debug(format % args)
+
+def start_metrics_server(port: int, render: Callable[[], str], host: str = "127.0.0.1") -> Optional[ThreadingHTTPServer]:
+    """Serve render() at http://host:port/metrics from a daemon thread"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"render": staticmethod(render)})
+    try:
+        server = ThreadingHTTPServer((host, port), handler)
+    except OSError as e:
+        logger.warning(f"Metrics endpoint not started on port {port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Serving Prometheus metrics on http://{host}:{port}/metrics")
+    return server
\ No newline at end of file
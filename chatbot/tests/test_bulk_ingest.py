@@ -0,0 +1,90 @@
+import queue
+import threading
+
+import numpy as np
+
+from bulk_ingest import bulk_ingest, read_and_chunk
+from hot_reload import IndexGeneration
+from numpy_vector_store import NumpyVectorStore
+from rag_system import RAGSystem, STATE_EMPTY, STATE_READY
+from txt_processor import TXTProcessor
+
+def write_corpus(directory, files=3, words=600):
+    directory.mkdir()
+    for number in range(files):
+        text = " ".join(f"word{number}_{index}." for index in range(words))
+        (directory / f"doc{number}.txt").write_text(text)
+    return str(directory)
+
+class FakeEmbedder:
+    model_key = "fake-model"
+
+    def generate_embeddings(self, chunks):
+        return np.ones((len(chunks), 4), dtype=np.float32)
+
+class FakeCache:
+    def __init__(self):
+        self.invalidations = 0
+
+    def invalidate(self):
+        self.invalidations += 1
+
+class FakeRAG:
+    """The parts of RAGSystem bulk_ingest uses, over a real NumPy store"""
+
+    prune_sources = RAGSystem.prune_sources
+    persist_index = staticmethod(RAGSystem.persist_index)
+
+    def __init__(self, path):
+        self.txt_processor = TXTProcessor(chunk_size=200, chunk_overlap=20)
+        self.embedding_generator = FakeEmbedder()
+        self.answer_cache = FakeCache()
+        self.index = IndexGeneration(0, NumpyVectorStore(path=path))
+        self.state = STATE_EMPTY
+        self._index_lock = threading.Lock()
+
+    @property
+    def vector_store(self):
+        return self.index.vector_store
+
+    def acquire_index(self):
+        with self._index_lock:
+            index = self.index
+            index.acquire()
+        return index
+
+def test_read_and_chunk_sends_bounded_batches(tmp_path):
+    corpus = write_corpus(tmp_path / "docs", files=1)
+    file_path = f"{corpus}/doc0.txt"
+    out = queue.Queue()
+    read_and_chunk(file_path, "doc0.txt", 200, 20, "fake-model", 5, out)
+    messages = []
+    while not out.empty():
+        messages.append(out.get())
+    assert messages[-1] == ("done", file_path, "doc0.txt")
+    batches = [message[3] for message in messages[:-1]]
+    assert all(0 < len(batch) <= 5 for batch in batches)
+    assert [chunk for batch in batches for chunk in batch] == TXTProcessor(200, 20).extract_chunks(file_path)
+
+def test_ingest_writes_to_the_acquired_generation(tmp_path):
+    corpus = write_corpus(tmp_path / "docs")
+    rag = FakeRAG(str(tmp_path / "index"))
+    report = bulk_ingest(rag, corpus, workers=2, batch_size=8)
+    assert report["embedded"] == report["chunks"] == rag.vector_store.count() > 0
+    assert rag.state == STATE_READY
+    assert rag.index.in_use() == 0
+
+    # Unchanged files are not embedded again; a removed file's chunks are pruned
+    (tmp_path / "docs" / "doc2.txt").unlink()
+    report = bulk_ingest(rag, corpus, workers=2, batch_size=8)
+    assert report["embedded"] == 0 and report["stale"] > 0
+    assert set(rag.vector_store.get_ids_by_source()) == {"doc0.txt", "doc1.txt"}
+
+def test_ingest_of_empty_files_leaves_the_state_empty(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "empty.txt").write_text("   ")
+    rag = FakeRAG(str(tmp_path / "index"))
+    report = bulk_ingest(rag, str(docs), workers=1)
+    assert report["chunks"] == 0
+    assert rag.state == STATE_EMPTY
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from embedding_batcher import EmbeddingBatcher
+
+class GatedEmbedder:
+    """Blocks in generate_embeddings until released, so texts can queue up behind it"""
+    
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = []
+    
+    def generate_embeddings(self, texts):
+        self.calls.append(list(texts))
+        self.started.set()
+        self.release.wait(5)
+        return np.array([[float(len(text)), 1.0] for text in texts], dtype=np.float32)
+
+def test_batches_concurrent_texts():
+    embedder = GatedEmbedder()
+    embedder.release.set()
+    batcher = EmbeddingBatcher(embedder, max_batch_size=8, max_wait_ms=50)
+    futures = [batcher.submit("x" * n) for n in range(1, 5)]
+    embeddings = [future.result(timeout=5) for future in futures]
+    batcher.close()
+    assert [embedding[0] for embedding in embeddings] == [1.0, 2.0, 3.0, 4.0]
+    assert batcher.get_metrics()["items"] == 4
+
+def test_cancelled_waiter_does_not_stop_the_worker():
+    embedder = GatedEmbedder()
+    batcher = EmbeddingBatcher(embedder, max_batch_size=8, max_wait_ms=1)
+    # Occupy the worker, then queue a text and cancel it while it waits
+    busy = batcher.submit("busy")
+    assert embedder.started.wait(5)
+    waiting = batcher.submit("cancelled")
+    assert waiting.cancel()
+    embedder.release.set()
+    busy.result(timeout=5)
+    
+    assert batcher.embed("after") is not None
+    assert batcher._thread.is_alive()
+    assert ["cancelled"] not in embedder.calls
+    batcher.close()
+
+def test_cancelled_async_query_does_not_stop_the_worker():
+    embedder = GatedEmbedder()
+    batcher = EmbeddingBatcher(embedder, max_batch_size=8, max_wait_ms=1)
+    busy = batcher.submit("busy")
+    assert embedder.started.wait(5)
+    
+    async def disconnect():
+        task = asyncio.ensure_future(asyncio.wrap_future(batcher.submit("client gone")))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.sleep(0.01)
+    
+    asyncio.run(disconnect())
+    embedder.release.set()
+    busy.result(timeout=5)
+    assert batcher.submit("after").result(timeout=5)[0] == 5.0
+    assert batcher._thread.is_alive()
+    batcher.close()
+
+def test_encode_error_reaches_every_waiter():
+    class FailingEmbedder:
+        def generate_embeddings(self, texts):
+            raise RuntimeError("model crashed")
+    
+    batcher = EmbeddingBatcher(FailingEmbedder(), max_wait_ms=1)
+    future = batcher.submit("text")
+    with pytest.raises(RuntimeError, match="model crashed"):
+        future.result(timeout=5)
+    assert batcher._thread.is_alive()
+    batcher.close()
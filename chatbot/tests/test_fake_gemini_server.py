@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+from fake_gemini_server import FakeGeminiServer
+from fake_genai import ANSWER_WORDS
+from llm_client import LLMClient
+
+MODEL = "gemini-2.0-flash"
+
+@pytest.fixture
+def server():
+    server = FakeGeminiServer(ttft_ms=5, tokens_per_second=0, answer_tokens=12, chunk_tokens=4, seed=1).start()
+    yield server
+    server.stop()
+
+def make_llm(server, **kwargs):
+    kwargs.setdefault("backoff_s", 0.01)
+    return LLMClient(api_key="test-key", base_url=server.base_url, timeout_s=5, **kwargs)
+
+def answer(answer_tokens=12):
+    return " ".join(ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(answer_tokens))
+
+def test_generate_content_through_the_real_client(server):
+    response = make_llm(server).generate_content(MODEL, "question")
+    assert response.text.strip() == answer()
+    assert response.usage_metadata.candidates_token_count == 12
+
+def test_stream_through_the_real_client(server):
+    chunks = list(make_llm(server).generate_content_stream(MODEL, "question"))
+    assert len(chunks) == 3
+    assert "".join(chunk.text for chunk in chunks).strip() == answer()
+
+def test_server_errors_are_retried(server):
+    server.config["fail_rate"] = 0.5
+    llm = make_llm(server, max_attempts=10)
+    for _ in range(10):
+        assert llm.generate_content(MODEL, "question").text.strip() == answer()
+    assert server.stats["errors"] > 0
+    assert server.stats["requests"] == 10 + server.stats["errors"]
+
+def test_throttling_gives_up_after_max_attempts(server):
+    server.config["throttle_rate"] = 1.0
+    llm = make_llm(server, max_attempts=3)
+    with pytest.raises(Exception) as raised:
+        llm.generate_content(MODEL, "question")
+    assert getattr(raised.value, "code", None) == 429
+    assert server.stats["requests"] == 3
+
+def test_slow_async_call_is_hedged(server):
+    llm = make_llm(server, hedge_percentile=95, hedge_min_delay_s=0.05)
+
+    async def run():
+        for _ in range(20):
+            await llm.agenerate_content(MODEL, "question")
+        # Every request is now slow; the hedge still answers after about slow_ms
+        server.config.update({"slow_rate": 1.0, "slow_ms": 300})
+        return await llm.agenerate_content(MODEL, "question")
+
+    # One event loop: the client's async connection pool is bound to it
+    assert asyncio.run(run()).text.strip() == answer()
+    assert server.stats["requests"] == 22
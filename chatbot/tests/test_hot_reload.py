@@ -0,0 +1,150 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from hot_reload import (HotReloader, IndexGeneration, generation_path, read_current_generation,
+                        remove_stale_generations, write_current_generation)
+from txt_processor import TXTProcessor
+
+class DirStore:
+    """Vector store stand-in that only owns a directory"""
+    
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.sources = []
+        self.closed = False
+    
+    def close(self):
+        self.closed = True
+
+class FakeRAG:
+    """The parts of RAGSystem HotReloader uses, writing one marker file per processed file"""
+    
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.txt_processor = TXTProcessor()
+        self.index = IndexGeneration(0, DirStore(base_path))
+        self._index_lock = threading.Lock()
+        self.fail = False
+        self.opened = []
+    
+    def acquire_index(self):
+        with self._index_lock:
+            index = self.index
+            index.acquire()
+        return index
+    
+    def open_generation(self, number, fresh=False):
+        self.opened.append((number, fresh))
+        return IndexGeneration(number, DirStore(generation_path(self.base_path, number)))
+    
+    def process_file(self, file_path, batch_size=64, index=None, reuse=None, persist=True, source=None):
+        with open(os.path.join(index.path, "partial"), "w") as file:
+            file.write(source)
+        if self.fail:
+            raise RuntimeError("embedding failed")
+        index.vector_store.sources.append(source)
+        return 1
+    
+    def swap_index(self, index):
+        with self._index_lock:
+            old, self.index = self.index, index
+        write_current_generation(self.base_path, index.number)
+        old.retire()
+
+@pytest.fixture
+def corpus(tmp_path):
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "guide.txt").write_text("Breathing exercises help with anxiety.")
+    return str(docs)
+
+def test_generation_is_deleted_after_its_last_search(tmp_path):
+    generation = IndexGeneration(1, DirStore(str(tmp_path / "gen1")))
+    generation.acquire()
+    generation.acquire()
+    generation.retire()
+    generation.release()
+    assert os.path.isdir(generation.path)
+    assert generation.in_use() == 1
+    generation.release()
+    assert generation.vector_store.closed
+    assert not os.path.exists(generation.path)
+
+def test_unused_generation_is_deleted_when_retired(tmp_path):
+    generation = IndexGeneration(1, DirStore(str(tmp_path / "gen1")))
+    generation.retire()
+    assert not os.path.exists(generation.path)
+
+def test_reload_swaps_in_a_new_generation(tmp_path, corpus):
+    rag = FakeRAG(str(tmp_path / "index"))
+    held = rag.acquire_index()
+    reloader = HotReloader(rag, corpus)
+    stats = reloader.reload()
+    assert stats["generation"] == 1 and stats["reloads"] == 1
+    assert rag.index.vector_store.sources == ["guide.txt"]
+    assert read_current_generation(rag.base_path) == 1
+    # A search still holding generation 0 keeps it until it finishes
+    assert os.path.isdir(held.path)
+    held.release()
+    assert not os.path.exists(held.path)
+
+def test_failed_reload_never_reuses_its_generation(tmp_path, corpus):
+    rag = FakeRAG(str(tmp_path / "index"))
+    reloader = HotReloader(rag, corpus)
+    rag.fail = True
+    with pytest.raises(RuntimeError):
+        reloader.reload()
+    # The half-written generation is deleted and generation 0 stays current
+    assert not os.path.exists(generation_path(rag.base_path, 1))
+    assert rag.index.number == 0
+    assert reloader.get_stats()["failures"] == 1
+    
+    rag.fail = False
+    reloader.reload()
+    assert rag.opened == [(1, True), (2, True)]
+    assert rag.index.number == 2
+    assert read_current_generation(rag.base_path) == 2
+
+def test_stale_generations_are_removed(tmp_path):
+    base = str(tmp_path / "index")
+    for number in (0, 1, 2, 3):
+        os.makedirs(generation_path(base, number))
+    write_current_generation(base, 2)
+    remove_stale_generations(base, read_current_generation(base))
+    assert sorted(os.listdir(tmp_path)) == ["index.current", "index.gen2"]
+
+class ChromaRAG(FakeRAG):
+    """FakeRAG whose generations are real Chroma stores"""
+    
+    def __init__(self, base_path):
+        from vector_store import VectorStore
+        self.store_class = VectorStore
+        super().__init__(base_path)
+        self.index = IndexGeneration(0, VectorStore(path=base_path))
+    
+    def open_generation(self, number, fresh=False):
+        return IndexGeneration(number, self.store_class(path=generation_path(self.base_path, number)))
+    
+    def process_file(self, file_path, batch_size=64, index=None, reuse=None, persist=True, source=None):
+        index.vector_store.add_documents(["chunk"], np.ones((1, 4), dtype=np.float32),
+                                         ids=[f"{source}-{index.number}"], metadatas=[{"source": source}])
+        return 1
+
+def test_chroma_generations_are_closed_when_collected(tmp_path, corpus):
+    pytest.importorskip("chromadb")
+    rag = ChromaRAG(str(tmp_path / "index"))
+    reloader = HotReloader(rag, corpus)
+    retired = []
+    for _ in range(4):
+        retired.append(rag.index)
+        reloader.reload()
+    assert rag.index.number == 4 and rag.index.vector_store.count() == 1
+    assert all(generation.vector_store.client is None for generation in retired)
+    assert sorted(os.listdir(tmp_path)) == ["docs", "index.current", "index.gen4"]
+    # Chroma no longer caches a system for any retired path
+    cached = type(rag.index.vector_store.client)._identifier_to_system
+    assert not any(generation.path in cached for generation in retired)
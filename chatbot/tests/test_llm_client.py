@@ -0,0 +1,233 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+from fake_genai import FakeResponse
+from llm_client import LLMClient, LLMDeadlineExceeded, LLMOverloadedError
+
+class ApiError(Exception):
+    """Error carrying an HTTP status code, like google.genai's APIError"""
+
+    def __init__(self, code: int):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+class Reply:
+    """A scripted successful call: text after delay_s, optionally failing after fail_after stream chunks"""
+
+    def __init__(self, text: str = "ok", delay_s: float = 0.0, fail_after=None):
+        self.text = text
+        self.delay_s = delay_s
+        self.fail_after = fail_after
+
+class ScriptedModels:
+    """Plays back one scripted outcome per call: an exception to raise or a Reply"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def next_outcome(self):
+        with self._lock:
+            self.calls += 1
+            return self.outcomes.pop(0)
+
+    def generate_content(self, model, contents, config=None):
+        outcome = self.next_outcome()
+        if isinstance(outcome, Exception):
+            raise outcome
+        time.sleep(outcome.delay_s)
+        return FakeResponse(outcome.text)
+
+    def generate_content_stream(self, model, contents, config=None):
+        return self._stream(self.next_outcome())
+
+    @staticmethod
+    def _stream(outcome):
+        if isinstance(outcome, Exception):
+            raise outcome
+        time.sleep(outcome.delay_s)
+        for sent, word in enumerate(outcome.text.split()):
+            if sent == outcome.fail_after:
+                raise ApiError(503)
+            yield FakeResponse(word)
+
+class ScriptedAsyncModels:
+    def __init__(self, models: ScriptedModels):
+        self.models = models
+
+    async def generate_content(self, model, contents, config=None):
+        outcome = self.models.next_outcome()
+        if isinstance(outcome, Exception):
+            raise outcome
+        await asyncio.sleep(outcome.delay_s)
+        return FakeResponse(outcome.text)
+
+    async def generate_content_stream(self, model, contents, config=None):
+        outcome = self.models.next_outcome()
+
+        async def stream():
+            if isinstance(outcome, Exception):
+                raise outcome
+            await asyncio.sleep(outcome.delay_s)
+            for word in outcome.text.split():
+                yield FakeResponse(word)
+
+        return stream()
+
+class ScriptedClient:
+    def __init__(self, *outcomes):
+        self.models = ScriptedModels(outcomes)
+        self.aio = SimpleNamespace(models=ScriptedAsyncModels(self.models))
+
+class RecordingMetrics:
+    def __init__(self):
+        self.counts = Counter()
+
+    def inc(self, name, **labels):
+        self.counts[name] += 1
+
+    def set_gauge(self, name, value):
+        pass
+
+def make_llm(*outcomes, **kwargs):
+    kwargs.setdefault("backoff_s", 0.001)
+    return LLMClient(client=ScriptedClient(*outcomes), metrics=RecordingMetrics(), **kwargs)
+
+def texts(chunks):
+    return [chunk.text for chunk in chunks]
+
+def test_retries_unavailable_until_success():
+    llm = make_llm(ApiError(503), ApiError(429), Reply("answer"), max_attempts=3)
+    assert llm.generate_content("model", "question").text == "answer"
+    assert llm.client.models.calls == 3
+    assert llm.metrics.counts["llm_retries_total"] == 2
+    assert llm.get_stats()["in_flight"] == 0
+
+def test_client_errors_are_not_retried():
+    llm = make_llm(ApiError(400), Reply())
+    with pytest.raises(ApiError):
+        llm.generate_content("model", "question")
+    assert llm.client.models.calls == 1
+
+def test_gives_up_after_max_attempts():
+    llm = make_llm(*[ApiError(503)] * 3, Reply(), max_attempts=2)
+    with pytest.raises(ApiError):
+        llm.generate_content("model", "question")
+    assert llm.client.models.calls == 2
+    assert llm.get_stats()["in_flight"] == 0
+
+def test_no_retry_starts_after_the_deadline():
+    llm = make_llm(ApiError(503), Reply(), deadline_s=0.0)
+    with pytest.raises(ApiError):
+        llm.generate_content("model", "question")
+    assert llm.client.models.calls == 1
+
+def test_async_call_is_cut_off_at_the_deadline():
+    llm = make_llm(Reply(delay_s=2.0), deadline_s=0.1)
+    started = time.monotonic()
+    with pytest.raises(LLMDeadlineExceeded):
+        asyncio.run(llm.agenerate_content("model", "question"))
+    assert time.monotonic() - started < 1.0
+    assert llm.get_stats()["in_flight"] == 0
+
+def test_slow_call_is_hedged_and_hedge_wins():
+    history = [Reply("fast")] * 20
+    llm = make_llm(*history, Reply("primary", delay_s=1.0), Reply("hedge"),
+                   hedge_percentile=95, hedge_min_delay_s=0.05)
+    for _ in history:
+        llm.generate_content("model", "question")
+    started = time.monotonic()
+    assert llm.generate_content("model", "question").text == "hedge"
+    assert time.monotonic() - started < 0.5
+    assert llm.metrics.counts["llm_hedge_wins_total"] == 1
+    assert llm.get_stats()["in_flight"] == 0
+
+def test_no_hedging_without_latency_history():
+    llm = make_llm(Reply("primary", delay_s=0.2), Reply("hedge"), hedge_percentile=95, hedge_min_delay_s=0.01)
+    assert llm.generate_content("model", "question").text == "primary"
+    assert llm.client.models.calls == 1
+
+def test_async_stream_is_hedged_before_the_first_chunk():
+    history = [Reply("fast")] * 20
+    llm = make_llm(*history, Reply("slow primary", delay_s=1.0), Reply("hedged answer"),
+                   hedge_percentile=95, hedge_min_delay_s=0.05)
+
+    async def collect():
+        return [chunk async for chunk in llm.agenerate_content_stream("model", "question")]
+
+    for _ in history:
+        asyncio.run(collect())
+    assert texts(asyncio.run(collect())) == ["hedged", "answer"]
+    assert llm.metrics.counts["llm_hedge_wins_total"] == 1
+    assert llm.get_stats()["in_flight"] == 0
+
+def test_stream_is_retried_before_the_first_chunk():
+    llm = make_llm(ApiError(503), Reply("streamed answer"))
+    assert texts(llm.generate_content_stream("model", "question")) == ["streamed", "answer"]
+    assert llm.client.models.calls == 2
+    assert llm.get_stats()["in_flight"] == 0
+
+def test_stream_is_not_retried_after_the_first_chunk():
+    llm = make_llm(Reply("partial answer", fail_after=1), Reply("again"))
+    received = []
+    with pytest.raises(ApiError):
+        for chunk in llm.generate_content_stream("model", "question"):
+            received.append(chunk.text)
+    assert received == ["partial"]
+    assert llm.client.models.calls == 1
+    assert llm.get_stats()["in_flight"] == 0
+
+def test_token_bucket_refuses_calls_over_the_rate():
+    llm = make_llm(*[Reply()] * 3, rate_per_s=0.1, burst=2)
+    llm.generate_content("model", "question")
+    llm.generate_content("model", "question")
+    with pytest.raises(LLMOverloadedError):
+        llm.generate_content("model", "question")
+    assert llm.client.models.calls == 2
+    assert llm.metrics.counts["llm_rejected_total"] == 1
+
+def test_token_bucket_waits_up_to_admission_wait():
+    llm = make_llm(Reply(), Reply(), rate_per_s=10, burst=1, admission_wait_s=1.0)
+    llm.generate_content("model", "question")
+    started = time.monotonic()
+    llm.generate_content("model", "question")
+    assert 0.05 < time.monotonic() - started < 0.5
+
+def test_concurrency_cap_refuses_calls_over_the_limit():
+    llm = make_llm(Reply("first", delay_s=0.3), Reply("second"), max_concurrency=1)
+
+    async def run():
+        first = asyncio.ensure_future(llm.agenerate_content("model", "question"))
+        await asyncio.sleep(0.05)
+        assert llm.get_stats()["in_flight"] == 1
+        with pytest.raises(LLMOverloadedError):
+            await llm.agenerate_content("model", "question")
+        return await first
+
+    assert asyncio.run(run()).text == "first"
+    assert llm.get_stats()["in_flight"] == 0
+
+def test_cancelled_stream_gives_back_its_slot():
+    llm = make_llm(Reply("never sent", delay_s=2.0), Reply("next answer"), max_concurrency=1)
+
+    async def run():
+        async def consume():
+            return [chunk async for chunk in llm.agenerate_content_stream("model", "question")]
+
+        # The client disconnects before the first chunk arrives
+        task = asyncio.ensure_future(consume())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert llm.get_stats()["in_flight"] == 0
+        return await consume()
+
+    assert texts(asyncio.run(run())) == ["next", "answer"]
+    assert llm.get_stats()["in_flight"] == 0
@@ -0,0 +1,71 @@
+import os
+
+import numpy as np
+import pytest
+
+from numpy_vector_store import NumpyVectorStore
+
+def vectors(*rows):
+    return np.array(rows, dtype=np.float32)
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = NumpyVectorStore(path=str(tmp_path / "index"))
+    store.saves = 0
+    save = store._save
+    
+    def counting_save(state):
+        store.saves += 1
+        save(state)
+    
+    monkeypatch.setattr(store, "_save", counting_save)
+    return store
+
+def add(store, name, vector, source="guide.txt"):
+    store.add_documents([name], vectors(vector), ids=[name], metadatas=[{"source": source}])
+
+def test_searches_during_ingest_see_pending_rows_without_writing(store):
+    add(store, "a", [1, 0, 0])
+    assert store.search(vectors([1, 0, 0])[0], top_k=1)[0][0] == "a"
+    add(store, "b", [0, 1, 0])
+    assert store.search(vectors([0, 1, 0])[0], top_k=1)[0][0] == "b"
+    assert store.count() == 2
+    assert store.saves == 0 and not os.path.exists(store.matrix_path)
+    store.flush()
+    assert store.saves == 1
+    store.flush()
+    assert store.saves == 1
+
+def test_delete_is_written_once_by_flush(store):
+    add(store, "a", [1, 0, 0])
+    add(store, "b", [0, 1, 0])
+    store.delete(["a"])
+    assert store.saves == 0
+    assert store.get_ids() == {"b"}
+    assert [document for document, _ in store.search(vectors([1, 0, 0])[0], top_k=2)] == ["b"]
+    store.flush()
+    assert store.saves == 1
+
+def test_flushed_index_is_reloaded(store):
+    add(store, "a", [1, 0, 0])
+    add(store, "b", [0, 1, 0], source="other.txt")
+    store.flush()
+    store.delete(["b"])
+    reloaded = NumpyVectorStore(path=store.path)
+    # The delete was not flushed yet
+    assert reloaded.get_ids_by_source() == {"guide.txt": {"a"}, "other.txt": {"b"}}
+    store.flush()
+    reloaded = NumpyVectorStore(path=store.path)
+    assert reloaded.get_ids() == {"a"}
+    assert reloaded.search(vectors([1, 0, 0])[0], top_k=1)[0][0] == "a"
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_compact_storage_searches_pending_rows(tmp_path, storage):
+    store = NumpyVectorStore(path=str(tmp_path / "index"), storage=storage)
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(50, 8)).astype(np.float32)
+    store.add_documents([f"doc{i}" for i in range(50)], matrix, ids=[f"doc{i}" for i in range(50)])
+    assert store.search(matrix[7], top_k=1)[0][0] == "doc7"
+    store.flush()
+    assert store.memory_stats()["storage"] == storage
+    assert NumpyVectorStore(path=store.path, storage=storage).search(matrix[7], top_k=1)[0][0] == "doc7"
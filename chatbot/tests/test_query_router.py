@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from query_router import (CRISIS_EXEMPLARS, CRISIS_PROTOCOL, ROUTE_CRISIS,
+                          ROUTE_GREETING, QueryRouter, detect_language)
+
+@pytest.mark.parametrize("question, language", [
+    ("I want to kill myself", "en"),
+    ("i'm suicidal and I don't know what to do", "en"),
+    ("I took an overdose an hour ago", "en"),
+    ("hi, I want to die", "en"),
+    ("Sometimes I cut myself when it gets bad", "en"),
+    ("I don't want to live anymore", "en"),
+    ("I just want to end it all", "en"),
+    ("I cut myself cooking and now I want to die", "en"),
+    ("I want to cut myself while cooking", "en"),
+    ("Me quiero morir", "es"),
+    ("Creo que voy a matarme", "es"),
+    ("No quiero seguir viviendo así", "es"),
+    ("Ich will mich umbringen", "de"),
+    ("Ich möchte nicht mehr leben", "de"),
+    ("Je veux mourir", "fr"),
+    ("J'ai envie d'en finir", "fr"),
+    ("Je vais me tuer ce soir", "fr"),
+])
+def test_first_person_crisis_statements_get_the_protocol(question, language):
+    route = QueryRouter().match_keywords(question)
+    assert route is not None
+    assert route.kind == ROUTE_CRISIS
+    assert route.language == language
+    assert route.reply == CRISIS_PROTOCOL[language]
+
+@pytest.mark.parametrize("question", [
+    "What are warning signs of suicide in a friend?",
+    "How do I help someone who self harms?",
+    "What should I do after someone takes an overdose?",
+    "My brother is suicidal, what should I do?",
+    "Is suicide common among teenagers?",
+    "¿Cuáles son las señales de suicidio?",
+    "Wie erkenne ich Suizidgefahr bei Freunden?",
+    # Accidents and idioms
+    "I cut myself cooking, how do I clean it?",
+    "I accidentally hurt myself",
+    "I hurt myself at the gym yesterday",
+    "I cut myself on a broken glass",
+    "This workload is killing me",
+    "Mi madre va a matarme cuando vea las notas",
+    "Este trabajo me va a matar",
+    "Meine Mutter wird mich umbringen",
+    "Ich habe mich beim Kochen verletzt",
+    "Ce travail va me tuer",
+    "Mon père va me tuer si je rate l'examen",
+])
+def test_informational_third_party_and_idiomatic_messages_are_not_keyword_crises(question):
+    assert QueryRouter().match_keywords(question) is None
+
+@pytest.mark.parametrize("question, language, reply", [
+    ("Hi!", "en", "Hi there! How can I help you today?"),
+    ("thank you so much", "en", "You're welcome, take care!"),
+    ("Hola", "es", "¡Hola! ¿En qué puedo ayudarte hoy?"),
+    ("Tschüss", "de", "Tschüss, pass gut auf dich auf!"),
+])
+def test_greetings(question, language, reply):
+    route = QueryRouter().match_keywords(question)
+    assert route.kind == ROUTE_GREETING
+    assert route.language == language
+    assert route.reply == reply
+
+def test_longer_messages_are_not_greetings():
+    assert QueryRouter().match_keywords("hi, I have been feeling anxious lately") is None
+
+class AxisEmbedder:
+    """Embeds every crisis exemplar on one axis and every greeting exemplar on another"""
+    
+    def generate_embeddings(self, texts):
+        crisis = set(CRISIS_EXEMPLARS)
+        return np.array([[1.0, 0.0, 0.0] if text in crisis else [0.0, 1.0, 0.0] for text in texts],
+                        dtype=np.float32)
+
+def angled(similarity):
+    """Unit vector with the given cosine similarity to the crisis axis"""
+    return np.array([similarity, 0.0, np.sqrt(1.0 - similarity ** 2)], dtype=np.float32)
+
+def test_embedding_check_is_strict():
+    router = QueryRouter(AxisEmbedder())
+    # Close paraphrases of a crisis statement are routed, loosely related questions are not
+    route = router.match_embedding("I no longer see a way forward", angled(0.9))
+    assert route.kind == ROUTE_CRISIS and route.method == "embedding"
+    assert router.match_embedding("What are warning signs of suicide in a friend?", angled(0.75)) is None
+
+def test_embedding_greetings_only_for_short_messages():
+    router = QueryRouter(AxisEmbedder())
+    greeting = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+    assert router.match_embedding("hey hey", greeting).kind == ROUTE_GREETING
+    assert router.match_embedding("hey, can you tell me about sleep and anxiety", greeting) is None
+
+def test_detect_language():
+    assert detect_language("¿Qué es la ansiedad y cómo la controlo?") == "es"
+    assert detect_language("Was ist das und wie geht es?") == "de"
+    assert detect_language("12345") == "en"
+
+def test_stats_count_avoided_calls():
+    router = QueryRouter()
+    router.record(router.match_keywords("hello"))
+    router.record(router.match_keywords("I want to kill myself"), follow_up=True)
+    router.record(None)
+    stats = router.get_stats()
+    assert (stats["greeting"], stats["crisis"], stats["rag"]) == (1, 1, 1)
+    assert stats["llm_calls_avoided"] == 1
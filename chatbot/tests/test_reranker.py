@@ -0,0 +1,56 @@
+import time
+
+from reranker import CrossEncoderReranker
+
+class SlowStartModel:
+    """Cross-encoder stand-in: the first slow_calls predictions are slow, later ones fast"""
+    
+    def __init__(self, slow_calls=1, slow_pair_s=0.02):
+        self.slow_calls = slow_calls
+        self.slow_pair_s = slow_pair_s
+        self.calls = 0
+    
+    def predict(self, pairs):
+        self.calls += 1
+        if self.calls <= self.slow_calls:
+            time.sleep(self.slow_pair_s * len(pairs))
+        # Longer documents score higher, so the re-ranked order is known
+        return [len(document) for _, document in pairs]
+
+def candidates(count=10):
+    return [("x" * (index + 1), 0.0) for index in range(count)]
+
+def test_reranks_by_score_within_the_budget():
+    reranker = CrossEncoderReranker(budget_ms=100, model=SlowStartModel(slow_calls=0))
+    assert [document for document, _ in reranker.rerank("q", candidates(), top_k=3)] == ["x" * 10, "x" * 9, "x" * 8]
+    assert reranker.get_stats()["reranked"] == 1
+
+def test_warm_up_is_not_measured():
+    model = SlowStartModel(slow_calls=1, slow_pair_s=0.2)
+    reranker = CrossEncoderReranker(budget_ms=50, model=model)
+    reranker.warm_up()
+    reranker.rerank("q", candidates(), top_k=3)
+    stats = reranker.get_stats()
+    assert stats["reranked"] == 1 and stats["skipped"] == 0
+    assert stats["pair_ms"] < 5
+
+def test_recovers_after_one_slow_sample():
+    reranker = CrossEncoderReranker(budget_ms=50, probe_every=5, model=SlowStartModel(slow_calls=1))
+    # 10 pairs at 20 ms: the estimate says only 2 fit in the budget
+    reranker.rerank("q", candidates(), top_k=3)
+    for _ in range(4):
+        assert reranker.rerank("q", candidates(), top_k=3) == candidates()[:3]
+    assert reranker.get_stats()["skipped"] == 4
+    # The fifth skipped call probes with top_k pairs instead and finds them fast
+    reranker.rerank("q", candidates(), top_k=3)
+    assert reranker.get_stats()["probes"] == 1
+    assert [document for document, _ in reranker.rerank("q", candidates(), top_k=3)][0] == "x" * 10
+    stats = reranker.get_stats()
+    assert stats["reranked"] == 2 and stats["skipped"] == 4
+
+def test_keeps_skipping_while_still_slow():
+    reranker = CrossEncoderReranker(budget_ms=50, probe_every=3, model=SlowStartModel(slow_calls=100))
+    for _ in range(7):
+        reranker.rerank("q", candidates(), top_k=3)
+    stats = reranker.get_stats()
+    assert stats["reranked"] == 1 and stats["probes"] == 2 and stats["skipped"] == 4
@@ -0,0 +1,86 @@
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from retrieval_service import RetrievalClient, ThreadingUnixHTTPServer
+
+class HealthHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        data = json.dumps({"ready": True}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(path):
+    server = ThreadingUnixHTTPServer(path, HealthHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def test_second_service_refuses_a_live_socket(tmp_path):
+    path = str(tmp_path / "service.sock")
+    first = serve(path)
+    try:
+        with pytest.raises(OSError, match="already listening"):
+            ThreadingUnixHTTPServer(path, HealthHandler)
+        assert RetrievalClient(f"unix://{path}").health()["ready"]
+    finally:
+        first.shutdown()
+        first.server_close()
+
+def test_stale_socket_is_replaced(tmp_path):
+    path = str(tmp_path / "service.sock")
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    server = serve(path)
+    try:
+        assert RetrievalClient(f"unix://{path}").health()["ready"]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_other_files_are_not_removed(tmp_path):
+    path = tmp_path / "service.sock"
+    path.write_text("not a socket")
+    with pytest.raises(OSError, match="not a socket"):
+        ThreadingUnixHTTPServer(str(path), HealthHandler)
+    assert path.read_text() == "not a socket"
+
+def test_garbled_answer_on_a_pooled_connection_is_retried(tmp_path):
+    path = str(tmp_path / "service.sock")
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen()
+    body = b'{"ready": true}'
+    ok = b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body)
+
+    def peer():
+        # The first connection answers once, then dies mid-response to the next request
+        first, _ = listener.accept()
+        for answer in (ok, b"garbage\r\n"):
+            first.recv(65536)
+            first.sendall(answer)
+        first.close()
+        second, _ = listener.accept()
+        second.recv(65536)
+        second.sendall(ok)
+        second.close()
+
+    thread = threading.Thread(target=peer, daemon=True)
+    thread.start()
+    client = RetrievalClient(f"unix://{path}", timeout_s=5.0)
+    try:
+        assert client.health()["ready"]
+        assert client.health()["ready"]
+    finally:
+        thread.join(timeout=5.0)
+        listener.close()
@@ -0,0 +1,55 @@
+import time
+
+import numpy as np
+
+from semantic_cache import SemanticCache
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+def test_near_duplicate_questions_hit():
+    cache = SemanticCache(max_distance=0.05)
+    cache.store(unit(1, 0, 0), "answer", language="en")
+    assert cache.lookup(unit(1, 0.05, 0), "en") == "answer"
+    assert cache.lookup(unit(0, 1, 0), "en") is None
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+def test_translations_do_not_share_answers():
+    cache = SemanticCache(max_distance=0.05)
+    # A translation embeds close to the original question
+    cache.store(unit(1, 0, 0), "English answer", language="en")
+    assert cache.lookup(unit(1, 0.01, 0), "es") is None
+    cache.store(unit(1, 0.01, 0), "Respuesta en español", language="es")
+    assert cache.lookup(unit(1, 0, 0), "es") == "Respuesta en español"
+    assert cache.lookup(unit(1, 0, 0), "en") == "English answer"
+
+def test_invalidate_drops_entries_and_stale_stores():
+    cache = SemanticCache()
+    cache.store(unit(1, 0), "old")
+    generation = cache.generation
+    cache.invalidate()
+    assert cache.lookup(unit(1, 0)) is None
+    # An answer generated before the invalidation is not stored
+    cache.store(unit(1, 0), "stale", generation)
+    assert cache.lookup(unit(1, 0)) is None
+    cache.store(unit(1, 0), "fresh", cache.generation)
+    assert cache.lookup(unit(1, 0)) == "fresh"
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticCache(max_distance=0.01, max_entries=2)
+    cache.store(unit(1, 0, 0), "a")
+    cache.store(unit(0, 1, 0), "b")
+    assert cache.lookup(unit(1, 0, 0)) == "a"
+    cache.store(unit(0, 0, 1), "c")
+    assert cache.lookup(unit(0, 1, 0)) is None
+    assert cache.lookup(unit(1, 0, 0)) == "a"
+    assert cache.get_stats()["evictions"] == 1
+
+def test_entries_expire():
+    cache = SemanticCache(ttl_seconds=0.05)
+    cache.store(unit(1, 0), "answer")
+    time.sleep(0.1)
+    assert cache.lookup(unit(1, 0)) is None
+    assert cache.get_stats()["entries"] == 0
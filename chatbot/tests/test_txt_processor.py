@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+from txt_processor import TXTProcessor
+
+def reference_chunks(text, chunk_size, chunk_overlap):
+    """The original whole-text chunk_text, which the streaming chunker must match"""
+    chunks = []
+    start = 0
+    text_length = len(text)
+    while start < text_length:
+        end = start + chunk_size
+        if end < text_length:
+            for delimiter in ['. ', '? ', '! ', '\n\n', '\n', ' ']:
+                last_delimiter = text.rfind(delimiter, start, end)
+                if last_delimiter != -1 and (last_delimiter + len(delimiter)) > (start + chunk_overlap):
+                    end = last_delimiter + len(delimiter)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = end - chunk_overlap
+    return chunks
+
+def sample_text(length, seed=0):
+    rng = random.Random(seed)
+    pieces = ["word", "anxiety", "sleep", ". ", "? ", "! ", "\n\n", "\n", " ", " ", " ", "x" * 40]
+    text = ""
+    while len(text) < length:
+        text += rng.choice(pieces)
+    return text[:length]
+
+def split_blocks(text, block_size):
+    return [text[i:i + block_size] for i in range(0, len(text), block_size)]
+
+@pytest.mark.parametrize("block_size", [1, 7, 50, 199, 200, 201, 1000, 100000])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_streaming_chunks_match_whole_text_chunks(block_size, seed):
+    text = sample_text(5000, seed)
+    # A small block_size also exercises dropping the consumed buffer
+    processor = TXTProcessor(chunk_size=200, chunk_overlap=40, block_size=block_size)
+    expected = reference_chunks(text, 200, 40)
+    assert list(processor.iter_chunk_text(split_blocks(text, block_size))) == expected
+    assert processor.chunk_text(text) == expected
+
+@pytest.mark.parametrize("text", ["", "   ", "short", "x" * 1000, "no delimiters here" * 30])
+def test_edge_cases_match_whole_text_chunks(text):
+    processor = TXTProcessor(chunk_size=100, chunk_overlap=20, block_size=16)
+    assert list(processor.iter_chunk_text(split_blocks(text, 16))) == reference_chunks(text, 100, 20)
+
+def test_iter_chunks_reads_files_in_blocks(tmp_path):
+    text = sample_text(20000, seed=3) + " café"
+    path = tmp_path / "notes.txt"
+    path.write_text(text, encoding="latin-1")
+    processor = TXTProcessor(chunk_size=300, chunk_overlap=50, block_size=512)
+    assert list(processor.iter_chunks(str(path))) == reference_chunks(text, 300, 50)
+    assert processor.extract_chunks(str(path)) == reference_chunks(text, 300, 50)
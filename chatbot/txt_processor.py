@@ -1,11 +1,17 @@
-from typing import List
+import codecs
+import glob
+import hashlib
+import os
+from typing import Iterable, Iterator, List
 
 class TXTProcessor:
     """Handles TXT file text extraction and chunking"""
     
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, block_size: int = 64 * 1024):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
+        # Characters read from disk at a time by the streaming reader
+        self.block_size = block_size
     
     def extract_text(self, txt_path: str) -> str:
         """Extract all text from TXT file"""
@@ -19,13 +25,62 @@ class TXTProcessor:
                 text = file.read()
             return text
     
+    def detect_encoding(self, txt_path: str) -> str:
+        """Return 'utf-8' if the whole file decodes as UTF-8, else 'latin-1'
+        
+        Decodes block by block so memory use does not depend on file size.
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        try:
+            with open(txt_path, 'rb') as file:
+                while True:
+                    block = file.read(self.block_size)
+                    if not block:
+                        decoder.decode(b'', final=True)
+                        return 'utf-8'
+                    decoder.decode(block)
+        except UnicodeDecodeError:
+            return 'latin-1'
+    
+    def iter_text(self, txt_path: str) -> Iterator[str]:
+        """Read a TXT file incrementally, yielding blocks of text"""
+        encoding = self.detect_encoding(txt_path)
+        with open(txt_path, 'r', encoding=encoding) as file:
+            while True:
+                block = file.read(self.block_size)
+                if not block:
+                    return
+                yield block
+    
     def chunk_text(self, text: str) -> List[str]:
         """Split text into overlapping chunks"""
-        chunks = []
+        return list(self.iter_chunk_text([text]))
+    
+    def iter_chunk_text(self, blocks: Iterable[str]) -> Iterator[str]:
+        """Split a stream of text blocks into overlapping chunks
+        
+        Produces exactly the chunks chunk_text would for the concatenated
+        text, while only holding about one block plus one chunk in memory.
+        """
+        blocks = iter(blocks)
+        text = ""
         start = 0
-        text_length = len(text)
+        exhausted = False
         
-        while start < text_length:
+        while True:
+            # Buffer more than a full chunk past start, so "end < text_length"
+            # below means the same thing it would for the whole text
+            while not exhausted and len(text) - start <= self.chunk_size:
+                block = next(blocks, None)
+                if block is None:
+                    exhausted = True
+                else:
+                    text += block
+            text_length = len(text)
+            
+            if start >= text_length:
+                return
+            
             end = start + self.chunk_size
             
             # If not at the end, try to break at a sentence or word boundary
@@ -40,14 +95,54 @@ class TXTProcessor:
             
             chunk = text[start:end].strip()
             if chunk:
-                chunks.append(chunk)
+                yield chunk
             
             start = end - self.chunk_overlap
+            
+            # Drop text that no later chunk can reach
+            if start > self.block_size:
+                text = text[start:]
+                start = 0
+    
+    def iter_chunks(self, txt_path: str) -> Iterator[str]:
+        """Stream chunks from a TXT file without loading it whole"""
+        return self.iter_chunk_text(self.iter_text(txt_path))
+    
+    def find_files(self, path: str) -> List[str]:
+        """Resolve a file, a directory (searched recursively) or a glob pattern to TXT files"""
+        if os.path.isdir(path):
+            return sorted(glob.glob(os.path.join(path, "**", "*.txt"), recursive=True))
+        if glob.has_magic(path):
+            return sorted(p for p in glob.glob(path, recursive=True) if os.path.isfile(p))
+        return [path] if os.path.isfile(path) else []
+    
+    def corpus_root(self, path: str) -> str:
+        """Directory that sources found by find_files(path) are keyed relative to"""
+        if os.path.isdir(path):
+            return path
+        if glob.has_magic(path):
+            # The part of the pattern before the first wildcard component
+            parts = []
+            for part in os.path.normpath(path).split(os.sep):
+                if glob.has_magic(part):
+                    break
+                parts.append(part)
+            return os.sep.join(parts) or "."
+        return os.path.dirname(path) or "."
+    
+    def source_key(self, file_path: str, root: str) -> str:
+        """Source recorded for a file's chunks: its path relative to the corpus root
         
-        return chunks
+        Independent of the working directory and of where the corpus lives,
+        so moving the corpus does not orphan or re-embed its chunks.
+        """
+        return os.path.relpath(os.path.abspath(file_path), os.path.abspath(root)).replace(os.sep, "/")
+    
+    def chunk_id(self, chunk: str, source: str, model_key: str) -> str:
+        """Content-addressed ID for a chunk, tied to the embedding model and chunker settings"""
+        key = f"{model_key}|{self.chunk_size}|{self.chunk_overlap}|{source}|{chunk}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
     
     def extract_chunks(self, txt_path: str) -> List[str]:
         """Extract and chunk TXT text"""
-        text = self.extract_text(txt_path)
-        chunks = self.chunk_text(text)
-        return chunks
\ No newline at end of file
+        return list(self.iter_chunks(txt_path))
\ No newline at end of file
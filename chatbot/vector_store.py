@@ -1,70 +1,224 @@
-import chromadb
 import numpy as np
-from typing import List, Tuple
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 import uuid
 
-class VectorStore:
+# Where each backend keeps its index unless a path is given
+DEFAULT_STORE_PATHS = {"chroma": "./chroma_db", "numpy": "./numpy_index"}
+
+class BaseVectorStore:
+    """Interface shared by the vector store backends
+    
+    Embeddings are passed as one (n, dimension) float32 array; search()
+    returns (document, distance) pairs, closest first.
+    """
+    
+    def add_documents(self, documents: List[str], embeddings: np.ndarray,
+                      ids: Optional[List[str]] = None, metadatas: Optional[List[Dict]] = None):
+        raise NotImplementedError
+    
+    def get_ids(self, source: Optional[str] = None) -> Set[str]:
+        raise NotImplementedError
+    
+    def get_ids_by_source(self) -> Dict[str, Set[str]]:
+        """Stored IDs grouped by their source metadata"""
+        raise NotImplementedError
+    
+    def delete(self, ids: List[str]):
+        raise NotImplementedError
+    
+    def count(self) -> int:
+        raise NotImplementedError
+    
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[Tuple[str, str, Dict]]:
+        """Yield (id, document, metadata) for every stored chunk"""
+        raise NotImplementedError
+    
+    def get_embeddings(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        """Stored vectors for those of ids that exist, as (found_ids, (n, dimension) array)"""
+        raise NotImplementedError
+    
+    def search(self, query_embedding: np.ndarray, top_k: int = 3) -> List[Tuple[str, float]]:
+        raise NotImplementedError
+    
+    def search_batch(self, query_embeddings: np.ndarray, top_k: int = 3) -> List[List[Tuple[str, float]]]:
+        """Search for several queries at once"""
+        return [self.search(query_embedding, top_k=top_k) for query_embedding in query_embeddings]
+    
+    def flush(self):
+        """Persist buffered writes (a no-op for backends that write through)"""
+        pass
+    
+    def close(self):
+        """Release open files and connections; the store is not used afterwards"""
+        pass
+    
+    def get_index_key(self) -> Optional[str]:
+        """Key of the embedding model/backend the stored vectors came from"""
+        raise NotImplementedError
+    
+    def set_index_key(self, index_key: str):
+        raise NotImplementedError
+    
+    def clear(self):
+        raise NotImplementedError
+
+class VectorStore(BaseVectorStore):
     """Vector store using ChromaDB for persistence"""
     
-    def __init__(self, collection_name: str = "mental_health_docs"):
+    def __init__(self, collection_name: str = "mental_health_docs", reset: bool = False,
+                 path: str = "./chroma_db"):
+        # Imported here so the NumPy backend works without chromadb installed
+        import chromadb
+        
         print("Initializing ChromaDB vector store...")
         # Use a local folder for persistence to avoid memory limits
-        self.client = chromadb.PersistentClient(path="./chroma_db")
+        self.client = chromadb.PersistentClient(path=path)
+        self.path = path
         self.collection_name = collection_name
         
-        # Reset collection to start fresh (mimic in-memory behavior)
-        try:
-            self.client.delete_collection(collection_name)
-            print(f"Deleted existing collection: {collection_name}")
-        except Exception:
-            pass # Collection didn't exist or couldn't be deleted
-            
-        self.collection = self.client.create_collection(name=collection_name)
-        print(f"ChromaDB initialized with collection: {collection_name}")
-    
-    def add_documents(self, documents: List[str], embeddings: List[np.ndarray]):
+        # Only start fresh when asked to; otherwise keep the persisted index so
+        # incremental ingest can skip chunks that are already embedded
+        if reset:
+            try:
+                self.client.delete_collection(collection_name)
+                print(f"Deleted existing collection: {collection_name}")
+            except Exception:
+                pass # Collection didn't exist or couldn't be deleted
+        
+        self.collection = self.client.get_or_create_collection(name=collection_name)
+        
+        # Documents written by older versions have random IDs and no source,
+        # so incremental ingest can never match or expire them
+        existing = self.collection.get(include=["metadatas"])
+        unkeyed = [doc_id for doc_id, meta in zip(existing['ids'], existing['metadatas'])
+                   if not meta or "source" not in meta]
+        if unkeyed:
+            self.delete(unkeyed)
+        
+        print(f"ChromaDB initialized with collection: {collection_name} ({self.collection.count()} documents)")
+    
+    def add_documents(self, documents: List[str], embeddings: np.ndarray,
+                      ids: Optional[List[str]] = None, metadatas: Optional[List[Dict]] = None):
         """Add documents and their embeddings to the store"""
         if not documents:
             return
-            
-        print(f"VECTOR STORE: Adding {len(documents)} documents to ChromaDB...")
         
-        # Generate IDs
-        ids = [str(uuid.uuid4()) for _ in documents]
+        print(f"VECTOR STORE: Adding {len(documents)} documents to ChromaDB...")
         
-        # Convert numpy arrays to lists for ChromaDB
-        embeddings_list = [emb.tolist() if isinstance(emb, np.ndarray) else emb for emb in embeddings]
+        # Generate IDs unless the caller supplied content-addressed ones
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in documents]
         
-        # Add to collection
+        # ChromaDB takes the 2-D array as is; no per-float Python objects
         self.collection.add(
             documents=documents,
-            embeddings=embeddings_list,
-            ids=ids
+            embeddings=np.asarray(embeddings, dtype=np.float32),
+            ids=ids,
+            metadatas=metadatas
         )
         print("VECTOR STORE: Documents added successfully")
     
+    def get_ids(self, source: Optional[str] = None) -> Set[str]:
+        """Return the IDs stored in the collection, optionally only those from one source"""
+        where = {"source": source} if source is not None else None
+        results = self.collection.get(where=where, include=[])
+        return set(results['ids'])
+    
+    def get_ids_by_source(self) -> Dict[str, Set[str]]:
+        """Stored IDs grouped by their source metadata"""
+        results = self.collection.get(include=["metadatas"])
+        by_source: Dict[str, Set[str]] = {}
+        for doc_id, meta in zip(results['ids'], results['metadatas']):
+            by_source.setdefault((meta or {}).get("source", ""), set()).add(doc_id)
+        return by_source
+    
+    def delete(self, ids: List[str]):
+        """Remove documents by ID"""
+        if not ids:
+            return
+        print(f"VECTOR STORE: Deleting {len(ids)} documents...")
+        self.collection.delete(ids=list(ids))
+    
+    def count(self) -> int:
+        """Number of documents in the store"""
+        return self.collection.count()
+    
+    def iter_documents(self, batch_size: int = 1000) -> Iterator[Tuple[str, str, Dict]]:
+        """Yield (id, document, metadata) for every stored chunk, one page at a time"""
+        offset = 0
+        while True:
+            results = self.collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+            if not results['ids']:
+                return
+            yield from zip(results['ids'], results['documents'], results['metadatas'])
+            offset += len(results['ids'])
+    
+    def get_embeddings(self, ids: List[str]) -> Tuple[List[str], np.ndarray]:
+        """Stored vectors for those of ids that exist, as (found_ids, (n, dimension) array)"""
+        if not ids:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        results = self.collection.get(ids=list(ids), include=["embeddings"])
+        if not results['ids']:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        return list(results['ids']), np.asarray(results['embeddings'], dtype=np.float32)
+    
+    def get_index_key(self) -> Optional[str]:
+        """Key of the embedding model/backend the stored vectors came from"""
+        return (self.collection.metadata or {}).get("index_key")
+    
+    def set_index_key(self, index_key: str):
+        """Record the embedding model/backend in the collection metadata"""
+        metadata = dict(self.collection.metadata or {})
+        if metadata.get("index_key") == index_key:
+            return
+        # hnsw:* settings are fixed at creation and may not be passed to modify()
+        metadata = {key: value for key, value in metadata.items() if not key.startswith("hnsw:")}
+        metadata["index_key"] = index_key
+        self.collection.modify(metadata=metadata)
+    
     def search(self, query_embedding: np.ndarray, top_k: int = 3) -> List[Tuple[str, float]]:
         """Search for most similar documents"""
-        # Convert query embedding to list
-        query_emb_list = query_embedding.tolist() if isinstance(query_embedding, np.ndarray) else query_embedding
-        
         # Query ChromaDB
         results = self.collection.query(
-            query_embeddings=[query_emb_list],
+            query_embeddings=np.asarray(query_embedding, dtype=np.float32).reshape(1, -1),
             n_results=top_k
         )
         
         if not results['documents']:
             return []
-            
+        
         docs = results['documents'][0]
         # Chroma returns distances. We'll just return the docs and distances.
-        # Note: The original code expected (doc, score). 
+        # Note: The original code expected (doc, score).
         # We'll return (doc, distance) here. The RAG system doesn't use the score for logic, just context building.
         distances = results['distances'][0] if 'distances' in results else [0.0] * len(docs)
         
         return list(zip(docs, distances))
     
+    def search_batch(self, query_embeddings: np.ndarray, top_k: int = 3) -> List[List[Tuple[str, float]]]:
+        """Search for several queries in one ChromaDB call"""
+        if len(query_embeddings) == 0:
+            return []
+        results = self.collection.query(
+            query_embeddings=np.asarray(query_embeddings, dtype=np.float32),
+            n_results=top_k
+        )
+        return [list(zip(docs, distances)) for docs, distances in zip(results['documents'], results['distances'])]
+    
+    def close(self):
+        """Close the client, stopping the system Chroma caches for this path"""
+        client, self.client, self.collection = self.client, None, None
+        if client is None:
+            return
+        if hasattr(client, "close"):
+            client.close()
+            return
+        # Older chromadb has no close(): its System, with the sqlite connection
+        # and loaded segments, stays cached per path until it is evicted
+        system = type(client)._identifier_to_system.pop(client._identifier, None)
+        if system is not None:
+            system.stop()
+    
     def clear(self):
         """Clear the vector store"""
         print("VECTOR STORE: Clearing collection...")
@@ -73,4 +227,13 @@ class VectorStore:
             self.collection = self.client.create_collection(name=self.collection_name)
             print("VECTOR STORE: Collection cleared")
         except Exception as e:
-            print(f"VECTOR STORE ERROR: {e}")
\ No newline at end of file
+            print(f"VECTOR STORE ERROR: {e}")
+
+def create_vector_store(backend: str = "chroma", **kwargs) -> BaseVectorStore:
+    """Create a vector store backend by name ("chroma" or "numpy")"""
+    if backend == "chroma":
+        return VectorStore(**kwargs)
+    if backend == "numpy":
+        from numpy_vector_store import NumpyVectorStore
+        return NumpyVectorStore(**kwargs)
+    raise ValueError(f"Unknown vector store backend: {backend}")
\ No newline at end of file